@@ -45,6 +45,119 @@ class Settings(BaseSettings):
     # We will use the fast Llama 3.1 8B model
     SAMBANOVA_MODEL: str = "Meta-Llama-3.1-8B-Instruct"
 
+    # LLM client
+    LLM_MAX_CONCURRENCY: int = 8          # In-flight requests per process
+    LLM_MAX_CONNECTIONS: int = 16         # Keep-alive pool size
+    LLM_CONNECT_TIMEOUT_SECONDS: float = 5.0
+    LLM_TIMEOUT_SECONDS: float = 15.0     # Per attempt
+    LLM_DEADLINE_SECONDS: float = 30.0    # Whole call: queueing + all retries
+    LLM_MAX_RETRIES: int = 2
+    LLM_RETRY_BASE_DELAY: float = 0.5
+
+    # Auth
+    AUTH_BCRYPT_ROUNDS: int = 12              # Cost factor for new hashes; older ones are rehashed on login
+    AUTH_HASH_WORKERS: int = 4                # Threads for bcrypt (logins beyond this wait in line)
+    AUTH_USER_CACHE_TTL_SECONDS: float = 30.0 # How long a verified user id skips the users lookup (= how long a deleted user's token still works)
+    AUTH_USER_CACHE_MAX_ENTRIES: int = 10000
+
+    # Local keyword parser: share of meaningful words (0-1) the rules must explain
+    # before the LLM is skipped. Set above 1 to always call the LLM.
+    RULE_PARSER_MIN_CONFIDENCE: float = 0.8
+
+    # Prompt -> actions cache
+    PROMPT_CACHE_TTL_SECONDS: int = 7 * 24 * 3600
+    PROMPT_CACHE_MAX_ENTRIES: int = 2048
+    # Token-set similarity (0-1) needed for a fuzzy hit. 0 disables the fuzzy tier.
+    PROMPT_CACHE_FUZZY_THRESHOLD: float = 0.0
+
+    # ffprobe results kept in memory per process (the DB copy is shared)
+    PROBE_CACHE_MAX_ENTRIES: int = 512
+
+    # Upload analysis
+    ANALYSIS_SCENE_THRESHOLD: float = 0.4     # 0-1, higher = fewer scene cuts
+    ANALYSIS_BLACK_MIN_DURATION: float = 0.5  # Seconds
+
+    # Silence detection: "envelope" (cached NumPy envelope, instant re-thresholding)
+    # or "ffmpeg" (silencedetect, one full decode per request)
+    SILENCE_ENGINE: str = "envelope"
+
+    # Job queue
+    # "background": run tasks inside the API process (FastAPI BackgroundTasks)
+    # "database":   durable queue table, processed by `python -m backend.worker`
+    JOB_QUEUE_BACKEND: str = "background"
+    JOB_QUEUE_POLL_SECONDS: float = 1.0
+    JOB_QUEUE_LEASE_SECONDS: float = 60.0     # A task is re-leased if not renewed in time
+    JOB_QUEUE_HEARTBEAT_SECONDS: float = 15.0
+    JOB_QUEUE_MAX_ATTEMPTS: int = 3
+
+    # Uploads
+    UPLOAD_CHUNK_SIZE: int = 8 * 1024 * 1024          # Suggested PUT size for resumable uploads
+    UPLOAD_MAX_BYTES: int = 20 * 1024 * 1024 * 1024   # Largest accepted file
+    UPLOAD_SNIFF_BYTES: int = 2 * 1024 * 1024         # ffprobe the head once this much has arrived
+    UPLOAD_WRITE_BUFFER: int = 1024 * 1024            # Bytes gathered per disk write
+    UPLOAD_DEDUP: bool = True                         # Store identical uploads once (content-addressed)
+    UPLOAD_WRITER_STALE_SECONDS: float = 600.0        # A PUT/complete silent this long loses its hold on the session
+    BLOB_STORE_DIR: str = ""                          # Default: temp_storage/blobs
+
+    # Downloads
+    # Renders keep their URL, so caches must revalidate (cheap 304 via ETag)
+    DOWNLOAD_CACHE_CONTROL: str = "public, max-age=0, must-revalidate"
+    DOWNLOAD_META_TTL_SECONDS: float = 10.0
+    # Behind nginx: internal location that maps to temp_storage, e.g. "/protected-media".
+    # The API then only answers with X-Accel-Redirect and nginx sendfile()s the bytes.
+    DOWNLOAD_ACCEL_PREFIX: str = ""
+
+    # Batch edits (POST /jobs/batches)
+    BATCH_MAX_JOBS: int = 100
+    BATCH_MAX_CONCURRENCY: int = 4   # Edits of one batch rendering at once (background queue backend)
+
+    # GET /jobs/history
+    HISTORY_PAGE_SIZE: int = 10
+    HISTORY_MAX_PAGE_SIZE: int = 100
+
+    # Storage lifecycle (services/storage.py): once temp_storage passes the high
+    # watermark, the sweeper evicts down to the low one
+    STORAGE_SWEEPER: bool = True
+    STORAGE_SWEEP_INTERVAL_SECONDS: float = 300.0
+    STORAGE_HIGH_WATERMARK_BYTES: int = 80 * 1024 * 1024 * 1024
+    STORAGE_LOW_WATERMARK_BYTES: int = 60 * 1024 * 1024 * 1024
+    STORAGE_TEMP_MAX_AGE_SECONDS: float = 6 * 3600          # Abandoned .part/.rendering/work files
+    STORAGE_RENDER_IDLE_SECONDS: float = 3600.0             # Renders (re-creatable) of jobs idle this long
+    STORAGE_ORIGINAL_IDLE_SECONDS: float = 7 * 24 * 3600.0  # Originals of jobs idle this long
+
+    # Job status push (GET /jobs/{id}/events)
+    JOB_EVENTS_NOTIFY: bool = True            # Postgres NOTIFY between worker and API processes
+    JOB_EVENTS_POLL_SECONDS: float = 2.0      # Fallback re-read when NOTIFY isn't available
+    JOB_EVENTS_KEEPALIVE_SECONDS: float = 15.0
+
+    # Rendering
+    # Content-addressed cache of finished renders (same input + actions + encoder -> no FFmpeg)
+    RENDER_CACHE_ENABLED: bool = True
+    RENDER_CACHE_DIR: str = ""                           # Default: temp_storage/render_cache
+    RENDER_CACHE_MAX_BYTES: int = 20 * 1024 * 1024 * 1024
+    # Encoder profile for jobs that don't pick one: draft | standard | archive
+    ENCODE_PROFILE: str = "standard"
+    ENCODE_THREADS: int = 0   # x264 threads for draft/standard (0 = FFmpeg decides)
+    # Render a low-res proxy first so the user sees each edit within seconds
+    PREVIEW_RENDER: bool = True
+    PREVIEW_HEIGHT: int = 360
+    PREVIEW_CRF: int = 30
+    PREVIEW_GOP_SECONDS: float = 1.0
+    # Full-quality render after a preview: "queue" (low priority, right away)
+    # or "on_download" (only when someone downloads the edit)
+    FULL_RENDER_MODE: str = "queue"
+    # Minimum seconds between two progress writes to the DB for one render
+    RENDER_PROGRESS_INTERVAL: float = 1.0
+    # A full render that hasn't reported progress for this long is presumed dead,
+    # and another render task may take the job over
+    RENDER_CLAIM_STALE_SECONDS: float = 300.0
+    # Filter graphs longer than this (characters) go to a -filter_complex_script file
+    FILTER_SCRIPT_THRESHOLD: int = 4000
+    # Number of processes used to render one long clip in parallel chunks (1 = off)
+    RENDER_WORKERS: int = 1
+    # Clips shorter than this (seconds) are always rendered in one piece
+    PARALLEL_RENDER_MIN_DURATION: float = 120.0
+
     # @property
     # def CELERY_BROKER_URL(self) -> str:
     #     return f"redis://{self.REDIS_HOST}:{self.REDIS_PORT}/0"
@@ -6,6 +6,7 @@ from typing import Optional, List, Union
 # 1. Request Model for the Prompt Endpoint
 class PromptRequest(BaseModel):
     prompt: str # The raw text: "Cut first 5 seconds"
+    profile: Optional[str] = None # Encoder profile: draft | standard | archive (kept for later prompts)
 
 # 2. Response Model for Job Status
 class JobStatusResponse(BaseModel):
@@ -17,6 +18,27 @@ class JobStatusResponse(BaseModel):
     height: Optional[int] = None
     error: Optional[str] = None
     ai_reply: Optional[str] = None
+    # Render progress (only while EDITING)
+    progress: Optional[float] = None
+    render_fps: Optional[float] = None
+    render_speed: Optional[float] = None
+    eta_seconds: Optional[float] = None
+    # True once GET /jobs/{job_id}/preview shows the latest edit
+    preview_ready: Optional[bool] = None
+
+# Batch edits: one prompt for many jobs
+class BatchPromptRequest(BaseModel):
+    prompt: str
+    job_ids: List[str]
+    profile: Optional[str] = None
+
+# Resumable uploads
+class UploadInitRequest(BaseModel):
+    filename: str
+    size: int  # Total bytes the client is going to send
+
+class UploadCompleteRequest(BaseModel):
+    sha256: Optional[str] = None  # Optional end-to-end check against the server's hash
 
 class TrimAction(BaseModel):
     type: str = "trim"
@@ -69,5 +91,10 @@ class JobSummary(BaseModel):
     created_at: str  # We will convert datetime to string
 
 # --- 3. The Container for AI Output ---
+# Every action type the renderer understands (the 'type' defaults above)
+ACTION_TYPES = {
+    "trim", "aspect_ratio", "filter", "speed", "add_text", "fade", "add_music", "auto_subtitles", "remove_silence",
+}
+
 class EditInstructions(BaseModel):
     actions: List[Union[TrimAction, AspectRatioAction, FilterAction, SpeedAction, TextAction, TransitionAction, MusicAction, SubtitleAction, SilenceAction]]
\ No newline at end of file
@@ -1,3 +1,5 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
 from typing import Optional
 from jose import JWTError, jwt
@@ -10,7 +12,12 @@ ALGORITHM = "HS256"
 
 
 # Password Hashing
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__default_rounds=settings.AUTH_BCRYPT_ROUNDS)
+
+# bcrypt is slow on purpose (~0.25 s at cost 12). It gets its own small pool:
+# a burst of logins queues here instead of blocking the event loop or filling
+# the threadpool that every other sync endpoint runs in.
+_hash_pool = ThreadPoolExecutor(max_workers=settings.AUTH_HASH_WORKERS, thread_name_prefix="bcrypt")
 
 def verify_password(plain_password, hashed_password):
     return pwd_context.verify(plain_password, hashed_password)
@@ -18,6 +25,31 @@ def verify_password(plain_password, hashed_password):
 def get_password_hash(password):
     return pwd_context.hash(password)
 
+def _bcrypt_cost(hashed_password: str) -> int:
+    # $2b$12$<salt+hash>
+    try:
+        return int(hashed_password.split("$")[2])
+    except (IndexError, ValueError):
+        return 0
+
+def verify_and_rehash(plain_password, hashed_password):
+    """
+    (valid, new_hash). new_hash is set when the stored hash used another cost
+    factor than AUTH_BCRYPT_ROUNDS: store it to move the user to the new cost.
+    """
+    if not verify_password(plain_password, hashed_password):
+        return False, None
+    if _bcrypt_cost(hashed_password) != settings.AUTH_BCRYPT_ROUNDS:
+        return True, get_password_hash(plain_password)
+    return True, None
+
+async def hash_password_async(password):
+    return await asyncio.get_running_loop().run_in_executor(_hash_pool, get_password_hash, password)
+
+async def verify_password_async(plain_password, hashed_password):
+    """verify_and_rehash() on the bcrypt pool."""
+    return await asyncio.get_running_loop().run_in_executor(_hash_pool, verify_and_rehash, plain_password, hashed_password)
+
 # JWT Token Creation
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     to_encode = data.copy()
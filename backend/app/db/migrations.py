@@ -0,0 +1,59 @@
+# backend/app/db/migrations.py
+
+from sqlalchemy import inspect, text
+from backend.app.db.database import Base
+
+# create_all() only creates missing TABLES. Columns and indexes added to an
+# existing model after the table was created have to be added by hand, so we
+# do a small idempotent "add if missing" pass on startup.
+
+
+def _column_ddl(column, dialect) -> str:
+    col_type = column.type.compile(dialect=dialect)
+    return f'ALTER TABLE {column.table.name} ADD COLUMN {column.name} {col_type}'
+
+
+def run_migrations(engine):
+    """
+    Adds any model columns and indexes that are missing from the live database,
+    then back-fills rows that predate them. Safe to call on every startup.
+    """
+    inspector = inspect(engine)
+    existing_tables = set(inspector.get_table_names())
+
+    with engine.begin() as conn:
+        for table in Base.metadata.sorted_tables:
+            if table.name not in existing_tables:
+                continue  # create_all() will take care of it
+
+            existing_columns = {c["name"] for c in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in existing_columns:
+                    continue
+                print(f"🛠️ [DB] Adding missing column {table.name}.{column.name}")
+                conn.execute(text(_column_ddl(column, engine.dialect)))
+
+            existing_indexes = {i["name"] for i in inspector.get_indexes(table.name)}
+            for index in table.indexes:
+                if index.name in existing_indexes:
+                    continue
+                print(f"🛠️ [DB] Creating missing index {index.name} on {table.name}")
+                index.create(bind=conn)
+
+        if "video_jobs" in existing_tables:
+            _seed_action_logs(conn)
+
+
+def _seed_action_logs(conn):
+    """
+    Jobs edited before the action log existed have a render but no log to
+    replay. Their render becomes the base the (new, empty) log replays on, so
+    the next prompt builds on it instead of starting over from the upload.
+    """
+    seeded = conn.execute(text(
+        "UPDATE video_jobs SET replay_base_path = edited_file_path, action_log = '[]' "
+        "WHERE action_log IS NULL AND edited_file_path IS NOT NULL "
+        "AND edited_file_path != original_file_path"
+    )).rowcount
+    if seeded:
+        print(f"🛠️ [DB] Seeded the action log of {seeded} jobs edited before it existed")
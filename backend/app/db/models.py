@@ -1,6 +1,6 @@
 # backend/app/db/models.py
 
-from sqlalchemy import Column, Integer, String, DateTime, func, Float, Text
+from sqlalchemy import Column, Integer, BigInteger, String, DateTime, func, Float, Text, JSON, Index, Boolean
 from backend.app.db.database import Base # Base is imported here
 from sqlalchemy.dialects.postgresql import UUID
 import uuid
@@ -15,6 +15,12 @@ class User(Base):
     # Relationship (Optional: Link jobs to users)
     # jobs = relationship("VideoJob", back_populates="owner")
 
+# Job statuses while a task owns the job (ingest, edit or render queued/running).
+# Nothing else may change its files or status then (batch edits, storage eviction).
+ACTIVE_JOB_STATUSES = frozenset({
+    "PENDING", "UPLOADED", "PROCESSING", "QUEUED", "EDITING", "RENDER_QUEUED", "RENDERING",
+})
+
 class VideoJob(Base):
     __tablename__ = 'video_jobs'
 
@@ -39,3 +45,149 @@ class VideoJob(Base):
     codec = Column(String, nullable=True)
     error_message = Column(Text, nullable=True) # Good for debugging failures
     ai_reply = Column(Text, nullable=True)
+
+    # Ordered list of every action applied to this job so far.
+    # Each render replays the whole log against original_file_path.
+    action_log = Column(JSON, nullable=True)
+    # edit_ids of the latest edit tasks whose actions are in action_log, so a
+    # re-leased edit task doesn't append its actions a second time
+    applied_edits = Column(JSON, nullable=True)
+    # Jobs edited before the action log existed: their last render, which the
+    # log is replayed on instead of original_file_path (seeded by run_migrations)
+    replay_base_path = Column(String, nullable=True)
+
+    # Timestamps (seconds) of every video keyframe in the original upload.
+    # Used to stream-copy whole GOPs when trimming.
+    keyframes = Column(JSON, nullable=True)
+
+    # Single-pass upload analysis: silences, loudness, scene changes, black ranges, streams
+    analysis = Column(JSON, nullable=True)
+
+    # Live render progress (from FFmpeg -progress), written at a throttled rate
+    progress = Column(Float, nullable=True)      # 0-100
+    render_fps = Column(Float, nullable=True)
+    render_speed = Column(Float, nullable=True)  # 2.0 = twice realtime
+    eta_seconds = Column(Float, nullable=True)
+
+    # sha256 of the uploaded file, computed while it was being written
+    content_hash = Column(String, nullable=True, index=True)
+    # Bumped on every applied edit; edited_file_path is current when render_version == edit_version
+    edit_version = Column(Integer, default=0)
+    # edit_version that edited_file_path was rendered from; part of the download ETag
+    render_version = Column(Integer, default=0)
+
+    # Encoder profile chosen for this job (None = ENCODE_PROFILE)
+    encode_profile = Column(String, nullable=True)
+
+    # Full render in progress: the edit_version it renders and when it last showed
+    # signs of life. One full render per job at a time (see tasks.render_full_quality)
+    rendering_version = Column(Integer, nullable=True)
+    render_claimed_at = Column(Float, nullable=True)
+
+    # Low-resolution proxy of the latest edit (see PREVIEW_RENDER)
+    preview_file_path = Column(String, nullable=True)
+    preview_version = Column(Integer, nullable=True)
+
+    # Storage lifecycle: bytes on disk for this job (original + renders, from the
+    # last sweep) and when it was last used (Unix time; None = created_at)
+    storage_bytes = Column(BigInteger, nullable=True)
+    last_accessed_at = Column(Float, nullable=True)
+
+    # Batch edit this job's latest prompt came from (None for a single prompt)
+    batch_id = Column(String, nullable=True, index=True)
+
+# History pages: WHERE user_id = ? ORDER BY created_at DESC, id DESC (keyset on the last two)
+Index("ix_video_jobs_user_created", VideoJob.user_id, VideoJob.created_at.desc(), VideoJob.id.desc())
+
+class PromptCacheEntry(Base):
+    __tablename__ = "prompt_cache"
+
+    # sha256 of (prompt version + prompt)
+    key = Column(String, primary_key=True)
+    prompt_version = Column(String, nullable=False, index=True)
+    normalized_prompt = Column(Text, nullable=False)  # The prompt as typed, whitespace collapsed
+    result = Column(JSON, nullable=False)
+    created_at = Column(DateTime, default=func.now())
+    expires_at = Column(Float, nullable=False) # Unix timestamp
+
+class MediaProbe(Base):
+    __tablename__ = "media_probes"
+
+    # sha256 of (absolute path, size, mtime) - a changed file gets a new key
+    key = Column(String, primary_key=True)
+    file_path = Column(String, nullable=False, index=True)
+    size = Column(BigInteger, nullable=False)
+    mtime_ns = Column(BigInteger, nullable=False)
+    probe = Column(JSON, nullable=False)      # Full ffprobe output (format + streams)
+    created_at = Column(DateTime, default=func.now())
+
+class QueuedTask(Base):
+    __tablename__ = "task_queue"
+    # Workers claim the oldest PENDING row (or a RUNNING row whose lease ran out)
+    __table_args__ = (Index("ix_task_queue_claim", "status", "priority", "id"),)
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    kind = Column(String, nullable=False)        # "ingest" | "edit"
+    job_id = Column(String, nullable=False, index=True)
+    payload = Column(JSON, nullable=True)        # Extra handler kwargs, e.g. {"prompt": "..."}
+    priority = Column(Integer, default=100)      # Lower runs first
+    status = Column(String, default="PENDING")   # PENDING | RUNNING | DONE | FAILED
+    attempts = Column(Integer, default=0)
+    max_attempts = Column(Integer, default=3)
+    worker_id = Column(String, nullable=True)
+    error = Column(Text, nullable=True)
+
+    # Unix timestamps (host clocks are assumed to be NTP-synced)
+    created_at = Column(Float, nullable=False)
+    started_at = Column(Float, nullable=True)
+    heartbeat_at = Column(Float, nullable=True)
+    lease_expires_at = Column(Float, nullable=True)
+    finished_at = Column(Float, nullable=True)
+
+class MediaBlob(Base):
+    __tablename__ = "media_blobs"
+
+    # One stored copy per distinct upload; VideoJob.content_hash points here
+    content_hash = Column(String, primary_key=True)  # sha256 of the file
+    file_path = Column(String, nullable=False)
+    size = Column(BigInteger, nullable=False)
+    ref_count = Column(Integer, default=0)           # Jobs using this file; deleted at 0
+
+    # Ingest results, shared by every job on this content (None until the first ingest)
+    ingest = Column(JSON, nullable=True)             # duration, width, height, fps, codec
+    keyframes = Column(JSON, nullable=True)
+    analysis = Column(JSON, nullable=True)
+
+    created_at = Column(Float, nullable=False)       # Unix timestamps
+    last_used_at = Column(Float, nullable=False)
+
+class EditBatch(Base):
+    __tablename__ = "edit_batches"
+
+    # One prompt, parsed once, applied to many jobs (POST /jobs/batches)
+    id = Column(String, primary_key=True)        # uuid4 hex
+    user_id = Column(Integer, index=True)
+    prompt = Column(Text, nullable=False)
+    actions = Column(JSON, nullable=False)       # The single parse result, shared by every job
+    reply = Column(Text, nullable=True)
+    job_ids = Column(JSON, nullable=False)       # Accepted jobs
+    rejected = Column(JSON, nullable=True)       # {job_id: reason} for clips the actions don't fit
+    created_at = Column(Float, nullable=False)   # Unix timestamp
+
+class UploadSession(Base):
+    __tablename__ = "upload_sessions"
+
+    # Resumable upload: POST init -> PUT chunks at 'received' -> POST complete
+    id = Column(String, primary_key=True)        # uuid4 hex, also names the .part file
+    user_id = Column(Integer, index=True)
+    filename = Column(String, nullable=False)    # Client's name (only the extension is kept)
+    total_size = Column(BigInteger, nullable=False)
+    received = Column(BigInteger, default=0)     # Bytes safely on disk = next expected offset
+    status = Column(String, default="OPEN")      # OPEN | COMPLETE | REJECTED
+    sniffed = Column(Boolean, default=False)     # Early ffprobe already found a video stream
+    writer = Column(String, nullable=True)       # Token of the PUT/complete holding the session (any process)
+    content_hash = Column(String, nullable=True)
+    job_id = Column(String, nullable=True)       # Set on complete
+    error = Column(Text, nullable=True)
+    created_at = Column(Float, nullable=False)   # Unix timestamps
+    updated_at = Column(Float, nullable=False)
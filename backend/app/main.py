@@ -10,6 +10,9 @@ from starlette.middleware.base import BaseHTTPMiddleware
 from starlette.responses import Response
 from backend.app.db.database import engine, Base
 from backend.app.db.models import VideoJob,User
+from backend.app.db.migrations import run_migrations
+from backend.app.services.promptparser import prompt_cache
+from backend.app.services import probecache, jobevents, metrics, rendercache, storage, authcache
 
 # --- THIS SECTION FIXES THE MODULE NOT FOUND ERROR ---
 # 1. Get the path to the directory containing 'backend' and 'frontend' (project root)
@@ -34,6 +37,7 @@ origins=["https://editverse-kxhkxivs1-shreyas-projects-ce459247.vercel.app",
                    "http://localhost:5173"]
 
 Base.metadata.create_all(bind=engine)
+run_migrations(engine)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=origins,
@@ -42,6 +46,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],  # Allows all methods (GET, POST, etc.)
     allow_headers=["*"],  # Allows all headers
+    expose_headers=["X-Next-Cursor", "Link"],  # History pagination
 )
 
 # class CustomCORSMiddleware(BaseHTTPMiddleware):
@@ -78,6 +83,26 @@ app.include_router(jobs.router, prefix="/jobs", tags=["Jobs"])
 
 app.include_router(auth.router, prefix="/auth", tags=["Auth"]) # <-- Add this
 
+
+@app.on_event("startup")
+def start_job_events():
+    # Relays status updates from worker processes to SSE clients (Postgres only)
+    jobevents.start_listener()
+
+@app.on_event("startup")
+def start_storage_sweeper():
+    # Keeps temp_storage between the storage watermarks (services/storage.py)
+    storage.start_sweeper()
+
 @app.get("/status")
 async def get_status():
-    return {"status": "ok", "service": app.title}
\ No newline at end of file
+    return {"status": "ok", "service": app.title, "prompt_cache": prompt_cache.stats(),
+            "probe_cache": probecache.stats(), "render_cache": rendercache.stats(),
+            "storage": storage.stats(), "auth_cache": authcache.stats()}
+
+
+@app.get("/metrics")
+def get_metrics():
+    """Prometheus scrape endpoint (per-stage latency histograms, see services/metrics.py)."""
+    body, content_type = metrics.exposition()
+    return Response(content=body, media_type=content_type)
\ No newline at end of file
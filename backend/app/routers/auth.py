@@ -1,9 +1,11 @@
 from fastapi import APIRouter, Depends, HTTPException, status
 from sqlalchemy.orm import Session
 from pydantic import BaseModel
+from starlette.concurrency import run_in_threadpool
 from backend.app.db.database import get_db
 from backend.app.db.models import User
-from backend.app.core.security import get_password_hash, verify_password, create_access_token
+from backend.app.core.security import hash_password_async, verify_password_async, create_access_token
+from backend.app.services import authcache
 from backend.app.routers.jobs import get_current_user_id # Re-use the dependency we fixed!
 
 
@@ -20,34 +22,53 @@ class Token(BaseModel):
 
 # --- ENDPOINTS ---
 
+# register/login are async so bcrypt can be awaited on its own bounded pool
+# (core/security.py). Their DB calls go to the threadpool, never the event loop.
+def _find_user(db: Session, email: str):
+    return db.query(User).filter(User.email == email).first()
+
+def _add_user(db: Session, email: str, hashed_password: str) -> User:
+    new_user = User(email=email, hashed_password=hashed_password)
+    db.add(new_user)
+    db.commit()
+    db.refresh(new_user)
+    return new_user
+
+def _store_hash(db: Session, db_user: User, hashed_password: str):
+    db_user.hashed_password = hashed_password
+    db.commit()
+
 @router.post("/register", response_model=Token)
-def register(user: UserCreate, db: Session = Depends(get_db)):
+async def register(user: UserCreate, db: Session = Depends(get_db)):
     # 1. Check if user exists
-    db_user = db.query(User).filter(User.email == user.email).first()
+    db_user = await run_in_threadpool(_find_user, db, user.email)
     if db_user:
         raise HTTPException(status_code=400, detail="Email already registered")
     
     # 2. Create new user
-    hashed_pw = get_password_hash(user.password)
-    new_user = User(email=user.email, hashed_password=hashed_pw)
-    db.add(new_user)
-    db.commit()
-    db.refresh(new_user)
+    hashed_pw = await hash_password_async(user.password)
+    new_user = await run_in_threadpool(_add_user, db, user.email, hashed_pw)
+    authcache.remember(new_user.id)
     
     # 3. Return Token immediately so they are logged in
     access_token = create_access_token(data={"sub": str(new_user.id)})
     return {"access_token": access_token, "token_type": "bearer"}
 
 @router.post("/login", response_model=Token)
-def login(user: UserCreate, db: Session = Depends(get_db)):
+async def login(user: UserCreate, db: Session = Depends(get_db)):
     # 1. Find user
-    db_user = db.query(User).filter(User.email == user.email).first()
+    db_user = await run_in_threadpool(_find_user, db, user.email)
     if not db_user:
         raise HTTPException(status_code=400, detail="Invalid credentials")
     
     # 2. Verify password
-    if not verify_password(user.password, db_user.hashed_password):
+    valid, new_hash = await verify_password_async(user.password, db_user.hashed_password)
+    if not valid:
         raise HTTPException(status_code=400, detail="Invalid credentials")
+    if new_hash:
+        # Hashed with an older AUTH_BCRYPT_ROUNDS: upgrade it while we have the password
+        await run_in_threadpool(_store_hash, db, db_user, new_hash)
+    authcache.remember(db_user.id)
     
     # 3. Generate Token
     access_token = create_access_token(data={"sub": str(db_user.id)})
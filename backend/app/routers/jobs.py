@@ -1,8 +1,10 @@
 from fastapi import APIRouter, File, UploadFile, Depends,HTTPException,BackgroundTasks
-from fastapi.responses import FileResponse
+from fastapi import Request, Response, Query
+from fastapi.responses import StreamingResponse, JSONResponse
 from sqlalchemy.orm import Session
+from sqlalchemy import tuple_
+from starlette.concurrency import run_in_threadpool
 from pathlib import Path
-import shutil
 import uuid
 import os
 from fastapi.security import OAuth2PasswordBearer
@@ -12,9 +14,19 @@ from backend.app.core.security import decode_access_token
 # Import modules from your project structure
 from backend.app.db.database import get_db
 from backend.app.db.models import VideoJob
-from backend.app.tasks import dummy_video_processing,process_video_edit
+from backend.app.services import jobqueue, jobevents, uploads, delivery, encoding, blobstore, storage, authcache, batches
+from backend.app.services.promptparser import parse_prompt
+from backend.app.db.database import SessionLocal
+import asyncio
+import base64
+import json
+import time
+from datetime import datetime
 from backend.app.core.config import settings
 from backend.app.core.schemas import PromptRequest,JobStatusResponse
+from backend.app.core.schemas import UploadInitRequest, UploadCompleteRequest, BatchPromptRequest
+from backend.app.db.models import UploadSession, EditBatch
+from typing import Optional
 from typing import List
 from backend.app.core.schemas import JobSummary # Import new schema
 from backend.app.db.models import User
@@ -35,10 +47,13 @@ def get_current_user_id(token: str = Depends(oauth2_scheme),db: Session = Depend
         raise HTTPException(status_code=401, detail="Invalid token")
     
     user_id = int(user_id_str)
+    if authcache.is_verified(user_id):
+        return user_id  # Checked within the last AUTH_USER_CACHE_TTL_SECONDS
 
-    user = db.query(User).filter(User.id == user_id).first()
+    user = db.query(User.id).filter(User.id == user_id).first()
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
+    authcache.remember(user_id)
 
     
     return user_id
@@ -55,15 +70,44 @@ UPLOAD_DIR.mkdir(parents=True, exist_ok=True)
 
 print(f"DEBUG: Server will save files to: {UPLOAD_DIR}")
 # ---------------------------------------------
+def _encode_cursor(created_at: datetime, job_id) -> str:
+    raw = json.dumps([created_at.isoformat(), str(job_id)]).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def _decode_cursor(cursor: str):
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        created_at, job_id = json.loads(raw)
+        return datetime.fromisoformat(created_at), uuid.UUID(job_id)
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
 @router.get("/history", response_model=List[JobSummary])
-def get_job_history(user_id: int = Depends(get_current_user_id),db: Session = Depends(get_db)):
+def get_job_history(response: Response,
+                    cursor: Optional[str] = None,
+                    limit: int = Query(settings.HISTORY_PAGE_SIZE, ge=1, le=settings.HISTORY_MAX_PAGE_SIZE),
+                    user_id: int = Depends(get_current_user_id), db: Session = Depends(get_db)):
     """
-    Returns the list of recent projects.
+    Returns the list of recent projects, newest first.
+    For the next page, pass the X-Next-Cursor header of this response as ?cursor=
+    (absent on the last page).
     """
-    
-    # Order by newest first
-    jobs = db.query(VideoJob).filter(VideoJob.user_id==user_id).order_by(VideoJob.created_at.desc()).limit(10).all()
-    
+    # Keyset pagination on (created_at, id) over ix_video_jobs_user_created:
+    # every page is one index range scan, however deep it is
+    query = db.query(VideoJob.id, VideoJob.status, VideoJob.original_file_path, VideoJob.created_at) \
+        .filter(VideoJob.user_id == user_id)
+    if cursor:
+        query = query.filter(tuple_(VideoJob.created_at, VideoJob.id) < tuple_(*_decode_cursor(cursor)))
+    jobs = query.order_by(VideoJob.created_at.desc(), VideoJob.id.desc()).limit(limit + 1).all()
+
+    if len(jobs) > limit:
+        jobs = jobs[:limit]
+        next_cursor = _encode_cursor(jobs[-1].created_at, jobs[-1].id)
+        response.headers["X-Next-Cursor"] = next_cursor
+        response.headers["Link"] = f'</jobs/history?cursor={next_cursor}&limit={limit}>; rel="next"'
+
     return [
         {
             "id": str(job.id),
@@ -74,6 +118,11 @@ def get_job_history(user_id: int = Depends(get_current_user_id),db: Session = De
         for job in jobs
     ]
 
+@router.get("/storage")
+def get_storage_usage(user_id: int = Depends(get_current_user_id), db: Session = Depends(get_db)):
+    """Disk used by each of the user's jobs (as of the last storage sweep)."""
+    return storage.user_usage(db, user_id)
+
 @router.post("/upload")
 async def upload_video(background_tasks: BackgroundTasks,
     file: UploadFile = File(...),
@@ -86,51 +135,141 @@ async def upload_video(background_tasks: BackgroundTasks,
     PENDING job entry in the database.
     """
     
-    # 1. Generate a unique filename and define the final path
-    # We use a UUID to ensure the filename is unique, preventing overwrites.
+    # 1. Stream to a unique temporary name. We use a UUID so concurrent uploads never collide.
     file_extension = Path(file.filename).suffix.lower()
-    unique_filename = f"{uuid.uuid4()}{file_extension}"
-    file_path = UPLOAD_DIR / unique_filename
+    temp_path = UPLOAD_DIR / f"{uuid.uuid4()}{file_extension}.part"
 
-    # 2. Save the file locally using efficient stream copying
+    # 2. Save the file locally (writes run in the threadpool, the event loop stays free)
     try:
-        # Open the destination file in binary write mode
-        with open(file_path, "wb") as buffer:
-            # Use shutil to efficiently copy the contents of the uploaded file
-            shutil.copyfileobj(file.file, buffer)
+        content_hash = await uploads.save_upload_file(file, temp_path)
+        file_path = await run_in_threadpool(uploads.store, db, temp_path, content_hash, file_extension, UPLOAD_DIR)
     except Exception as e:
         print(f"File upload error: {e}")
+        if temp_path.exists():
+            os.remove(temp_path)
         return {"message": "There was an error saving the uploaded file.", "error": str(e)}
     finally:
         # Important: Close the UploadFile object
         await file.close()
 
-    # 3. Create a PENDING job record in the database
-    # In a real app, user_id would come from the authentication token.
-   
+    # 3. Create the job record in the database
+    return await run_in_threadpool(_create_job, db, background_tasks, user_id, file_path, content_hash)
+
+
+def _add_job(db: Session, user_id: int, file_path: Path, content_hash: str) -> VideoJob:
+    """New job on a stored upload, added but not committed. Content we've ingested before skips ingest."""
     new_job = VideoJob(
         user_id=user_id,
         original_file_path=str(file_path),
         prompt="Awaiting user prompt...",
-        status="UPLOADED"
+        status="UPLOADED",
+        content_hash=content_hash
     )
+    if blobstore.apply_ingest(new_job, blobstore.get(db, content_hash)):
+        new_job.status = "COMPLETED"  # Same state a finished ingest leaves
     db.add(new_job)
-    db.commit()
-    db.refresh(new_job) # Reload the job object to get its generated ID
-
-    # dummy_video_processing.delay(str(new_job.id), unique_filename)
+    db.flush()  # Generates the ID
+    return new_job
 
-    background_tasks.add_task(dummy_video_processing, str(new_job.id), unique_filename)
 
+def _upload_response(job: VideoJob) -> dict:
     return {
         "message": "File uploaded successfully. Ready for prompt submission.",
-        "filename": unique_filename,
-        "job_id": new_job.id,
-        "status": new_job.status
-        
+        "filename": Path(job.original_file_path).name,
+        "job_id": job.id,
+        "status": job.status
     }
 
 
+def _start_job(db: Session, background_tasks: BackgroundTasks, job: VideoJob) -> dict:
+    """Queues ingest for a committed job (unless it reused a stored ingest)."""
+    if job.status == "COMPLETED":
+        print(f"♻️ Duplicate upload {job.content_hash[:12]}: reusing stored ingest for job {job.id}")
+    else:
+        jobqueue.submit(background_tasks, db, "ingest", str(job.id), filename=Path(job.original_file_path).name)
+    return _upload_response(job)
+
+
+def _create_job(db: Session, background_tasks: BackgroundTasks, user_id: int, file_path: Path, content_hash: str):
+    new_job = _add_job(db, user_id, file_path, content_hash)
+    db.commit()
+    db.refresh(new_job) # Reload the job object after the commit
+    return _start_job(db, background_tasks, new_job)
+
+
+# --- Resumable uploads (large files / flaky connections) ---
+def _get_upload(db: Session, upload_id: str, user_id: int) -> UploadSession:
+    upload = db.query(UploadSession).filter(UploadSession.id == upload_id).first()
+    if not upload or upload.user_id != user_id:
+        raise HTTPException(status_code=404, detail="Upload not found")
+    return upload
+
+
+@router.post("/uploads")
+def start_upload(request: UploadInitRequest, db: Session = Depends(get_db),
+                 user_id: int = Depends(get_current_user_id)):
+    """Opens an upload session. PUT the bytes in chunks, then call /complete."""
+    try:
+        upload = uploads.create_session(db, user_id, request.filename, request.size)
+    except uploads.UploadError as e:
+        raise HTTPException(status_code=e.status_code, detail=e.detail)
+    return uploads.session_info(upload)
+
+
+@router.get("/uploads/{upload_id}")
+def get_upload(upload_id: str, db: Session = Depends(get_db),
+               user_id: int = Depends(get_current_user_id)):
+    """After a dropped connection: 'received' is the offset to resume from."""
+    return uploads.session_info(_get_upload(db, upload_id, user_id))
+
+
+@router.put("/uploads/{upload_id}")
+async def put_upload_chunk(upload_id: str, offset: int, request: Request,
+                           db: Session = Depends(get_db),
+                           user_id: int = Depends(get_current_user_id)):
+    """
+    Raw request body = the bytes starting at 'offset' (any length).
+    409 means the offset is wrong: GET the session and continue from 'received'.
+    """
+    upload = await run_in_threadpool(_get_upload, db, upload_id, user_id)
+    try:
+        await uploads.write_chunk(db, upload, UPLOAD_DIR, offset, request.stream())
+    except uploads.UploadError as e:
+        raise HTTPException(status_code=e.status_code, detail=e.detail)
+    return uploads.session_info(upload)
+
+
+def _completed_upload(db: Session, upload: UploadSession):
+    """Response for a session that already has its job (retried /complete), None if it hasn't."""
+    if upload.status != "COMPLETE" or not upload.job_id:
+        return None
+    job = db.query(VideoJob).filter(VideoJob.id == int(upload.job_id)).first()
+    return _upload_response(job) if job else None
+
+
+@router.post("/uploads/{upload_id}/complete")
+async def complete_upload(upload_id: str, background_tasks: BackgroundTasks,
+                          request: Optional[UploadCompleteRequest] = None,
+                          db: Session = Depends(get_db),
+                          user_id: int = Depends(get_current_user_id)):
+    """Checks size (and sha256 if sent), creates the job and starts ingest. Safe to retry."""
+    upload = await run_in_threadpool(_get_upload, db, upload_id, user_id)
+    done = await run_in_threadpool(_completed_upload, db, upload)
+    if done:  # Retried /complete after a lost response
+        return done
+
+    add_job = lambda file_path, content_hash: _add_job(db, user_id, file_path, content_hash)
+    try:
+        _, job = await uploads.finish(db, upload, UPLOAD_DIR, request.sha256 if request else None, add_job)
+    except uploads.UploadError as e:
+        done = await run_in_threadpool(_completed_upload, db, upload)
+        if done:  # A concurrent retry completed it first
+            return done
+        raise HTTPException(status_code=e.status_code, detail=e.detail)
+
+    return await run_in_threadpool(_start_job, db, background_tasks, job)
+
+
 @router.post("/{job_id}/prompt")
 async def submit_prompt(
     job_id: str, 
@@ -144,18 +283,80 @@ async def submit_prompt(
     job = db.query(VideoJob).filter(VideoJob.id == job_id).first()
     if not job:
         raise HTTPException(status_code=404, detail="Job not found")
+    if job.status == "EXPIRED":
+        raise HTTPException(status_code=410, detail=job.error_message or "This job's video was removed")
+
+    if request.profile is not None:
+        try:
+            job.encode_profile = encoding.resolve_profile(request.profile, selectable_only=True)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
 
     # Update DB
+    job.last_accessed_at = time.time()
+    job.batch_id = None  # No longer part of an earlier batch's progress
     job.prompt = request.prompt
     job.status = "QUEUED" # Reset status to queued for editing
     db.commit()
 
-    # Trigger Celery Task
+    # Trigger the Edit Worker (in-process or via the durable queue)
     # process_video_edit.delay(job_id, request.prompt)
-    background_tasks.add_task(process_video_edit, job_id, request.prompt)
+    jobqueue.submit(background_tasks, db, "edit", job_id, prompt=request.prompt, edit_id=uuid.uuid4().hex)
 
     return {"message": "Prompt received. Editing started.", "status": "QUEUED"}
 
+# --- Batch edits: one prompt, many jobs ---
+@router.post("/batches")
+def submit_batch(request: BatchPromptRequest, background_tasks: BackgroundTasks,
+                 db: Session = Depends(get_db), user_id: int = Depends(get_current_user_id)):
+    """
+    Applies one prompt to many of the user's jobs. The prompt is parsed once;
+    clips the actions don't fit are listed in 'rejected' and left untouched.
+    Poll GET /jobs/batches/{batch_id} for aggregate progress.
+    """
+    job_ids = list(dict.fromkeys(request.job_ids))  # De-duplicated, order kept
+    if not job_ids:
+        raise HTTPException(status_code=400, detail="No job ids")
+    if len(job_ids) > settings.BATCH_MAX_JOBS:
+        raise HTTPException(status_code=400, detail=f"At most {settings.BATCH_MAX_JOBS} jobs per batch")
+    profile = None
+    if request.profile is not None:
+        try:
+            profile = encoding.resolve_profile(request.profile, selectable_only=True)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+
+    valid_ids = []
+    for job_id in job_ids:
+        try:
+            valid_ids.append(uuid.UUID(job_id))
+        except ValueError:
+            pass
+    jobs = db.query(VideoJob).filter(VideoJob.id.in_(valid_ids), VideoJob.user_id == user_id).all() if valid_ids else []
+    found = {str(job.id) for job in jobs}
+    missing = [job_id for job_id in job_ids if job_id not in found]
+
+    # Parse once for every clip (runs in the threadpool: it may wait on the LLM)
+    parsed = parse_prompt(request.prompt)
+    if not parsed.get("actions"):
+        return {"batch_id": None, "status": "CHAT_ONLY", "reply": parsed.get("reply"),
+                "accepted": [], "rejected": {}}
+
+    batch = batches.create(db, user_id, request.prompt, parsed, jobs, missing, profile)
+    batches.submit(background_tasks, db, batch)
+    return {"batch_id": batch.id, "status": "QUEUED", "reply": batch.reply,
+            "accepted": batch.job_ids, "rejected": batch.rejected}
+
+
+@router.get("/batches/{batch_id}")
+def get_batch(batch_id: str, db: Session = Depends(get_db), user_id: int = Depends(get_current_user_id)):
+    """Aggregate progress of a batch edit, plus each job's status."""
+    batch = db.query(EditBatch).filter(EditBatch.id == batch_id).first()
+    if not batch or batch.user_id != user_id:
+        raise HTTPException(status_code=404, detail="Batch not found")
+    return batches.progress(db, batch)
+
+
 # --- 2. CHECK STATUS ---
 @router.get("/{job_id}", response_model=JobStatusResponse)
 async def get_job_status(job_id: str, db: Session = Depends(get_db)):
@@ -166,48 +367,172 @@ async def get_job_status(job_id: str, db: Session = Depends(get_db)):
     if not job:
         raise HTTPException(status_code=404, detail="Job not found")
     
-    return {
-        "job_id": str(job.id),
-        "status": job.status,
-        "original_file": job.original_file_path,
-        "duration": job.duration,
-        "width": job.width,
-        "height": job.height,
-        "error": job.error_message,
-        "prompt": job.prompt,
-        "ai_reply": job.ai_reply
-    }
-# --- 3. DOWNLOAD VIDEO ---
-@router.get("/{job_id}/download")
-async def download_video(job_id: str, db: Session = Depends(get_db)):
+    return jobevents.job_snapshot(job)
+
+
+def _read_snapshot(job_id: str):
+    db = SessionLocal()
+    try:
+        job = db.query(VideoJob).filter(VideoJob.id == job_id).first()
+        return jobevents.job_snapshot(job) if job else None
+    finally:
+        db.close()
+
+
+def _sse(event: dict) -> str:
+    return f"event: status\ndata: {json.dumps(event, default=str)}\n\n"
+
+
+@router.get("/{job_id}/events")
+async def job_events(job_id: str, request: Request, db: Session = Depends(get_db)):
     """
-    Returns the video file stream.
+    Server-sent events: one 'status' event now, then one per change
+    (status, progress, errors). Replaces polling GET /jobs/{job_id}.
+    The stream stays open across edits; the client closes it when done.
     """
     job = db.query(VideoJob).filter(VideoJob.id == job_id).first()
     if not job:
         raise HTTPException(status_code=404, detail="Job not found")
-    
+    first = jobevents.job_snapshot(job)
+    db.close()  # Don't hold a pooled connection for the life of the stream
+
+    # Workers in other processes can only reach us through NOTIFY; without it, re-read while idle
+    poll = settings.JOB_QUEUE_BACKEND == "database" and not jobevents.uses_notify()
+    timeout = settings.JOB_EVENTS_POLL_SECONDS if poll else settings.JOB_EVENTS_KEEPALIVE_SECONDS
+
+    async def stream():
+        with jobevents.Subscription(job_id) as subscription:
+            last = first
+            yield _sse(first)
+            last_sent = time.monotonic()
+            while not await request.is_disconnected():
+                event = await subscription.next_event(timeout)
+                if event is None and poll:
+                    event = await asyncio.to_thread(_read_snapshot, job_id)
+                    if event == last:
+                        event = None
+                if event is not None:
+                    last = event
+                    yield _sse(event)
+                    last_sent = time.monotonic()
+                elif time.monotonic() - last_sent >= settings.JOB_EVENTS_KEEPALIVE_SECONDS:
+                    yield ": keepalive\n\n"  # Keeps proxies from closing an idle stream
+                    last_sent = time.monotonic()
+
+    return StreamingResponse(
+        stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+# --- 3. DOWNLOAD VIDEO ---
+# Players scrub with many Range requests; remember what to serve for a few seconds
+# instead of loading the whole job each time. A hit still re-reads the job's
+# versions (primary-key lookup, three columns), so a new edit or an evicted render
+# is never served from the cache. The ETag uses a fresh os.stat.
+_download_targets = {}  # job_id -> (expires_at, (edit_version, render_version, path), target)
+_download_targets_swept = 0.0
+
+
+def _sweep_download_targets(now: float):
+    global _download_targets_swept
+    if now - _download_targets_swept < settings.DOWNLOAD_META_TTL_SECONDS:
+        return
+    _download_targets_swept = now
+    for job_id, entry in list(_download_targets.items()):
+        if entry[0] <= now:
+            _download_targets.pop(job_id, None)
+
+
+def _download_target(db: Session, job_id: str, background_tasks: BackgroundTasks):
+    now = time.monotonic()
+    _sweep_download_targets(now)
+    cached = _download_targets.get(job_id)
+    if cached and cached[0] > now:
+        current = (
+            db.query(VideoJob.edit_version, VideoJob.render_version, VideoJob.edited_file_path)
+            .filter(VideoJob.id == job_id)
+            .first()
+        )
+        if current is not None and tuple(current) == cached[1]:
+            return cached[2]
+        _download_targets.pop(job_id, None)
+
+    job = db.query(VideoJob).filter(VideoJob.id == job_id).first()
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    storage.touch(db, job)
+
+    if (job.edit_version or 0) > (job.render_version or 0):
+        _request_full_render(db, job, background_tasks)
+        return None
+
     if job.edited_file_path and Path(job.edited_file_path).exists():
-        file_path = Path(job.edited_file_path)
-        filename = f"edited_{job.id}.mp4"
+        target = (job.edited_file_path, f"edited_{job.id}.mp4",
+                  (job.id, "edited", job.content_hash, job.render_version or 0))
+        versions = (job.edit_version, job.render_version, job.edited_file_path)
+        _download_targets[job_id] = (now + settings.DOWNLOAD_META_TTL_SECONDS, versions, target)
     else:
-        file_path = Path(job.original_file_path)
-        filename = f"original_{job.id}.mp4"
-    # --------------------
+        target = (job.original_file_path, f"original_{job.id}.mp4",
+                  (job.id, "original", job.content_hash))
+    return target
 
-    if not file_path.exists():
-        raise HTTPException(status_code=404, detail="File not found on server")
-    
 
-  
-    if not file_path.exists():
+def _request_full_render(db: Session, job: VideoJob, background_tasks: BackgroundTasks):
+    """Only a preview of the latest edit exists: make sure the full render is coming, first in line."""
+    if job.status in ("RENDER_QUEUED", "RENDERING"):
+        if settings.JOB_QUEUE_BACKEND == "database":
+            jobqueue.promote(db, "render", str(job.id), jobqueue.PRIORITY_HIGH)
+        return
+    if job.status in ("QUEUED", "EDITING"):
+        return  # The edit task schedules it when it's done
+    job.status = "RENDER_QUEUED"
+    db.commit()
+    jobevents.publish_job(job)
+    jobqueue.submit(background_tasks, db, "render", str(job.id), priority=jobqueue.PRIORITY_HIGH)
+
+
+def _serve(request: Request, file_path: str, filename: str, etag_parts, cache_key: str = None):
+    try:
+        stat = os.stat(file_path)
+        etag = delivery.strong_etag(*etag_parts, stat.st_size, stat.st_mtime_ns)
+        return delivery.file_response(request, file_path, filename, etag)
+    except FileNotFoundError:
+        if cache_key:
+            _download_targets.pop(cache_key, None)
         raise HTTPException(status_code=404, detail="File not found on server")
 
-    # Return file stream
-    return FileResponse(
-        path=file_path, 
-        filename=filename,
-        media_type="video/mp4"
-    )
+
+@router.api_route("/{job_id}/download", methods=["GET", "HEAD"])
+async def download_video(job_id: str, request: Request, background_tasks: BackgroundTasks,
+                         db: Session = Depends(get_db)):
+    """
+    Returns the video. Supports Range (206), If-Range, ETag/If-None-Match and
+    Last-Modified/If-Modified-Since (304).
+    While only a preview of the latest edit exists, starts the full render (or
+    moves it up the queue) and answers 202; retry after Retry-After seconds.
+    """
+    target = _download_target(db, job_id, background_tasks)
+    if target is None:
+        return JSONResponse(
+            status_code=202,
+            content={"message": "Full-quality render in progress.", "status": "RENDER_QUEUED",
+                     "preview": f"/jobs/{job_id}/preview"},
+            headers={"Retry-After": "5"},
+        )
+    file_path, filename, etag_parts = target
+    return _serve(request, file_path, filename, etag_parts, cache_key=job_id)
+
+
+@router.api_route("/{job_id}/preview", methods=["GET", "HEAD"])
+async def download_preview(job_id: str, request: Request, db: Session = Depends(get_db)):
+    """Low-resolution proxy of the latest edit, ready long before the full render."""
+    job = db.query(VideoJob).filter(VideoJob.id == job_id).first()
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    if not job.preview_file_path:
+        raise HTTPException(status_code=404, detail="No preview yet")
+    storage.touch(db, job)
+    return _serve(request, job.preview_file_path, f"preview_{job.id}.mp4",
+                  (job.id, "preview", job.content_hash, job.preview_version or 0))
 
 # NOTE: The /jobs/prompt endpoint will be added here next week!
\ No newline at end of file
@@ -0,0 +1,143 @@
+# backend/app/services/analysis.py
+import re
+import subprocess
+from backend.app.core.config import settings
+from backend.app.services import probecache
+
+# Single-decode analysis at upload time.
+# One FFmpeg run decodes the file ONCE and fans the frames out with split/asplit to:
+#   - silencedetect  -> silence intervals (remove_silence reuses them)
+#   - ebur128        -> integrated loudness + loudness range
+#   - select(scene)  -> scene-change timestamps
+#   - blackdetect    -> black-frame ranges
+# Stream metadata comes from the (cached) probe, so no extra ffprobe either.
+
+ANALYSIS_VERSION = 1
+
+# Silence defaults match SilenceAction, so a plain "remove silence" never re-decodes.
+DEFAULT_SILENCE_THRESHOLD = -30
+DEFAULT_SILENCE_MIN_DURATION = 0.5
+
+
+def _build_filter_graph(has_video: bool, has_audio: bool) -> tuple:
+    """Returns (filter_complex, output labels to map)."""
+    chains, outputs = [], []
+
+    if has_video:
+        # Scene/black detection don't need full resolution
+        chains.append("[0:v]scale=320:-2,split=2[vscene][vblack]")
+        chains.append(f"[vscene]select='gt(scene,{settings.ANALYSIS_SCENE_THRESHOLD})',showinfo[scenes]")
+        chains.append(f"[vblack]blackdetect=d={settings.ANALYSIS_BLACK_MIN_DURATION}:pix_th=0.10[black]")
+        outputs += ["[scenes]", "[black]"]
+
+    if has_audio:
+        chains.append("[0:a]asplit=2[asilence][aloud]")
+        chains.append(
+            f"[asilence]silencedetect=noise={DEFAULT_SILENCE_THRESHOLD}dB:d={DEFAULT_SILENCE_MIN_DURATION}[silence]"
+        )
+        chains.append("[aloud]ebur128=framelog=quiet[loud]")
+        outputs += ["[silence]", "[loud]"]
+
+    return ";".join(chains), outputs
+
+
+def parse_silences(output: str, total_duration: float) -> list:
+    """Reads silencedetect lines from stderr into [[start, end], ...]."""
+    starts = [float(x) for x in re.findall(r'silence_start: (-?\d+(?:\.\d+)?)', output)]
+    ends = [float(x) for x in re.findall(r'silence_end: (\d+(?:\.\d+)?)', output)]
+
+    intervals = []
+    for i, start in enumerate(starts):
+        # A silence still open at EOF has no silence_end line
+        end = ends[i] if i < len(ends) else total_duration
+        intervals.append([max(0.0, start), end])
+    return intervals
+
+
+def _parse_loudness(output: str) -> dict:
+    # The summary is printed once at the end; take the LAST match
+    integrated = re.findall(r'I:\s+(-?\d+(?:\.\d+)?) LUFS', output)
+    lra = re.findall(r'LRA:\s+(-?\d+(?:\.\d+)?) LU\b', output)
+    return {
+        "integrated_lufs": float(integrated[-1]) if integrated else None,
+        "lra": float(lra[-1]) if lra else None,
+    }
+
+
+def _parse_scenes(output: str) -> list:
+    return [float(x) for x in re.findall(r'Parsed_showinfo.*?pts_time:\s*(-?\d+(?:\.\d+)?)', output)]
+
+
+def _parse_black(output: str) -> list:
+    return [
+        [float(s), float(e)]
+        for s, e in re.findall(r'black_start:\s*(-?\d+(?:\.\d+)?)\s+black_end:\s*(-?\d+(?:\.\d+)?)', output)
+    ]
+
+
+def _stream_summary(probe: dict) -> list:
+    keep = ("index", "codec_type", "codec_name", "width", "height", "pix_fmt", "r_frame_rate",
+            "sample_rate", "channels", "channel_layout", "bit_rate", "duration")
+    return [{k: s[k] for k in keep if k in s} for s in probe.get("streams", [])]
+
+
+def analyze_media(file_path: str) -> dict:
+    """
+    Decodes the file once and returns the structured analysis record stored on the job.
+    """
+    probe = probecache.probe(file_path)
+    streams = probe.get("streams", [])
+    has_video = any(s.get("codec_type") == "video" for s in streams)
+    has_audio = any(s.get("codec_type") == "audio" for s in streams)
+    total_duration = float(probe.get("format", {}).get("duration", 0) or 0)
+
+    record = {
+        "version": ANALYSIS_VERSION,
+        "duration": total_duration,
+        "streams": _stream_summary(probe),
+        "silence": None,
+        "loudness": None,
+        "scenes": [],
+        "black": [],
+    }
+
+    filter_graph, outputs = _build_filter_graph(has_video, has_audio)
+    if not outputs:
+        return record
+
+    print(f"🔬 [ANALYSIS] Single-pass analysis of {file_path}...")
+    command = ["ffmpeg", "-hide_banner", "-nostats", "-i", file_path, "-filter_complex", filter_graph]
+    for label in outputs:
+        command += ["-map", label]
+    command += ["-f", "null", "-"]
+
+    result = subprocess.run(command, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True)
+    if result.returncode != 0:
+        raise RuntimeError(f"Analysis failed: {result.stderr[-500:]}")
+    output = result.stderr
+
+    if has_audio:
+        record["silence"] = {
+            "threshold": DEFAULT_SILENCE_THRESHOLD,
+            "min_duration": DEFAULT_SILENCE_MIN_DURATION,
+            "intervals": parse_silences(output, total_duration),
+        }
+        record["loudness"] = _parse_loudness(output)
+    if has_video:
+        record["scenes"] = _parse_scenes(output)
+        record["black"] = _parse_black(output)
+
+    print(f"✅ [ANALYSIS] {len(record['scenes'])} scenes, "
+          f"{len(record['silence']['intervals']) if record['silence'] else 0} silences, "
+          f"{len(record['black'])} black ranges")
+    return record
+
+
+def cached_silences(analysis: dict, db_threshold, min_duration):
+    """Silence intervals from the analysis record, if it was computed with these settings."""
+    if not analysis or not analysis.get("silence"):
+        return None
+    silence = analysis["silence"]
+    if float(silence["threshold"]) == float(db_threshold) and float(silence["min_duration"]) == float(min_duration):
+        return silence["intervals"]
+    return None
@@ -0,0 +1,60 @@
+# backend/app/services/authcache.py
+import threading
+import time
+from collections import OrderedDict
+from sqlalchemy import event
+from backend.app.core.config import settings
+from backend.app.db.models import User
+
+# Every authenticated request used to run "SELECT ... FROM users WHERE id = ?"
+# only to confirm that the token's user still exists. Verified ids are now
+# remembered per process for AUTH_USER_CACHE_TTL_SECONDS (LRU-bounded).
+# The cache only vouches that the user row exists, so deleting it is the one
+# change that matters: an ORM delete (session.delete(user)) invalidates the id
+# in this process through the listener below. Other processes, and bulk
+# DELETEs that bypass the ORM, keep accepting the user's tokens for at most
+# the TTL: that is the revocation bound, so keep the TTL short.
+
+_verified = OrderedDict()  # user_id -> expires_at (monotonic)
+_lock = threading.Lock()
+counters = {"hits": 0, "misses": 0}
+
+
+def is_verified(user_id: int) -> bool:
+    now = time.monotonic()
+    with _lock:
+        expires_at = _verified.get(user_id)
+        if expires_at is not None and expires_at > now:
+            _verified.move_to_end(user_id)
+            counters["hits"] += 1
+            return True
+        _verified.pop(user_id, None)
+        counters["misses"] += 1
+        return False
+
+
+def remember(user_id: int):
+    with _lock:
+        _verified[user_id] = time.monotonic() + settings.AUTH_USER_CACHE_TTL_SECONDS
+        _verified.move_to_end(user_id)
+        while len(_verified) > settings.AUTH_USER_CACHE_MAX_ENTRIES:
+            _verified.popitem(last=False)
+
+
+def invalidate(user_id: int = None):
+    """Forgets one user (or everyone), so their next request checks the database again."""
+    with _lock:
+        if user_id is None:
+            _verified.clear()
+        else:
+            _verified.pop(user_id, None)
+
+
+@event.listens_for(User, "after_delete")
+def _user_deleted(mapper, connection, user):
+    invalidate(user.id)
+
+
+def stats() -> dict:
+    with _lock:
+        return {**counters, "entries": len(_verified)}
@@ -0,0 +1,155 @@
+# backend/app/services/batches.py
+import time
+import uuid
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+from backend.app.core.config import settings
+from backend.app.db.models import ACTIVE_JOB_STATUSES, EditBatch, VideoJob
+from backend.app.services import jobqueue
+
+# Batch edits: one prompt ("make it a vintage reel") for many clips.
+#   POST /jobs/batches {prompt, job_ids}  -> parse ONCE, check the actions
+#                                           against each clip, queue the edits
+#   GET  /jobs/batches/{id}              -> aggregate progress
+# Every edit task gets the parsed actions in its payload, so N clips cost one
+# parse (one LLM call at most) instead of N. Fan-out is bounded:
+#   database backend   -> one queued task per job at PRIORITY_BATCH, so the
+#                         worker pool bounds it and interactive edits go first
+#   background backend -> one background task running BATCH_MAX_CONCURRENCY
+#                         edits at a time
+
+DONE_STATUSES = {"COMPLETED", "CHAT_ONLY"}
+AUDIO_ACTIONS = {"remove_silence", "auto_subtitles"}
+
+
+def validate_for_clip(actions: list, job: VideoJob) -> Optional[str]:
+    """Why 'actions' can't be applied to this job right now, or None if they can."""
+    if job.status == "EXPIRED":
+        return "The original video was removed"
+    if job.status in ACTIVE_JOB_STATUSES:
+        return f"Job is busy ({job.status})"
+    if job.duration is None:
+        return "Clip metadata is missing (ingest didn't finish)"
+
+    streams = (job.analysis or {}).get("streams")
+    has_audio = any(s.get("codec_type") == "audio" for s in streams) if streams else True
+    for action in actions:
+        kind = action.get("type")
+        if kind == "trim":
+            try:
+                start = float(action.get("start", 0))
+            except (TypeError, ValueError):
+                return "Trim start is not a number"
+            if start >= job.duration:
+                return f"Trim starts at {start:g}s but the clip is {job.duration:.1f}s long"
+        elif kind in AUDIO_ACTIONS and not has_audio:
+            return f"'{kind}' needs an audio track and this clip has none"
+    return None
+
+
+def create(db, user_id: int, prompt: str, parsed: dict, jobs: list, missing: list,
+           profile: str = None) -> EditBatch:
+    """Records the batch, validates every job and marks the accepted ones QUEUED."""
+    batch_id = uuid.uuid4().hex
+    rejected = {job_id: "Job not found" for job_id in missing}
+    accepted = []
+    now = time.time()
+    for job in jobs:
+        reason = validate_for_clip(parsed["actions"], job)
+        if reason:
+            rejected[str(job.id)] = reason
+            continue
+        job.prompt = prompt
+        job.status = "QUEUED"
+        job.batch_id = batch_id
+        job.last_accessed_at = now
+        if profile:
+            job.encode_profile = profile
+        accepted.append(str(job.id))
+
+    batch = EditBatch(
+        id=batch_id,
+        user_id=user_id,
+        prompt=prompt,
+        actions=parsed["actions"],
+        reply=parsed.get("reply"),
+        job_ids=accepted,
+        rejected=rejected,
+        created_at=now,
+    )
+    db.add(batch)
+    db.commit()
+    return batch
+
+
+def submit(background_tasks, db, batch: EditBatch):
+    """Hands the batch's edits to the configured queue backend."""
+    parsed = {"actions": batch.actions, "reply": batch.reply}
+    if settings.JOB_QUEUE_BACKEND == "database":
+        for job_id in batch.job_ids:
+            jobqueue.enqueue(db, "edit", job_id, {"prompt": batch.prompt, "parsed": parsed, "edit_id": uuid.uuid4().hex},
+                             priority=jobqueue.PRIORITY_BATCH)
+        print(f"📥 [QUEUE] Enqueued batch {batch.id} ({len(batch.job_ids)} edits)")
+    elif batch.job_ids:
+        background_tasks.add_task(_run_inline, list(batch.job_ids), time.time(), batch.prompt, parsed)
+
+
+def _run_inline(job_ids: list, submitted_at: float, prompt: str, parsed: dict):
+    with ThreadPoolExecutor(max_workers=max(1, settings.BATCH_MAX_CONCURRENCY),
+                            thread_name_prefix="batch-edit") as pool:
+        futures = {job_id: pool.submit(jobqueue.run_inline, "edit", submitted_at, job_id, prompt=prompt, parsed=parsed)
+                   for job_id in job_ids}
+    for job_id, future in futures.items():
+        try:
+            result = future.result()
+        except Exception as e:
+            print(f"❌ [BATCH] Edit of job {job_id} crashed: {e}")
+            continue
+        if isinstance(result, dict) and result.get("status") == "FAILED":
+            print(f"❌ [BATCH] Edit of job {job_id} failed: {result.get('error')}")
+
+
+def _finished_statuses() -> set:
+    """
+    Statuses that end a batch job's edit. With FULL_RENDER_MODE="on_download"
+    the full render only starts when someone downloads, so a preview is the end.
+    """
+    if settings.PREVIEW_RENDER and settings.FULL_RENDER_MODE == "on_download":
+        return DONE_STATUSES | {"PREVIEW_READY"}
+    return DONE_STATUSES
+
+
+def progress(db, batch: EditBatch) -> dict:
+    """Aggregate status of a batch (jobs re-prompted on their own since are no longer counted)."""
+    rows = (
+        db.query(VideoJob.id, VideoJob.status, VideoJob.progress, VideoJob.error_message)
+        .filter(VideoJob.batch_id == batch.id)
+        .all()
+    )
+    jobs = [{"job_id": str(row.id), "status": row.status, "progress": row.progress, "error": row.error_message}
+            for row in rows]
+    counts = Counter(job["status"] for job in jobs)
+    completed = sum(counts[status] for status in DONE_STATUSES)  # Full renders done
+    finished_statuses = _finished_statuses()
+    finished = sum(counts[status] for status in finished_statuses)
+    failed = counts["FAILED"]
+
+    # Finished jobs count as 100%, running ones by their render progress
+    percents = [100.0 if job["status"] in finished_statuses or job["status"] == "FAILED" else (job["progress"] or 0.0)
+                for job in jobs]
+    return {
+        "batch_id": batch.id,
+        "prompt": batch.prompt,
+        "actions": batch.actions,
+        "reply": batch.reply,
+        "total": len(jobs),
+        "completed": completed,
+        "failed": failed,
+        "previews_ready": counts["PREVIEW_READY"],
+        "status_counts": dict(counts),
+        "progress": round(sum(percents) / len(percents), 1) if percents else 100.0,
+        "done": finished + failed == len(jobs),
+        "jobs": jobs,
+        "rejected": batch.rejected or {},
+    }
@@ -0,0 +1,145 @@
+# backend/app/services/blobstore.py
+import os
+import time
+from pathlib import Path
+from sqlalchemy.exc import IntegrityError
+from backend.app.core.config import settings
+from backend.app.db.models import MediaBlob
+
+# Content-addressed storage for uploads.
+# Every upload is hashed while it streams in (services/uploads.py). The file is
+# then stored once under BLOB_STORE_DIR/<2 hex>/<sha256><ext>, and a media_blobs
+# row counts how many jobs use it. A re-upload of the same clip (retries,
+# re-opened projects, one template clip used by many users) only bumps
+# ref_count and drops the new copy.
+# Ingest results (metadata, keyframes, analysis) are stored on the blob, so a
+# duplicate skips ingest entirely. Every job on the blob opens the same path,
+# so probecache entries are shared as well.
+# Job outputs (edits, previews) are per job: see job_output_path().
+
+
+def storage_dir() -> Path:
+    return Path(__file__).resolve().parent.parent.parent / "temp_storage"
+
+
+def blob_dir() -> Path:
+    if settings.BLOB_STORE_DIR:
+        return Path(settings.BLOB_STORE_DIR)
+    return storage_dir() / "blobs"
+
+
+def blob_path(content_hash: str, extension: str) -> Path:
+    return blob_dir() / content_hash[:2] / f"{content_hash}{extension.lower()}"
+
+
+def job_output_path(job, kind: str) -> str:
+    """Where a job's own render goes ('edited' keeps the upload's container, 'preview' is MP4)."""
+    if kind == "preview":
+        extension = ".mp4"
+    else:
+        extension = os.path.splitext(job.original_file_path)[1].lower() or ".mp4"
+    return str(storage_dir() / f"{kind}_{job.id}{extension}")
+
+
+def get(db, content_hash: str):
+    if not content_hash:
+        return None
+    return db.query(MediaBlob).filter(MediaBlob.content_hash == content_hash).first()
+
+
+def _add_reference(db, content_hash: str) -> bool:
+    """Atomically bumps ref_count. False if there is no row yet."""
+    updated = db.query(MediaBlob).filter(MediaBlob.content_hash == content_hash).update(
+        {MediaBlob.ref_count: MediaBlob.ref_count + 1, MediaBlob.last_used_at: time.time()},
+        synchronize_session=False,
+    )
+    db.commit()
+    return updated > 0
+
+
+def adopt(db, temp_path: Path, content_hash: str, extension: str) -> Path:
+    """
+    Takes ownership of a fully written upload at temp_path and returns the path
+    the job should use. If the content is already stored the new copy is deleted.
+    """
+    temp_path = Path(temp_path)
+    if _add_reference(db, content_hash):
+        blob = get(db, content_hash)
+        if os.path.exists(blob.file_path):
+            os.remove(temp_path)
+            return Path(blob.file_path)
+        # The stored file went missing (manual cleanup): this upload restores it
+        Path(blob.file_path).parent.mkdir(parents=True, exist_ok=True)
+        os.replace(temp_path, blob.file_path)
+        return Path(blob.file_path)
+
+    final_path = blob_path(content_hash, extension)
+    final_path.parent.mkdir(parents=True, exist_ok=True)
+    # Same name = same bytes, so replacing a concurrent writer's copy is harmless
+    os.replace(temp_path, final_path)
+    now = time.time()
+    db.add(MediaBlob(
+        content_hash=content_hash,
+        file_path=str(final_path),
+        size=os.path.getsize(final_path),
+        ref_count=1,
+        created_at=now,
+        last_used_at=now,
+    ))
+    try:
+        db.commit()
+    except IntegrityError:
+        # Another upload of the same content registered it first
+        db.rollback()
+        _add_reference(db, content_hash)
+        return Path(get(db, content_hash).file_path)
+    return final_path
+
+
+def release(db, content_hash: str) -> bool:
+    """Drops one reference. Deletes the file (and row) once nothing uses it; True if it did."""
+    if not content_hash:
+        return False
+    # Row lock: a concurrent adopt() waits on it and then either sees our
+    # decrement or, once the row is gone, stores its own copy
+    blob = db.query(MediaBlob).filter(MediaBlob.content_hash == content_hash).with_for_update().first()
+    if blob is None:
+        db.rollback()
+        return False
+    blob.ref_count = (blob.ref_count or 0) - 1
+    if blob.ref_count > 0:
+        db.commit()
+        return False
+
+    try:
+        os.remove(blob.file_path)  # Still under the lock; a row without its file is re-filled by adopt()
+    except FileNotFoundError:
+        pass
+    db.delete(blob)
+    db.commit()
+    return True
+
+
+def record_ingest(db, content_hash: str, metadata: dict, keyframes=None, analysis=None):
+    """Stores one job's ingest results for every other job on the same content."""
+    blob = get(db, content_hash)
+    if blob is None:
+        return
+    blob.ingest = metadata
+    blob.keyframes = keyframes
+    blob.analysis = analysis
+    db.commit()
+
+
+def apply_ingest(job, blob) -> bool:
+    """Copies stored ingest results onto 'job'. False if the blob hasn't been ingested yet."""
+    if blob is None or not blob.ingest:
+        return False
+    job.duration = blob.ingest.get("duration")
+    job.width = blob.ingest.get("width")
+    job.height = blob.ingest.get("height")
+    job.fps = blob.ingest.get("fps")
+    job.codec = blob.ingest.get("codec")
+    job.keyframes = blob.keyframes
+    job.analysis = blob.analysis
+    return True
@@ -0,0 +1,175 @@
+# backend/app/services/delivery.py
+import hashlib
+import os
+import re
+import stat as stat_module
+from email.utils import formatdate, parsedate_to_datetime
+from urllib.parse import quote
+import anyio
+from starlette.responses import Response
+from backend.app.core.config import settings
+from backend.app.services import blobstore
+
+# Video downloads that players and CDNs can work with:
+#   - Range: bytes=... -> 206 Partial Content (scrubbing never re-downloads the file)
+#   - ETag / Last-Modified + If-None-Match / If-Modified-Since -> 304
+#   - If-Range, so a resumed download never mixes two different renders
+# Bytes are sent with zero copies when possible:
+#   1. DOWNLOAD_ACCEL_PREFIX set   -> X-Accel-Redirect, nginx sendfile()s the file
+#      (only for files under temp_storage, which is what that location maps to;
+#      e.g. a BLOB_STORE_DIR elsewhere is served by 2./3.)
+#   2. ASGI server offers "http.response.zerocopysend" -> we hand it the fd
+#   3. otherwise                   -> fixed-size reads in a worker thread
+
+READ_CHUNK = 1024 * 1024
+_RANGE = re.compile(r"^\s*(\d*)\s*-\s*(\d*)\s*$")
+
+
+def strong_etag(*parts) -> str:
+    """Strong validator: changes whenever any of 'parts' (version, hash, size, mtime...) does."""
+    digest = hashlib.sha256("\x1f".join(str(p) for p in parts).encode("utf-8")).hexdigest()[:32]
+    return f'"{digest}"'
+
+
+def _etag_matches(header: str, etag: str) -> bool:
+    if header.strip() == "*":
+        return True
+    # If-None-Match uses weak comparison (W/"x" matches "x")
+    candidates = [tag.strip() for tag in header.split(",")]
+    return any(tag[2:] == etag if tag.startswith("W/") else tag == etag for tag in candidates)
+
+
+def _not_modified_since(header: str, mtime: float) -> bool:
+    try:
+        return int(mtime) <= parsedate_to_datetime(header).timestamp()
+    except (TypeError, ValueError, IndexError):
+        return False
+
+
+def parse_range(header: str, size: int):
+    """
+    (start, end) inclusive for a single 'bytes=' range, None to ignore the header
+    (malformed or multi-range: a full 200 is always allowed), or "unsatisfiable".
+    """
+    unit, _, spec = header.partition("=")
+    if unit.strip().lower() != "bytes" or "," in spec:
+        return None
+    match = _RANGE.match(spec)
+    if not match or match.group(1) == match.group(2) == "":
+        return None
+
+    first, last = match.group(1), match.group(2)
+    if first == "":
+        # Suffix range: the last N bytes
+        length = int(last)
+        if length == 0:
+            return "unsatisfiable"
+        return max(0, size - length), size - 1
+    start = int(first)
+    end = int(last) if last else size - 1
+    if end < start:
+        return None  # Invalid range: ignore it
+    if start >= size:
+        return "unsatisfiable"
+    return start, min(end, size - 1)
+
+
+class RangeFileResponse(Response):
+    """Sends bytes [start, end] of a file (the whole file for a 200)."""
+
+    def __init__(self, path: str, start: int, end: int, status_code: int, headers: dict, send_body: bool = True):
+        super().__init__(status_code=status_code, headers=headers)
+        self.path = path
+        self.start = start
+        self.end = end
+        self.send_body = send_body
+        self.headers["content-length"] = str(max(0, end - start + 1))
+
+    async def __call__(self, scope, receive, send):
+        await send({"type": "http.response.start", "status": self.status_code, "headers": self.raw_headers})
+        count = self.end - self.start + 1
+        if not self.send_body or count <= 0:
+            await send({"type": "http.response.body", "body": b"", "more_body": False})
+            return
+
+        if "http.response.zerocopysend" in scope.get("extensions", {}):
+            with open(self.path, "rb") as f:
+                await send({"type": "http.response.zerocopysend", "file": f.fileno(),
+                            "offset": self.start, "count": count, "more_body": False})
+            return
+
+        async with await anyio.open_file(self.path, "rb") as f:
+            await f.seek(self.start)
+            remaining = count
+            while remaining:
+                data = await f.read(min(READ_CHUNK, remaining))
+                if not data:
+                    break
+                remaining -= len(data)
+                await send({"type": "http.response.body", "body": data, "more_body": remaining > 0})
+            if remaining:
+                await send({"type": "http.response.body", "body": b"", "more_body": False})
+
+
+def _accel_target(path: str):
+    """The X-Accel-Redirect URI for 'path', or None if nginx's location can't reach it."""
+    root = os.path.realpath(blobstore.storage_dir())
+    relative = os.path.relpath(os.path.realpath(path), root)
+    if relative == os.pardir or relative.startswith(os.pardir + os.sep) or os.path.isabs(relative):
+        return None
+    return settings.DOWNLOAD_ACCEL_PREFIX.rstrip("/") + "/" + quote(relative.replace(os.sep, "/"))
+
+
+def file_response(request, path: str, filename: str, etag: str, media_type: str = "video/mp4") -> Response:
+    """
+    Full conditional + range handling for one file. 'etag' comes from strong_etag(),
+    built from whatever identifies this exact content (job, render version, hash...).
+    """
+    st = os.stat(path)
+    if not stat_module.S_ISREG(st.st_mode):
+        raise FileNotFoundError(path)
+    size = st.st_size
+    headers = {
+        "etag": etag,
+        "last-modified": formatdate(st.st_mtime, usegmt=True),
+        "cache-control": settings.DOWNLOAD_CACHE_CONTROL,
+        "accept-ranges": "bytes",
+    }
+
+    # 304: the client (or CDN) already has exactly this render
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        if _etag_matches(if_none_match, etag):
+            return Response(status_code=304, headers=headers)
+    elif _not_modified_since(request.headers.get("if-modified-since"), st.st_mtime):
+        return Response(status_code=304, headers=headers)
+
+    headers["content-type"] = media_type
+    headers["content-disposition"] = f"attachment; filename*=utf-8''{quote(filename)}"
+
+    byte_range = None
+    range_header = request.headers.get("range")
+    if range_header and request.method in ("GET", "HEAD"):
+        if_range = request.headers.get("if-range")
+        # A resume is only valid against the same render; otherwise send it all again
+        if if_range is None or if_range.strip() == etag:
+            byte_range = parse_range(range_header, size)
+
+    if byte_range == "unsatisfiable":
+        headers["content-range"] = f"bytes */{size}"
+        headers.pop("content-disposition")
+        return Response(status_code=416, headers=headers)
+
+    accel = _accel_target(path) if settings.DOWNLOAD_ACCEL_PREFIX else None
+    if accel:
+        # nginx serves the bytes (sendfile, ranges); we only did auth + validators
+        headers["x-accel-redirect"] = accel
+        return Response(status_code=200, headers=headers)
+
+    send_body = request.method != "HEAD"
+    if byte_range is None:
+        return RangeFileResponse(path, 0, size - 1, 200, headers, send_body)
+
+    start, end = byte_range
+    headers["content-range"] = f"bytes {start}-{end}/{size}"
+    return RangeFileResponse(path, start, end, 206, headers, send_body)
@@ -0,0 +1,94 @@
+# backend/app/services/encoding.py
+import os
+from backend.app.core.config import settings
+
+# Named encoder profiles for the final ffmpeg.output() of a render.
+# Without them FFmpeg picks libx264 "medium" / CRF 23 and its own thread count
+# for every job, which is slow for drafts and not pinned down for exports.
+#   draft    - iterate quickly (several times faster than "standard")
+#   standard - default delivery quality
+#   archive  - final export: higher quality, fixed threads + bitexact flags so the
+#              same input, actions and FFmpeg build give byte-identical output
+#   preview  - low-res proxies (see PREVIEW_RENDER), GOP length set per clip
+
+ENCODE_PROFILES = {
+    "draft": {
+        "preset": "veryfast",
+        "crf": 28,
+        "threads": None,         # None -> settings.ENCODE_THREADS
+        "audio_bitrate": "128k",
+        "bitexact": False,
+    },
+    "standard": {
+        "preset": "fast",
+        "crf": 23,
+        "threads": None,
+        "audio_bitrate": "160k",
+        "bitexact": False,       # Threads aren't pinned, so output isn't reproducible anyway
+    },
+    "archive": {
+        "preset": "slow",
+        "crf": 18,
+        "threads": 4,            # Fixed: x264 output depends on the thread count
+        "audio_bitrate": "192k",
+        "bitexact": True,
+    },
+    "preview": {
+        "preset": "ultrafast",
+        "crf": None,             # None -> settings.PREVIEW_CRF
+        "threads": None,
+        "audio_bitrate": "96k",
+        "bitexact": False,
+        "gop_seconds": None,     # None -> settings.PREVIEW_GOP_SECONDS
+    },
+}
+
+# Profiles pick the codec explicitly, so only containers that take H.264/AAC get them.
+# Anything else (e.g. .webm) keeps FFmpeg's per-container defaults.
+H264_CONTAINERS = {".mp4", ".m4v", ".mov", ".3gp", ".mkv", ".avi", ".ts"}
+FASTSTART_CONTAINERS = {".mp4", ".m4v", ".mov", ".3gp"}
+
+
+def resolve_profile(name: str = None, selectable_only: bool = False) -> str:
+    """
+    The profile to use ('name' or the configured default). Raises ValueError if unknown.
+    selectable_only: for names coming from the API, where internal profiles aren't allowed.
+    """
+    name = (name or settings.ENCODE_PROFILE).strip().lower()
+    allowed = selectable_profiles() if selectable_only else ENCODE_PROFILES
+    if name not in allowed:
+        raise ValueError(f"Unknown encode profile '{name}'. Choose one of: {', '.join(selectable_profiles())}")
+    return name
+
+
+def selectable_profiles() -> list:
+    """Profiles a user can pick for a job (preview is internal)."""
+    return [name for name in ENCODE_PROFILES if name != "preview"]
+
+
+def output_kwargs(profile: str, output_path: str, fps: float = None) -> dict:
+    """ffmpeg.output() keyword arguments for 'profile' when writing 'output_path'."""
+    spec = ENCODE_PROFILES[resolve_profile(profile)]
+    extension = os.path.splitext(output_path)[1].lower()
+
+    threads = spec["threads"] if spec["threads"] is not None else settings.ENCODE_THREADS
+    kwargs = {"threads": threads}
+    if extension not in H264_CONTAINERS:
+        return kwargs
+
+    kwargs.update({
+        "vcodec": "libx264",
+        "preset": spec["preset"],
+        "crf": spec["crf"] if spec["crf"] is not None else settings.PREVIEW_CRF,
+        "pix_fmt": "yuv420p",  # Plays everywhere (10-bit / 4:2:2 phone footage doesn't)
+        "acodec": "aac",
+        "audio_bitrate": spec["audio_bitrate"],
+    })
+    if "gop_seconds" in spec:
+        gop_seconds = spec["gop_seconds"] if spec["gop_seconds"] is not None else settings.PREVIEW_GOP_SECONDS
+        kwargs["g"] = max(1, int(round((fps or 30.0) * gop_seconds)))  # Short GOP -> fast scrubbing
+    if extension in FASTSTART_CONTAINERS:
+        kwargs["movflags"] = "+faststart"  # moov atom first: playback starts before the download ends
+    if spec["bitexact"]:
+        kwargs.update({"fflags": "+bitexact", "flags:v": "+bitexact", "flags:a": "+bitexact"})
+    return kwargs
@@ -0,0 +1,184 @@
+# backend/app/services/jobevents.py
+import asyncio
+import json
+import os
+import select
+import threading
+import time
+import uuid
+from collections import defaultdict
+from sqlalchemy import text
+from backend.app.core.config import settings
+from backend.app.db.database import SessionLocal, engine
+from backend.app.db.models import VideoJob
+
+# Push-based job status.
+# Workers call publish_job(job) after every status/progress commit. Subscribers
+# (GET /jobs/{id}/events, server-sent events) get the update immediately.
+#   - Same process (BackgroundTasks): in-process pub/sub, no DB involved.
+#   - Other processes (python -m backend.worker) on Postgres: NOTIFY job_events
+#     with just the job id (payloads are capped at 8000 bytes and prompts aren't),
+#     and one LISTEN thread per API process re-reads the job for its local
+#     subscribers.
+#   - Other processes on a DB without NOTIFY: the SSE stream re-reads the row
+#     every JOB_EVENTS_POLL_SECONDS, but only while idle.
+
+CHANNEL = "job_events"
+ORIGIN = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"  # Skip our own NOTIFYs
+
+_subscribers = defaultdict(set)  # job_id -> {(loop, queue)}
+_lock = threading.Lock()
+_listener = None
+LISTENER_RETRY_SECONDS = 5.0
+
+
+def job_snapshot(job) -> dict:
+    """Everything the frontend needs about a job (same shape as JobStatusResponse)."""
+    return {
+        "job_id": str(job.id),
+        "status": job.status,
+        "original_file": job.original_file_path,
+        "duration": job.duration,
+        "width": job.width,
+        "height": job.height,
+        "error": job.error_message,
+        "prompt": job.prompt,
+        "ai_reply": job.ai_reply,
+        "progress": job.progress,
+        "render_fps": job.render_fps,
+        "render_speed": job.render_speed,
+        "eta_seconds": job.eta_seconds,
+        "preview_ready": bool(job.preview_file_path) and (job.preview_version or 0) >= (job.edit_version or 0),
+    }
+
+
+def uses_notify() -> bool:
+    return settings.JOB_EVENTS_NOTIFY and engine.dialect.name == "postgresql"
+
+
+# --- Publishing (any thread) ---
+def _dispatch_local(job_id: str, event: dict):
+    with _lock:
+        targets = list(_subscribers.get(job_id, ()))
+    for loop, queue in targets:
+        try:
+            loop.call_soon_threadsafe(queue.put_nowait, event)
+        except RuntimeError:
+            pass  # Loop already closed, subscriber is going away
+
+
+def publish(job_id: str, event: dict, version: int = None):
+    job_id = str(job_id)
+    _dispatch_local(job_id, event)
+
+    if uses_notify():
+        payload = json.dumps({"origin": ORIGIN, "job_id": job_id, "version": version})
+        try:
+            with engine.begin() as conn:
+                conn.execute(text("SELECT pg_notify(:channel, :payload)"), {"channel": CHANNEL, "payload": payload})
+        except Exception as e:
+            print(f"⚠️ [EVENTS] NOTIFY failed: {e}")
+
+
+def publish_job(job):
+    """Call right after committing a change to 'job'."""
+    publish(str(job.id), job_snapshot(job), version=job.edit_version)
+
+
+# --- Subscribing (event loop) ---
+class Subscription:
+    def __init__(self, job_id: str):
+        self.job_id = str(job_id)
+        self.queue = asyncio.Queue()
+        self._entry = (asyncio.get_running_loop(), self.queue)
+
+    def __enter__(self):
+        with _lock:
+            _subscribers[self.job_id].add(self._entry)
+        return self
+
+    def __exit__(self, *exc):
+        with _lock:
+            subscribers = _subscribers.get(self.job_id)
+            if subscribers is not None:
+                subscribers.discard(self._entry)
+                if not subscribers:
+                    del _subscribers[self.job_id]
+
+    async def next_event(self, timeout: float):
+        """The next event, or None after 'timeout' seconds of silence."""
+        try:
+            event = await asyncio.wait_for(self.queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+        # Progress can arrive faster than the client reads; only the latest matters
+        while not self.queue.empty():
+            event = self.queue.get_nowait()
+        return event
+
+
+# --- Cross-process bridge (Postgres LISTEN) ---
+def _has_subscribers(job_id: str) -> bool:
+    with _lock:
+        return bool(_subscribers.get(job_id))
+
+
+def _dispatch_from_db(job_ids):
+    """Re-reads each notified job once and hands the snapshot to local subscribers."""
+    job_ids = [job_id for job_id in job_ids if _has_subscribers(job_id)]
+    if not job_ids:
+        return
+    db = SessionLocal()
+    try:
+        for job in db.query(VideoJob).filter(VideoJob.id.in_(job_ids)).all():
+            _dispatch_local(str(job.id), job_snapshot(job))
+    finally:
+        db.close()
+
+
+def _listen_once():
+    raw = engine.raw_connection()
+    try:
+        connection = raw.driver_connection if hasattr(raw, "driver_connection") else raw.connection
+        connection.set_isolation_level(0)  # autocommit, required for LISTEN
+        cursor = connection.cursor()
+        cursor.execute(f"LISTEN {CHANNEL};")
+        print(f"👂 [EVENTS] Listening on '{CHANNEL}'")
+        while True:
+            if select.select([connection], [], [], 30) == ([], [], []):
+                continue
+            connection.poll()
+            # A burst of progress NOTIFYs for one job costs one read
+            job_ids = set()
+            while connection.notifies:
+                notify = connection.notifies.pop(0)
+                try:
+                    message = json.loads(notify.payload)
+                except ValueError:
+                    continue
+                if message.get("origin") != ORIGIN and message.get("job_id"):
+                    job_ids.add(message["job_id"])
+            _dispatch_from_db(job_ids)
+    finally:
+        raw.close()
+
+
+def _listen_forever():
+    while True:
+        try:
+            _listen_once()
+        except Exception as e:
+            print(f"❌ [EVENTS] Listener stopped: {e} (reconnecting in {LISTENER_RETRY_SECONDS:g}s)")
+        time.sleep(LISTENER_RETRY_SECONDS)
+
+
+def start_listener():
+    """Starts the LISTEN thread once per process (no-op when NOTIFY isn't available)."""
+    global _listener
+    if not uses_notify():
+        return
+    with _lock:
+        if _listener is not None and _listener.is_alive():
+            return
+        _listener = threading.Thread(target=_listen_forever, name="job-events-listener", daemon=True)
+        _listener.start()
@@ -0,0 +1,297 @@
+# backend/app/services/jobqueue.py
+import os
+import signal
+import socket
+import threading
+import time
+import uuid
+from sqlalchemy import or_, and_
+from backend.app.core.config import settings
+from backend.app.db.database import SessionLocal
+from backend.app.db.models import QueuedTask
+from backend.app.services import leases, metrics
+from backend.app.tasks import dummy_video_processing, process_video_edit, render_full_quality
+
+# Durable job queue stored in the main database.
+# - The API only INSERTs a row (fast, survives restarts).
+# - Workers (python -m backend.worker) claim rows with
+#   SELECT ... FOR UPDATE SKIP LOCKED, so N workers on N hosts never run the same task.
+# - A running task renews its lease with heartbeats. If a worker dies, the lease
+#   runs out and another worker re-claims the task (up to max_attempts).
+#   A worker whose lease was lost anyway (re-leased after a stall) is told via
+#   leases; the edit handler then stops instead of racing the new owner.
+# With JOB_QUEUE_BACKEND="background" everything still runs in-process via
+# FastAPI BackgroundTasks (single-box deploys).
+
+TASK_HANDLERS = {
+    "ingest": dummy_video_processing,
+    "edit": process_video_edit,
+    "render": render_full_quality,
+}
+
+PRIORITY_HIGH = 10
+PRIORITY_NORMAL = 100
+PRIORITY_BATCH = 500    # Batch edits: after interactive work, before background renders
+PRIORITY_LOW = 1000
+
+# At most one PENDING task of these kinds per job: a second enqueue only moves
+# the pending one up (a render always renders the job's latest edit anyway)
+SINGLE_PENDING_KINDS = {"render"}
+
+
+# --- Producer side (API) ---
+def enqueue(db, kind: str, job_id: str, payload: dict = None, priority: int = PRIORITY_NORMAL) -> QueuedTask:
+    if kind in SINGLE_PENDING_KINDS:
+        pending = (
+            db.query(QueuedTask)
+            .filter(QueuedTask.kind == kind, QueuedTask.job_id == str(job_id), QueuedTask.status == "PENDING")
+            .first()
+        )
+        if pending is not None:
+            if priority < pending.priority:
+                pending.priority = priority
+            db.commit()
+            return pending
+    task = QueuedTask(
+        kind=kind,
+        job_id=str(job_id),
+        payload=payload or {},
+        priority=priority,
+        status="PENDING",
+        attempts=0,
+        max_attempts=settings.JOB_QUEUE_MAX_ATTEMPTS,
+        created_at=time.time(),
+    )
+    db.add(task)
+    db.commit()
+    return task
+
+
+def submit(background_tasks, db, kind: str, job_id: str, priority: int = PRIORITY_NORMAL, **payload):
+    """
+    Hands work to whichever backend is configured.
+    Routers call this instead of background_tasks.add_task(...).
+    """
+    if settings.JOB_QUEUE_BACKEND == "database":
+        enqueue(db, kind, job_id, payload, priority)
+        print(f"📥 [QUEUE] Enqueued {kind} for job {job_id}")
+    else:
+        background_tasks.add_task(run_inline, kind, time.time(), str(job_id), **payload)
+
+
+def _task_outcome(result) -> str:
+    return "error" if isinstance(result, dict) and result.get("status") == "FAILED" else "ok"
+
+
+def run_inline(kind: str, submitted_at: float, job_id: str, **payload):
+    """Runs a task in this process, timed like a worker-run task. Returns the handler's result."""
+    metrics.observe("queue_wait", time.time() - submitted_at, action=kind)
+    with metrics.stage("task", kind) as span:
+        result = TASK_HANDLERS[kind](job_id, **payload)
+        span.outcome = _task_outcome(result)
+    return result
+
+
+def promote(db, kind: str, job_id: str, priority: int) -> int:
+    """Moves still-PENDING tasks of a job up the queue (e.g. a full render someone now waits for)."""
+    updated = (
+        db.query(QueuedTask)
+        .filter(QueuedTask.kind == kind, QueuedTask.job_id == str(job_id),
+                QueuedTask.status == "PENDING", QueuedTask.priority > priority)
+        .update({QueuedTask.priority: priority})
+    )
+    db.commit()
+    return updated
+
+
+# --- Consumer side (workers) ---
+CLAIM_RACE_RETRIES = 5
+
+
+def claim(db, worker_id: str):
+    """Atomically takes the next runnable task, or returns None."""
+    for _ in range(CLAIM_RACE_RETRIES):
+        claimed, task = _try_claim(db, worker_id)
+        if claimed:
+            return task
+    return None  # Lost every race this round; the worker polls again
+
+
+def _try_claim(db, worker_id: str):
+    """One claim attempt. (True, task|None) when settled, (False, None) if another worker won the row."""
+    now = time.time()
+    task = (
+        db.query(QueuedTask)
+        .filter(or_(
+            QueuedTask.status == "PENDING",
+            and_(QueuedTask.status == "RUNNING", QueuedTask.lease_expires_at < now),
+        ))
+        .order_by(QueuedTask.priority, QueuedTask.id)
+        .with_for_update(skip_locked=True)
+        .first()
+    )
+    if not task:
+        db.commit()  # Release the (empty) transaction
+        return True, None
+
+    # SKIP LOCKED makes the SELECT exclusive on Postgres; SQLite ignores it. The
+    # UPDATE only matches the row as we saw it, so of two workers that read the
+    # same row exactly one takes it.
+    seen = and_(
+        QueuedTask.id == task.id,
+        QueuedTask.status == task.status,
+        QueuedTask.attempts == task.attempts,
+    )
+    if task.status == "RUNNING":
+        print(f"♻️ [QUEUE] Re-leasing task {task.id} (worker {task.worker_id} stopped heartbeating)")
+        if task.attempts >= task.max_attempts:
+            db.query(QueuedTask).filter(seen).update({
+                QueuedTask.status: "FAILED",
+                QueuedTask.error: f"Gave up after {task.attempts} attempts (lease expired)",
+                QueuedTask.finished_at: now,
+            }, synchronize_session=False)
+            db.commit()
+            return False, None  # Settled either way; look for the next runnable task
+
+    updated = db.query(QueuedTask).filter(seen).update({
+        QueuedTask.status: "RUNNING",
+        QueuedTask.worker_id: worker_id,
+        QueuedTask.attempts: (task.attempts or 0) + 1,
+        QueuedTask.started_at: now,
+        QueuedTask.heartbeat_at: now,
+        QueuedTask.lease_expires_at: now + settings.JOB_QUEUE_LEASE_SECONDS,
+    }, synchronize_session=False)
+    db.commit()
+    if updated != 1:
+        return False, None
+    db.refresh(task)
+    return True, task
+
+
+def _heartbeat(task_id: int, worker_id: str, stop: threading.Event, lost: threading.Event):
+    """
+    Renews the lease until 'stop' is set. Runs in its own thread + session.
+    Sets 'lost' and quits once the task is no longer ours: re-leased to another
+    worker, or renewals kept failing until the lease ran out.
+    """
+    renewed_at = time.time()
+    while not stop.wait(settings.JOB_QUEUE_HEARTBEAT_SECONDS):
+        db = SessionLocal()
+        try:
+            now = time.time()
+            updated = (
+                db.query(QueuedTask)
+                .filter(QueuedTask.id == task_id, QueuedTask.worker_id == worker_id,
+                        QueuedTask.status == "RUNNING")
+                .update({
+                    QueuedTask.heartbeat_at: now,
+                    QueuedTask.lease_expires_at: now + settings.JOB_QUEUE_LEASE_SECONDS,
+                })
+            )
+            db.commit()
+            if not updated:
+                print(f"⚠️ [QUEUE] Task {task_id} was re-leased to another worker, stopping it here")
+                lost.set()
+                return
+            renewed_at = now
+        except Exception as e:
+            print(f"⚠️ [QUEUE] Heartbeat failed for task {task_id}: {e}")
+            db.rollback()
+            if time.time() - renewed_at > settings.JOB_QUEUE_LEASE_SECONDS:
+                print(f"⚠️ [QUEUE] Lease of task {task_id} ran out, stopping it here")
+                lost.set()
+                return
+        finally:
+            db.close()
+
+
+def _finish(task_id: int, worker_id: str, status: str, error: str = None):
+    db = SessionLocal()
+    try:
+        (
+            db.query(QueuedTask)
+            .filter(QueuedTask.id == task_id, QueuedTask.worker_id == worker_id)
+            .update({
+                QueuedTask.status: status,
+                QueuedTask.error: error,
+                QueuedTask.finished_at: time.time(),
+            })
+        )
+        db.commit()
+    finally:
+        db.close()
+
+
+def run_task(task: QueuedTask, worker_id: str):
+    """Runs one claimed task with a heartbeat thread alongside."""
+    handler = TASK_HANDLERS.get(task.kind)
+    task_id, job_id, payload = task.id, task.job_id, dict(task.payload or {})
+    queue_wait = (task.started_at or time.time()) - task.created_at
+    print(f"🏃 [QUEUE] {worker_id} running {task.kind} task {task_id} (job {job_id}, waited {queue_wait:.1f}s)")
+    metrics.observe("queue_wait", queue_wait, action=task.kind)
+
+    if handler is None:
+        _finish(task_id, worker_id, "FAILED", f"Unknown task kind: {task.kind}")
+        return
+
+    stop = threading.Event()
+    lost = threading.Event()
+    beat = threading.Thread(target=_heartbeat, args=(task_id, worker_id, stop, lost), daemon=True)
+    beat.start()
+    leases.hold(lost)
+    try:
+        with metrics.stage("task", task.kind) as span:
+            result = handler(job_id, **payload)
+            span.outcome = _task_outcome(result)
+        if span.outcome == "error":
+            _finish(task_id, worker_id, "FAILED", result.get("error"))
+        else:
+            _finish(task_id, worker_id, "DONE")
+    except leases.LeaseLost:
+        # The task isn't ours to settle: its new owner (or the next claim) runs it
+        print(f"🛑 [QUEUE] Task {task_id} stopped, its lease was lost")
+    except Exception as e:
+        print(f"❌ [QUEUE] Task {task_id} crashed: {e}")
+        _finish(task_id, worker_id, "FAILED", str(e))
+    finally:
+        leases.release()
+        stop.set()
+        beat.join()
+
+
+def run_worker(worker_id: str = None, poll_interval: float = None):
+    """
+    Main loop of a standalone worker process. Stops cleanly on SIGINT/SIGTERM
+    after the current task.
+    """
+    worker_id = worker_id or f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:6]}"
+    poll_interval = poll_interval or settings.JOB_QUEUE_POLL_SECONDS
+    stopping = threading.Event()
+
+    def _stop(signum, frame):
+        print(f"🛑 [QUEUE] {worker_id} stopping after the current task...")
+        stopping.set()
+
+    signal.signal(signal.SIGINT, _stop)
+    signal.signal(signal.SIGTERM, _stop)
+
+    print(f"👷 [QUEUE] Worker {worker_id} started")
+    while not stopping.is_set():
+        db = SessionLocal()
+        try:
+            task = claim(db, worker_id)
+            if task is not None:
+                db.expunge(task)  # Keep the loaded values after the session closes
+        except Exception as e:
+            print(f"⚠️ [QUEUE] Claim failed: {e}")
+            db.rollback()
+            task = None
+        finally:
+            db.close()
+
+        if task is None:
+            stopping.wait(poll_interval)
+            continue
+        run_task(task, worker_id)
+
+    print(f"👋 [QUEUE] Worker {worker_id} stopped")
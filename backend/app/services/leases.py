@@ -0,0 +1,33 @@
+# backend/app/services/leases.py
+import threading
+
+# Lost-lease signal for queue tasks (JOB_QUEUE_BACKEND="database").
+# jobqueue.run_task registers an Event for the thread running the handler; the
+# heartbeat sets it once the task's lease belongs to another worker or ran out.
+# Handlers call check() at their checkpoints (progress callbacks, before saving
+# results) and stop with LeaseLost instead of racing the task's new owner.
+# Outside a queue worker nothing is registered and check() never raises.
+
+_current = threading.local()
+
+
+class LeaseLost(Exception):
+    pass
+
+
+def hold(lost: threading.Event):
+    _current.lost = lost
+
+
+def release():
+    _current.lost = None
+
+
+def lost() -> bool:
+    event = getattr(_current, "lost", None)
+    return event is not None and event.is_set()
+
+
+def check():
+    if lost():
+        raise LeaseLost("Lease lost: another worker owns this task now")
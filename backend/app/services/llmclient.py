@@ -0,0 +1,110 @@
+# backend/app/services/llmclient.py
+import asyncio
+import random
+import threading
+import httpx
+from openai import AsyncOpenAI, APIConnectionError, APITimeoutError, RateLimitError, InternalServerError
+from backend.app.core.config import settings
+
+# Async, pooled LLM client.
+# - ONE AsyncOpenAI client with a keep-alive connection pool (no TLS handshake per prompt)
+# - A semaphore caps in-flight requests, so a slow provider can't eat every worker thread
+# - Every call has a deadline and a small budget of jittered retries
+# All calls run on a private event loop thread, so sync callers (BackgroundTasks
+# threads, render workers) and async callers share the same pool.
+
+RETRYABLE_ERRORS = (APIConnectionError, APITimeoutError, RateLimitError, InternalServerError, asyncio.TimeoutError)
+
+
+class LLMTimeoutError(Exception):
+    """Raised when a request misses its overall deadline (queue wait + retries)."""
+
+
+class LLMClient:
+    def __init__(self, base_url: str = None, api_key: str = None, model: str = None):
+        self.base_url = base_url or settings.SAMBANOVA_BASE_URL
+        self.api_key = api_key or settings.SAMBANOVA_API_KEY
+        self.model = model or settings.SAMBANOVA_MODEL
+
+        self._client = None
+        self._semaphore = None
+        self._loop = None
+        self._loop_thread = None
+        self._lock = threading.Lock()
+
+    # --- Setup (lazy, so importing this module never opens sockets) ---
+    def _ensure_client(self):
+        if self._client is None:
+            http_client = httpx.AsyncClient(
+                limits=httpx.Limits(
+                    max_connections=settings.LLM_MAX_CONNECTIONS,
+                    max_keepalive_connections=settings.LLM_MAX_CONNECTIONS,
+                    keepalive_expiry=60,
+                ),
+                timeout=httpx.Timeout(settings.LLM_TIMEOUT_SECONDS, connect=settings.LLM_CONNECT_TIMEOUT_SECONDS),
+            )
+            self._client = AsyncOpenAI(
+                base_url=self.base_url,
+                api_key=self.api_key,
+                http_client=http_client,
+                max_retries=0,  # We do our own retries with jitter below
+            )
+            self._semaphore = asyncio.Semaphore(settings.LLM_MAX_CONCURRENCY)
+
+    def _ensure_loop(self):
+        with self._lock:
+            if self._loop is None:
+                self._loop = asyncio.new_event_loop()
+                self._loop_thread = threading.Thread(target=self._loop.run_forever, name="llm-client-loop", daemon=True)
+                self._loop_thread.start()
+        return self._loop
+
+    # --- Public API ---
+    async def chat(self, messages: list, temperature: float = 0.1) -> str:
+        """
+        Sends one chat completion and returns the message text.
+        Raises LLMTimeoutError if the whole call (waiting + retries) misses the deadline.
+        """
+        # The pool and semaphore belong to the client loop, so always run there
+        future = asyncio.run_coroutine_threadsafe(self._chat(messages, temperature), self._ensure_loop())
+        return await asyncio.wrap_future(future)
+
+    def chat_sync(self, messages: list, temperature: float = 0.1) -> str:
+        """Blocking wrapper for threads. Runs on the shared client loop."""
+        future = asyncio.run_coroutine_threadsafe(self._chat(messages, temperature), self._ensure_loop())
+        return future.result()
+
+    # --- Internals ---
+    async def _chat(self, messages: list, temperature: float) -> str:
+        self._ensure_client()
+        try:
+            return await asyncio.wait_for(self._chat_with_retries(messages, temperature), settings.LLM_DEADLINE_SECONDS)
+        except asyncio.TimeoutError:
+            raise LLMTimeoutError(f"LLM call missed its {settings.LLM_DEADLINE_SECONDS}s deadline")
+
+    async def _chat_with_retries(self, messages: list, temperature: float) -> str:
+        attempt = 0
+        while True:
+            try:
+                async with self._semaphore:
+                    response = await asyncio.wait_for(
+                        self._client.chat.completions.create(
+                            model=self.model,
+                            messages=messages,
+                            temperature=temperature,
+                        ),
+                        settings.LLM_TIMEOUT_SECONDS,
+                    )
+                return response.choices[0].message.content.strip()
+            except RETRYABLE_ERRORS as e:
+                attempt += 1
+                if attempt > settings.LLM_MAX_RETRIES:
+                    raise
+                # Exponential backoff with full jitter
+                delay = random.uniform(0, settings.LLM_RETRY_BASE_DELAY * (2 ** (attempt - 1)))
+                print(f"⚠️ [AI] {type(e).__name__}, retry {attempt}/{settings.LLM_MAX_RETRIES} in {delay:.2f}s")
+                await asyncio.sleep(delay)
+
+
+# Shared instance used by promptparser
+llm_client = LLMClient()
@@ -0,0 +1,97 @@
+# backend/app/services/metrics.py
+import os
+import time
+from contextlib import contextmanager
+from prometheus_client import (
+    CONTENT_TYPE_LATEST, CollectorRegistry, Counter, Gauge, Histogram, REGISTRY, generate_latest, multiprocess,
+)
+
+# Per-stage timing for the edit pipeline, exposed in Prometheus format.
+#   editverse_stage_seconds{stage, action, outcome}  - histogram per stage
+#   editverse_stage_total{stage, action, outcome}    - how often each stage ran / how it ended
+# Stages: queue_wait, parse, probe, silence, graph_build, encode, smart_trim,
+# parallel_render, db_commit, task (a whole queued task, 'action' = its kind),
+# storage_sweep.
+# 'action' is the sorted set of action types involved ("filter+trim"), or the
+# task kind for queue_wait. 'outcome' is "ok" / "error", or where the result
+# came from when that's the interesting part (parse: rule/cache/llm, probe:
+# memory/db/ffprobe, silence: analysis/envelope/silencedetect).
+#
+# API and workers run in separate processes. Set PROMETHEUS_MULTIPROC_DIR (an
+# empty, shared-per-host directory) and /metrics aggregates all of them; worker
+# hosts can also serve their own with `python -m backend.worker --metrics-port`.
+
+# Seconds: from fast cache hits (ms) to long renders (tens of minutes)
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600, 1800, 3600)
+
+STAGE_SECONDS = Histogram(
+    "editverse_stage_seconds", "Time spent in each pipeline stage",
+    ["stage", "action", "outcome"], buckets=BUCKETS,
+)
+STAGE_TOTAL = Counter(
+    "editverse_stage_total", "Pipeline stage executions",
+    ["stage", "action", "outcome"],
+)
+CACHE_EVENTS = Counter(
+    "editverse_cache_events_total", "Cache lookups and maintenance",
+    ["cache", "event"],  # event: hit | miss | store | evict
+)
+STORAGE_BYTES = Gauge(
+    "editverse_storage_bytes", "Bytes in temp_storage after the last sweep",
+    ["kind"],  # original | render | preview | cache | temp | orphan | total
+    multiprocess_mode="mostrecent",
+)
+STORAGE_EVICTED_BYTES = Counter(
+    "editverse_storage_evicted_bytes_total", "Bytes freed by the storage sweeper",
+    ["kind"],
+)
+
+
+def action_label(actions) -> str:
+    """Bounded label for a list of actions: unique types, sorted, joined by '+'."""
+    types = sorted({a.get("type", "unknown") for a in actions or [] if isinstance(a, dict)})
+    return "+".join(types) if types else "none"
+
+
+def observe(stage: str, seconds: float, action: str = "none", outcome: str = "ok"):
+    STAGE_SECONDS.labels(stage, action, outcome).observe(seconds)
+    STAGE_TOTAL.labels(stage, action, outcome).inc()
+
+
+class _Span:
+    def __init__(self, outcome: str):
+        self.outcome = outcome
+
+
+@contextmanager
+def stage(name: str, action: str = "none", outcome: str = "ok"):
+    """
+    Times the block as 'name'. Set span.outcome inside the block to label how it
+    ended; an exception always records "error".
+        with metrics.stage("probe") as span:
+            ...
+            span.outcome = "memory"
+    """
+    span = _Span(outcome)
+    start = time.perf_counter()
+    try:
+        yield span
+    except BaseException:
+        span.outcome = "error"
+        raise
+    finally:
+        observe(name, time.perf_counter() - start, action, span.outcome)
+
+
+def registry():
+    """Registry to export: every process's samples in multiprocess mode, else this one's."""
+    if os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        collected = CollectorRegistry()
+        multiprocess.MultiProcessCollector(collected)
+        return collected
+    return REGISTRY
+
+
+def exposition():
+    """(body, content type) for a /metrics response."""
+    return generate_latest(registry()), CONTENT_TYPE_LATEST
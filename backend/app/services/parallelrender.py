@@ -0,0 +1,215 @@
+# backend/app/services/parallelrender.py
+import ffmpeg
+import multiprocessing
+import os
+import queue
+import shutil
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from backend.app.services.smarttrim import concat_segments
+from backend.app.services import probecache
+from backend.app.services.progress import CombinedProgress
+
+# Segment-parallel rendering:
+# The source is split at keyframes into N time chunks, the VIDEO of every chunk
+# is rendered with the same action graph in its own process, and the chunk
+# outputs are joined with the concat demuxer (no second encode).
+# Audio is rendered once over the whole window alongside the chunks: per-chunk
+# AAC encodes each carry priming samples, which click at every join and let
+# the audio drift against the video.
+# Filters like zoompan / curves / drawtext are single-threaded, so this is the
+# only way to keep every core busy on a long clip.
+# Chunk processes send their progress snapshots back over a queue; the calling
+# thread combines them (by output seconds) and passes them to on_progress.
+
+# Actions that depend on state carried across the whole clip. A graph with any
+# of these is rendered in one piece.
+NON_CHUNKABLE_ACTIONS = {"remove_silence", "zoom"}
+
+
+def split_timeline(actions: list):
+    """
+    Separates the timeline actions from the per-frame graph.
+    Trims are folded into one (start, end) source window (mapped through any
+    speed change that came before them) and removed from the graph.
+
+    Returns (start, end, fade_span, graph_actions), or None if the actions
+    can't be rendered chunk by chunk.
+    'fade_span' is how many SOURCE seconds the first chunk must cover so that
+    every fade-in stays inside it.
+    """
+    start, end = 0.0, None
+    speed = 1.0
+    fade_span = 0.0
+    graph = []
+
+    for action in actions:
+        action_type = action.get('type')
+        if action_type in NON_CHUNKABLE_ACTIONS:
+            return None
+
+        if action_type == 'trim':
+            if fade_span > 0:
+                return None  # A trim after a fade moves the fade, keep it simple.
+            new_start = start + float(action['start']) * speed
+            new_end = start + float(action['end']) * speed
+            if end is not None:
+                new_end = min(new_end, end)
+            start, end = new_start, new_end
+            continue
+
+        if action_type == 'speed':
+            speed *= float(action['value'])
+        elif action_type == 'fade' and action.get('kind', 'in') == 'in':
+            fade_span = max(fade_span, float(action.get('duration', 1.0)) * speed)
+
+        graph.append(action)
+
+    if end is not None and end <= start:
+        return None
+    return start, end, fade_span, graph
+
+
+def plan_chunks(keyframes: list, start: float, end: float, workers: int, min_first: float = 0.0) -> list:
+    """
+    Picks up to 'workers' chunks of roughly equal length, each starting on a keyframe.
+    Returns a list of (chunk_start, chunk_end) in source seconds.
+    """
+    span = end - start
+    candidates = [k for k in keyframes if start + min_first < k < end]
+
+    cuts = []
+    for i in range(1, workers):
+        target = start + span * i / workers
+        if not candidates:
+            break
+        best = min(candidates, key=lambda k: abs(k - target))
+        if best not in cuts and (not cuts or best > cuts[-1]):
+            cuts.append(best)
+
+    bounds = [start] + cuts + [end]
+    return list(zip(bounds[:-1], bounds[1:]))
+
+
+PROGRESS_POLL_SECONDS = 0.2
+
+_progress_queue = None  # In a chunk process: where its progress snapshots go
+
+
+def _init_worker(progress_queue=None):
+    """Process-pool initializer: drop the DB connections inherited from the parent."""
+    global _progress_queue
+    from backend.app.db.database import engine
+    engine.dispose(close=False)  # close=False: the parent still owns those sockets
+    _progress_queue = progress_queue
+
+
+def _render_chunk(job: tuple) -> str:
+    """Process-pool entry point. Renders one chunk with the normal graph builder."""
+    # Imported here: vidpro imports this module to dispatch parallel renders.
+    from backend.app.services.vidpro import apply_edits
+
+    index, input_path, graph, output_path, chunk_start, chunk_end, music_offset, profile, streams = job
+    on_progress = None
+    if _progress_queue is not None:
+        on_progress = lambda snapshot: _progress_queue.put((index, snapshot))
+    return apply_edits(
+        input_path, graph,
+        output_path=output_path,
+        start=chunk_start,
+        end=chunk_end,
+        music_offset=music_offset,
+        workers=1,  # Already one chunk of a parallel render
+        profile=profile,
+        use_cache=False,  # Chunks are temporary; the stitched result is cached by the caller
+        streams=streams,
+        on_progress=on_progress,
+    )
+
+
+def _relay_progress(progress_queue, futures: list, progress: CombinedProgress):
+    """Passes the chunks' snapshots on (in this thread) until every chunk is done."""
+    try:
+        while True:
+            try:
+                index, snapshot = progress_queue.get(timeout=PROGRESS_POLL_SECONDS)
+            except queue.Empty:
+                if all(future.done() for future in futures):
+                    break
+                continue
+            progress.update(index, snapshot)
+    except BaseException:
+        for future in futures:
+            future.cancel()  # on_progress wants us to stop: don't start the chunks still waiting
+        raise
+
+
+def render_parallel(input_path: str, actions: list, keyframes: list, output_path: str,
+                    workers: int, min_duration: float = 0.0, profile: str = None, on_progress=None):
+    """
+    Renders 'actions' on input_path using 'workers' processes, reporting
+    combined render snapshots to on_progress.
+    Returns output_path, or None if the clip/graph isn't worth splitting
+    (the caller should then render in one piece).
+    """
+    timeline = split_timeline(actions)
+    if not timeline or not keyframes or workers < 2:
+        return None
+
+    start, end, fade_span, graph = timeline
+    if not graph:
+        return None  # Trim-only, nothing to parallelise
+
+    probe = probecache.probe(input_path)
+    total_duration = float(probe['format']['duration'])
+    has_audio = any(s.get('codec_type') == 'audio' for s in probe.get('streams', []))
+    end = total_duration if end is None else min(end, total_duration)
+    if end - start < min_duration:
+        return None
+
+    chunks = plan_chunks(keyframes, start, end, workers, min_first=fade_span)
+    if len(chunks) < 2:
+        return None
+
+    # Output speed of the whole graph, used to place each chunk on the output timeline
+    speed = 1.0
+    for action in graph:
+        if action.get('type') == 'speed':
+            speed *= float(action['value'])
+
+    work_dir = tempfile.mkdtemp(prefix="parallel_", dir=os.path.dirname(output_path) or None)
+    progress_queue = multiprocessing.Queue() if on_progress else None
+    try:
+        jobs = []
+        for i, (chunk_start, chunk_end) in enumerate(chunks):
+            # Fades are anchored to the start of the clip, so only chunk 0 keeps them
+            chunk_graph = graph if i == 0 else [a for a in graph if a.get('type') != 'fade']
+            music_offset = (chunk_start - start) / speed
+            chunk_path = os.path.join(work_dir, f"chunk_{i:03d}.mp4")
+            jobs.append((i, input_path, chunk_graph, chunk_path, chunk_start, chunk_end, music_offset, profile, "video"))
+        audio_path = None
+        if has_audio:
+            # The whole window in one piece, with the full graph (fades, speed, music)
+            audio_path = os.path.join(work_dir, "audio.mp4")
+            jobs.append((len(jobs), input_path, graph, audio_path, start, end, 0.0, profile, "audio"))
+        # Output seconds each job renders
+        progress = CombinedProgress(on_progress, [(job[5] - job[4]) / speed for job in jobs])
+
+        print(f"🧩 Rendering {len(chunks)} chunks on {workers} processes...")
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                 initargs=(progress_queue,)) as pool:
+            futures = [pool.submit(_render_chunk, job) for job in jobs]
+            if progress_queue is not None:
+                _relay_progress(progress_queue, futures, progress)
+            rendered = [future.result() for future in futures]
+        chunk_paths = rendered[:len(chunks)]
+
+        audio_source = (audio_path, 0.0, None) if audio_path else None
+        concat_segments(chunk_paths, output_path, audio_source=audio_source, audio_codec='copy')
+        progress.finish()
+        print(f"✅ Stitched {len(chunk_paths)} chunks into {output_path}")
+        return output_path
+    finally:
+        if progress_queue is not None:
+            progress_queue.close()
+        shutil.rmtree(work_dir, ignore_errors=True)
@@ -0,0 +1,108 @@
+# backend/app/services/probecache.py
+import copy
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+import ffmpeg
+from backend.app.core.config import settings
+from backend.app.db.database import SessionLocal
+from backend.app.db.models import MediaProbe
+from backend.app.services import metrics
+
+# One edit used to spawn ffprobe 3+ times on the same file (metadata, apply_edits,
+# silence detection...). Every consumer now calls probe() instead of ffmpeg.probe():
+#   1. In-process LRU         -> no syscall beyond os.stat
+#   2. media_probes table     -> shared across API / worker processes
+#   3. ffprobe                -> stored in both layers
+# The key includes size + mtime, so a rewritten file is re-probed automatically.
+
+_entries = OrderedDict()  # key -> probe dict
+_lock = threading.Lock()
+counters = {"memory_hits": 0, "db_hits": 0, "misses": 0}
+
+
+def _file_key(file_path: str):
+    path = os.path.abspath(file_path)
+    stat = os.stat(path)
+    key = hashlib.sha256(f"{path}\n{stat.st_size}\n{stat.st_mtime_ns}".encode("utf-8")).hexdigest()
+    return key, path, stat
+
+
+def _remember(key: str, result: dict):
+    with _lock:
+        _entries[key] = result
+        _entries.move_to_end(key)
+        while len(_entries) > settings.PROBE_CACHE_MAX_ENTRIES:
+            _entries.popitem(last=False)
+
+
+def probe(file_path: str) -> dict:
+    """
+    Drop-in replacement for ffmpeg.probe(file_path).
+    Returns the full ffprobe JSON (format + streams). Callers get their own copy.
+    """
+    start = time.perf_counter()
+    source = "error"
+    try:
+        result, source = _lookup(file_path)
+        return result
+    finally:
+        metrics.observe("probe", time.perf_counter() - start, outcome=source)
+
+
+def _lookup(file_path: str):
+    """(probe, where it came from: memory | db | ffprobe)"""
+    key, path, stat = _file_key(file_path)
+
+    # 1. Memory
+    with _lock:
+        cached = _entries.get(key)
+        if cached is not None:
+            _entries.move_to_end(key)
+            counters["memory_hits"] += 1
+            return copy.deepcopy(cached), "memory"
+
+    # 2. Database
+    db = SessionLocal()
+    try:
+        try:
+            row = db.query(MediaProbe).filter(MediaProbe.key == key).first()
+        except Exception as e:
+            print(f"⚠️ [PROBE] DB lookup failed: {e}")
+            db.rollback()
+            row = None
+
+        if row is not None:
+            counters["db_hits"] += 1
+            _remember(key, row.probe)
+            return copy.deepcopy(row.probe), "db"
+
+        # 3. ffprobe
+        counters["misses"] += 1
+        result = ffmpeg.probe(path)
+        _remember(key, result)
+
+        try:
+            db.merge(MediaProbe(
+                key=key,
+                file_path=path,
+                size=stat.st_size,
+                mtime_ns=stat.st_mtime_ns,
+                probe=result,
+            ))
+            db.commit()
+        except Exception as e:
+            # Caching is best-effort, the probe itself succeeded
+            print(f"⚠️ [PROBE] DB write failed: {e}")
+            db.rollback()
+
+        return copy.deepcopy(result), "ffprobe"
+    finally:
+        db.close()
+
+
+def stats() -> dict:
+    with _lock:
+        return {**counters, "entries": len(_entries)}
@@ -0,0 +1,159 @@
+# backend/app/services/progress.py
+import time
+from backend.app.core.config import settings
+from backend.app.services.jobevents import publish_job
+from backend.app.services import metrics
+
+# Render progress from FFmpeg's "-progress pipe:1" stream.
+# FFmpeg writes blocks of key=value lines, each block ending with
+# "progress=continue" (or "progress=end" at the very end):
+#   frame=250
+#   fps=61.3
+#   out_time_us=10010000
+#   speed=2.45x
+#   progress=continue
+
+
+class ProgressParser:
+    """Turns raw -progress lines into snapshots (one per block)."""
+
+    def __init__(self, expected_duration: float = None):
+        self.expected_duration = expected_duration
+        self._block = {}
+
+    def feed(self, line: str):
+        """Returns a snapshot dict when a block is complete, else None."""
+        line = line.strip()
+        if "=" not in line:
+            return None
+        key, value = line.split("=", 1)
+        self._block[key.strip()] = value.strip()
+        if key != "progress":
+            return None
+
+        block, self._block = self._block, {}
+        return self._snapshot(block)
+
+    def _snapshot(self, block: dict) -> dict:
+        out_time = _to_float(block.get("out_time_us"))
+        out_time = out_time / 1_000_000 if out_time is not None else None
+        speed = _to_float(block.get("speed", "").rstrip("x"))
+        finished = block.get("progress") == "end"
+
+        percent, eta = None, None
+        if finished:
+            percent, eta = 100.0, 0.0
+        elif out_time is not None and self.expected_duration:
+            percent = max(0.0, min(99.9, out_time / self.expected_duration * 100))
+            if speed:
+                eta = max(0.0, (self.expected_duration - out_time) / speed)
+
+        return {
+            "percent": round(percent, 1) if percent is not None else None,
+            "out_time": out_time,
+            "fps": _to_float(block.get("fps")),
+            "speed": speed,
+            "eta_seconds": round(eta, 1) if eta is not None else None,
+            "finished": finished,
+        }
+
+
+def _to_float(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None  # "N/A" before the first frame
+
+
+class JobProgressWriter:
+    """
+    Progress callback that stores snapshots on a VideoJob, at most once every
+    RENDER_PROGRESS_INTERVAL seconds (plus the final one), so a fast encoder
+    doesn't turn into a DB write storm.
+    """
+
+    def __init__(self, db, job, interval: float = None):
+        self.db = db
+        self.job = job
+        self.interval = settings.RENDER_PROGRESS_INTERVAL if interval is None else interval
+        self._last_write = 0.0
+
+    def __call__(self, snapshot: dict):
+        now = time.monotonic()
+        if not snapshot["finished"] and now - self._last_write < self.interval:
+            return
+        self._last_write = now
+
+        self.job.progress = snapshot["percent"]
+        self.job.render_fps = snapshot["fps"]
+        self.job.render_speed = snapshot["speed"]
+        self.job.eta_seconds = snapshot["eta_seconds"]
+        try:
+            with metrics.stage("db_commit", "progress"):
+                self.db.commit()
+            publish_job(self.job)
+        except Exception as e:
+            # Progress is informative only, never fail the render for it
+            print(f"⚠️ [PROGRESS] Could not save progress: {e}")
+            self.db.rollback()
+
+
+class CombinedProgress:
+    """
+    One progress stream for an output built by several FFmpeg runs (smart-trim
+    segments, parallel chunks and their audio pass). Each part counts by the
+    output seconds it produces; speed is output seconds per wall-clock second
+    across all of them. Feed it from one thread.
+    """
+
+    def __init__(self, on_progress, durations: list):
+        self.on_progress = on_progress
+        self.durations = [max(0.0, duration or 0.0) for duration in durations]
+        self.total = sum(self.durations)
+        self._done = [0.0] * len(self.durations)
+        self._fps = [None] * len(self.durations)
+        self._started = time.monotonic()
+
+    def part(self, index: int):
+        """on_progress callback for part 'index' (None if nobody listens)."""
+        if self.on_progress is None:
+            return None
+        return lambda snapshot: self.update(index, snapshot)
+
+    def update(self, index: int, snapshot: dict):
+        if snapshot["finished"]:
+            self._done[index] = self.durations[index]
+            self._fps[index] = None
+        else:
+            if snapshot["out_time"] is not None:
+                self._done[index] = max(0.0, min(self.durations[index], snapshot["out_time"]))
+            self._fps[index] = snapshot["fps"]
+        self._emit(finished=False)
+
+    def finish(self):
+        self._emit(finished=True)
+
+    def _emit(self, finished: bool):
+        if self.on_progress is None:
+            return
+        out_time = self.total if finished else sum(self._done)
+        elapsed = time.monotonic() - self._started
+        speed = out_time / elapsed if out_time and elapsed > 0 else None
+
+        percent, eta = None, None
+        if finished:
+            percent, eta = 100.0, 0.0
+        elif self.total:
+            percent = max(0.0, min(99.9, out_time / self.total * 100))
+            if speed:
+                eta = max(0.0, (self.total - out_time) / speed)
+
+        fps = [value for value in self._fps if value]
+        self.on_progress({
+            "percent": round(percent, 1) if percent is not None else None,
+            "out_time": out_time,
+            "fps": round(sum(fps), 1) if fps else None,
+            "speed": round(speed, 2) if speed else None,
+            "eta_seconds": round(eta, 1) if eta is not None else None,
+            "finished": finished,
+        })
@@ -0,0 +1,255 @@
+# backend/app/services/promptcache.py
+import copy
+import hashlib
+import re
+import threading
+import time
+from collections import OrderedDict
+from difflib import SequenceMatcher
+from backend.app.core.config import settings
+from backend.app.db.database import SessionLocal
+from backend.app.db.models import PromptCacheEntry
+
+# Prompt -> actions cache, sitting in front of the LLM call.
+# Lookup order:
+#   1. In-process LRU (with TTL)       -> microseconds
+#   2. Shared table in the database    -> one indexed query, shared by all workers
+#   3. Fuzzy match on the LRU entries  -> catches "make it romantic!!" vs "make it romantic"
+# A miss falls through to the LLM and the answer is written to both layers.
+# Tiers 1 and 2 are keyed on the prompt as typed (whitespace collapsed): case,
+# quoted text and non-Latin scripts all end up in add_text content or change
+# the meaning. The fuzzy tier never matches across quoted text, numbers or
+# negations ("don't remove silence" is not "remove silence").
+
+NEGATION_TOKENS = {"no", "not", "don't", "dont", "never", "without", "undo", "except", "instead"}
+_QUOTED_REGEX = re.compile(r'"[^"]*"|“[^”]*”')
+_WORD_REGEX = re.compile(r"[^\W_]+(?:['’.:][^\W_]+)*")  # Keeps "don't", "1.5", "9:16"
+
+
+def normalize_prompt(prompt_text: str) -> str:
+    """Lowercase, drop punctuation/emojis and collapse whitespace (keyword matching only)."""
+    text = prompt_text.lower()
+    text = re.sub(r"[^a-z0-9.:\s]", " ", text)
+    text = re.sub(r"(?<!\d)[.:]|[.:](?!\d)", " ", text)  # Keep "1.5" and "9:16" intact
+    return " ".join(text.split())
+
+
+def cache_key_text(prompt_text: str) -> str:
+    """The exact-match key: the prompt as typed, with whitespace collapsed."""
+    return " ".join(prompt_text.split())
+
+
+def fuzzy_form(prompt_text: str) -> str:
+    """
+    Distinct lowercased words of any script, sorted; punctuation and emojis
+    dropped (fuzzy tier only). Sorted and deduplicated, so the cheap difflib
+    bounds in _get_fuzzy() never undercut token_set_similarity().
+    """
+    return " ".join(sorted(set(_WORD_REGEX.findall(prompt_text.lower().replace("’", "'")))))
+
+
+def token_set_similarity(a: str, b: str) -> float:
+    """
+    Token-set ratio (0-1): shared tokens plus each side's leftovers, compared
+    with each other, so word order and repeated words don't matter. Symmetric:
+    a prompt that only adds words to another one is NOT a perfect match.
+    """
+    tokens_a, tokens_b = set(a.split()), set(b.split())
+    if not tokens_a or not tokens_b:
+        return 0.0
+
+    common = " ".join(sorted(tokens_a & tokens_b))
+    combined_a = f"{common} {' '.join(sorted(tokens_a - tokens_b))}".strip()
+    combined_b = f"{common} {' '.join(sorted(tokens_b - tokens_a))}".strip()
+    return SequenceMatcher(None, combined_a, combined_b).ratio()
+
+
+def _numbers(text: str) -> set:
+    return set(re.findall(r"\d+(?:[.:]\d+)?", text))
+
+
+def _fuzzy_guard(prompt_text: str, fuzzy: str) -> tuple:
+    """What two prompts must share exactly before they may fuzzy-match."""
+    return (
+        tuple(_QUOTED_REGEX.findall(prompt_text)),
+        frozenset(_numbers(fuzzy)),
+        frozenset(set(fuzzy.split()) & NEGATION_TOKENS),
+    )
+
+
+class PromptCache:
+    """
+    Two-level cache keyed on (prompt, system-prompt version).
+    Thread-safe: parse_prompt is called from many background threads.
+    """
+
+    def __init__(self, version: str, max_entries: int = None, ttl_seconds: int = None,
+                 fuzzy_threshold: float = None, use_db: bool = True):
+        self.version = version
+        self.max_entries = max_entries or settings.PROMPT_CACHE_MAX_ENTRIES
+        self.ttl_seconds = ttl_seconds or settings.PROMPT_CACHE_TTL_SECONDS
+        self.fuzzy_threshold = settings.PROMPT_CACHE_FUZZY_THRESHOLD if fuzzy_threshold is None else fuzzy_threshold
+        self.use_db = use_db
+
+        self._entries = OrderedDict()  # key text -> (expires_at, result, fuzzy form, fuzzy guard)
+        self._lock = threading.Lock()
+        self.counters = {"memory_hits": 0, "db_hits": 0, "fuzzy_hits": 0, "misses": 0, "db_errors": 0}
+
+    # --- Keys ---
+    def _key(self, key_text: str) -> str:
+        return hashlib.sha256(f"{self.version}\n{key_text}".encode("utf-8")).hexdigest()
+
+    # --- Public API ---
+    def get(self, prompt_text: str):
+        key_text = cache_key_text(prompt_text)
+        if not key_text:
+            return None
+
+        result = self._get_memory(key_text)
+        if result is not None:
+            self._count("memory_hits")
+            return result
+
+        result = self._get_db(key_text)
+        if result is not None:
+            self._count("db_hits")
+            self._put_memory(key_text, result)
+            return result
+
+        result = self._get_fuzzy(key_text)
+        if result is not None:
+            self._count("fuzzy_hits")
+            return result
+
+        self._count("misses")
+        return None
+
+    def put(self, prompt_text: str, result: dict):
+        key_text = cache_key_text(prompt_text)
+        if not key_text:
+            return
+        self._put_memory(key_text, result)
+        self._put_db(key_text, result)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            counters = dict(self.counters)
+            size = len(self._entries)
+        lookups = counters["memory_hits"] + counters["db_hits"] + counters["fuzzy_hits"] + counters["misses"]
+        hits = lookups - counters["misses"]
+        return {
+            **counters,
+            "entries": size,
+            "hit_rate": round(hits / lookups, 4) if lookups else 0.0,
+            "version": self.version,
+        }
+
+    # --- Level 1: In-process LRU ---
+    def _count(self, name: str):
+        with self._lock:
+            self.counters[name] += 1
+
+    def _get_memory(self, key_text: str):
+        with self._lock:
+            entry = self._entries.get(key_text)
+            if entry is None:
+                return None
+            expires_at, result = entry[:2]
+            if expires_at < time.time():
+                del self._entries[key_text]
+                return None
+            self._entries.move_to_end(key_text)
+            # Callers mutate the actions list (action log), so never hand out our copy
+            return copy.deepcopy(result)
+
+    def _put_memory(self, key_text: str, result: dict, expires_at: float = None):
+        fuzzy = fuzzy_form(key_text)
+        entry = (expires_at or time.time() + self.ttl_seconds, copy.deepcopy(result), fuzzy, _fuzzy_guard(key_text, fuzzy))
+        with self._lock:
+            self._entries[key_text] = entry
+            self._entries.move_to_end(key_text)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    # --- Level 2: Shared DB table ---
+    def _get_db(self, key_text: str):
+        if not self.use_db:
+            return None
+        db = SessionLocal()
+        try:
+            # Read-only: hits are counted in self.counters (and /health), not in the table
+            row = (
+                db.query(PromptCacheEntry.result, PromptCacheEntry.expires_at)
+                .filter(PromptCacheEntry.key == self._key(key_text))
+                .first()
+            )
+            if not row or row.expires_at < time.time():
+                return None
+            return copy.deepcopy(row.result)
+        except Exception as e:
+            # The cache must never break parsing
+            print(f"⚠️ [CACHE] DB lookup failed: {e}")
+            self._count("db_errors")
+            db.rollback()
+            return None
+        finally:
+            db.close()
+
+    def _put_db(self, key_text: str, result: dict):
+        if not self.use_db:
+            return
+        db = SessionLocal()
+        try:
+            db.merge(PromptCacheEntry(
+                key=self._key(key_text),
+                prompt_version=self.version,
+                normalized_prompt=key_text,
+                result=result,
+                expires_at=time.time() + self.ttl_seconds,
+            ))
+            db.commit()
+        except Exception as e:
+            print(f"⚠️ [CACHE] DB write failed: {e}")
+            self._count("db_errors")
+            db.rollback()
+        finally:
+            db.close()
+
+    # --- Level 3: Fuzzy match ---
+    def _get_fuzzy(self, key_text: str):
+        if self.fuzzy_threshold <= 0:
+            return None
+
+        # "trim first 5 seconds" and "trim first 6 seconds" are 95% similar but
+        # mean different things, so numbers (and quotes, negations) must match exactly.
+        fuzzy = fuzzy_form(key_text)
+        if not fuzzy:
+            return None
+        guard = _fuzzy_guard(key_text, fuzzy)
+        now = time.time()
+        best_score, best_result = 0.0, None
+
+        with self._lock:
+            candidates = list(self._entries.values())
+
+        matcher = SequenceMatcher()
+        matcher.set_seq2(fuzzy)
+        for expires_at, result, candidate, candidate_guard in candidates:
+            if expires_at < now or candidate_guard != guard:
+                continue
+            # Cheap upper bounds first (as difflib.get_close_matches does): most
+            # entries are dropped without the full token-set comparison
+            matcher.set_seq1(candidate)
+            if matcher.real_quick_ratio() < self.fuzzy_threshold or matcher.quick_ratio() < self.fuzzy_threshold:
+                continue
+            score = token_set_similarity(fuzzy, candidate)
+            if score > best_score:
+                best_score, best_result = score, result
+
+        if best_result is not None and best_score >= self.fuzzy_threshold:
+            return copy.deepcopy(best_result)
+        return None
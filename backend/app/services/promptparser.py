@@ -1,23 +1,22 @@
 # backend/app/services/prompt_parser.py
 import json
 import re 
-from openai import OpenAI
+import hashlib
+import time
 from backend.app.core.config import settings
-
-# 1. Initialize Client
-client = OpenAI(
-    base_url=settings.SAMBANOVA_BASE_URL,
-    api_key=settings.SAMBANOVA_API_KEY,
-)
-
-def parse_prompt(prompt_text: str) -> dict:
-    """
-    Uses Llama 3.1 (via SambaNova) to convert natural language into structured JSON actions.
-    """
-    print(f"🧠 [AI] Thinking about prompt: {prompt_text}")
-
-    # 2. Define System Instructions
-    system_instructions = """
+from backend.app.core.schemas import ACTION_TYPES, EditInstructions
+from backend.app.services import metrics
+from backend.app.services.llmclient import llm_client
+from backend.app.services.promptcache import PromptCache
+from backend.app.services.ruleparser import match_prompt
+
+# 1. Client
+# The shared, pooled client lives in llmclient.py (connection reuse, concurrency
+# cap, deadlines and retries).
+
+# 2. Define System Instructions
+# NOTE: Any edit here changes PROMPT_VERSION, which invalidates the prompt cache.
+SYSTEM_INSTRUCTIONS = """
     You are EditVerse, a witty and helpful AI video editor.You are a video editing assistant. Your job is to translate user requests into a strict JSON format.
 
     YOUR GOAL:
@@ -134,42 +133,97 @@ def parse_prompt(prompt_text: str) -> dict:
     - If user says "square" or "instagram", use aspect_ratio "1:1".
     """
 
+PROMPT_VERSION = hashlib.sha256(
+    f"{settings.SAMBANOVA_MODEL}\n{SYSTEM_INSTRUCTIONS}".encode("utf-8")
+).hexdigest()[:16]
+
+prompt_cache = PromptCache(version=PROMPT_VERSION)
+
+
+def _check_result(result):
+    """Raises ValueError unless 'result' is a list of actions the renderer can apply."""
+    if not isinstance(result, dict) or not isinstance(result.get("actions"), list):
+        raise ValueError("LLM answer has no 'actions' list")
+    for action in result["actions"]:
+        if not isinstance(action, dict) or action.get("type") not in ACTION_TYPES:
+            raise ValueError(f"LLM answer has an unknown action: {action!r}")
+    try:
+        EditInstructions(actions=result["actions"])
+    except Exception as e:  # pydantic.ValidationError: missing or mistyped fields
+        raise ValueError(f"LLM answer doesn't match the action schema: {e}")
+
+
+def parse_prompt(prompt_text: str) -> dict:
+    """
+    Uses Llama 3.1 (via SambaNova) to convert natural language into structured JSON actions.
+    Keyword-only prompts are answered by the local rule matcher without calling the LLM.
+    Results are cached per (prompt as typed, PROMPT_VERSION).
+    """
+    start = time.perf_counter()
+    result, source = {"actions": []}, "error"
+    try:
+        result, source = _parse_prompt(prompt_text)
+        return result
+    finally:
+        metrics.observe("parse", time.perf_counter() - start,
+                        action=metrics.action_label(result.get("actions") if isinstance(result, dict) else None),
+                        outcome=source)
+
+
+def _parse_prompt(prompt_text: str):
+    """(result, where it came from: rule | cache | llm | fallback)"""
+    print(f"🧠 [AI] Thinking about prompt: {prompt_text}")
+
+    rule_result = match_prompt(prompt_text)
+    if rule_result and rule_result["confidence"] >= settings.RULE_PARSER_MIN_CONFIDENCE:
+        print(f"⚡ [RULES] Matched locally (confidence {rule_result['confidence']})")
+        return {"actions": rule_result["actions"], "reply": rule_result["reply"]}, "rule"
+
+    cached = prompt_cache.get(prompt_text)
+    if cached is not None:
+        print(f"⚡ [AI] Prompt cache hit")
+        return cached, "cache"
+
     try:
-        # 3. Call the API
-        response = client.chat.completions.create(
-            model=settings.SAMBANOVA_MODEL,
-            messages=[
-                {"role": "system", "content": system_instructions},
+        # 3. Call the API (pooled, with deadline + retries)
+        content = llm_client.chat_sync(
+            [
+                {"role": "system", "content": SYSTEM_INSTRUCTIONS},
                 {"role": "user", "content": prompt_text}
             ],
             temperature=0.1, # Low temperature for consistency
         )
 
         # 4. Parse Response
-        content = response.choices[0].message.content.strip()
         print(f"🤖 [AI] Raw Response: {content}")
 
         try:
             # Attempt 1: Try parsing directly (Best case)
-            return json.loads(content)
+            result = json.loads(content)
         except json.JSONDecodeError:
             # Attempt 2: Use Regex to find the JSON object { ... }
             # This ignores "Here is your JSON:" or markdown backticks
             match = re.search(r"\{.*\}", content, re.DOTALL)
             if match:
                 json_str = match.group(0)
-                return json.loads(json_str)
+                result = json.loads(json_str)
             else:
                 raise ValueError("No JSON object found in response")
         # --- FIX ENDS HERE ---
 
+        # Only valid answers are cached, never the fallback below: a malformed
+        # one gets a fresh sample on the next try instead of failing for the whole TTL
+        _check_result(result)
+        prompt_cache.put(prompt_text, result)
+        return result, "llm"
+
     except Exception as e:
         print(f"❌ [AI] Error: {e}")
         # Return a safe fallback so the app doesn't crash
         return {
             "actions": [], 
             "reply": "I had a brain freeze! 🥶 Could you try saying that again?"
-        }
+        }, "fallback"
         
         # Clean up markdown if present
     #     if content.startswith("```json"):
@@ -0,0 +1,202 @@
+# backend/app/services/rendercache.py
+import functools
+import hashlib
+import json
+import os
+import shutil
+import subprocess
+import threading
+import time
+import uuid
+from pathlib import Path
+from backend.app.core.config import settings
+from backend.app.services import encoding, metrics
+
+# Content-addressed render cache.
+# key = sha256(input content hash, canonical action list, encoder settings,
+#             render window, silence detector, FFmpeg version, RENDER_CACHE_VERSION)
+# The same prompt on the same clip (re-runs, or many users applying one vibe to
+# one viral clip) renders once; every later request gets a hardlink to the
+# stored output, without starting FFmpeg.
+# Entries are plain files under RENDER_CACHE_DIR/<2 hex>/<key><ext>; a hit
+# sets the file's atime, so eviction can drop the least recently used entries
+# whenever the directory grows past RENDER_CACHE_MAX_BYTES. (Not mtime: a job's
+# output shares the inode, and its download ETag/Last-Modified use mtime.)
+# Everything lives on the filesystem, so API and worker processes sharing the
+# storage share the cache.
+
+# Bump when the graph builder changes in a way that changes output pixels
+RENDER_CACHE_VERSION = 1
+HASH_READ_BYTES = 4 * 1024 * 1024
+
+counters = {"hits": 0, "misses": 0, "stores": 0, "evictions": 0}
+_lock = threading.Lock()
+_file_hashes = {}  # (path, size, mtime_ns) -> sha256, for inputs without a stored hash
+
+
+def cache_dir() -> Path:
+    if settings.RENDER_CACHE_DIR:
+        return Path(settings.RENDER_CACHE_DIR)
+    return Path(__file__).resolve().parent.parent.parent / "temp_storage" / "render_cache"
+
+
+@functools.lru_cache(maxsize=1)
+def ffmpeg_version() -> str:
+    """First line of `ffmpeg -version`: a different build may encode different bytes."""
+    try:
+        output = subprocess.run(["ffmpeg", "-version"], capture_output=True, text=True, check=True).stdout
+        return output.splitlines()[0].strip()
+    except (OSError, subprocess.CalledProcessError, IndexError):
+        return "unknown"
+
+
+def file_hash(path: str) -> str:
+    """sha256 of a file, remembered per (path, size, mtime) for this process."""
+    stat = os.stat(path)
+    memo_key = (os.path.abspath(path), stat.st_size, stat.st_mtime_ns)
+    with _lock:
+        if memo_key in _file_hashes:
+            return _file_hashes[memo_key]
+
+    hasher = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(HASH_READ_BYTES), b""):
+            hasher.update(block)
+    digest = hasher.hexdigest()
+    with _lock:
+        _file_hashes[memo_key] = digest
+    return digest
+
+
+def _canonical(value):
+    """Stable JSON-able form: sorted keys, numbers as rounded floats (5 == 5.0)."""
+    if isinstance(value, dict):
+        return {str(k): _canonical(v) for k, v in sorted(value.items())}
+    if isinstance(value, (list, tuple)):
+        return [_canonical(v) for v in value]
+    if isinstance(value, bool) or value is None:
+        return value
+    if isinstance(value, (int, float)):
+        return round(float(value), 6)
+    if isinstance(value, str):
+        return value  # Text is rendered as-is ("5" and "5.0" captions differ)
+    return str(value)
+
+
+def render_key(input_path: str, actions: list, profile: str, output_path: str, content_hash: str = None,
+               start: float = None, end: float = None, music_offset: float = 0.0, silence: dict = None) -> str:
+    """'silence' names what answers the log's silence removal (vidpro.silence_source): engines may cut differently."""
+    extension = os.path.splitext(output_path)[1].lower()
+    material = {
+        "version": RENDER_CACHE_VERSION,
+        "input": content_hash or file_hash(input_path),
+        "actions": _canonical(actions),
+        "profile": profile,
+        "encoder": _canonical(encoding.output_kwargs(profile, output_path)),
+        "preview_height": settings.PREVIEW_HEIGHT if profile == "preview" else None,
+        "window": _canonical([start, end, music_offset]),
+        "silence": _canonical(silence),
+        "container": extension,
+        "ffmpeg": ffmpeg_version(),
+    }
+    blob = json.dumps(material, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(blob.encode("utf-8")).hexdigest()
+
+
+def _entry_path(key: str, extension: str) -> Path:
+    return cache_dir() / key[:2] / f"{key}{extension}"
+
+
+def _link_or_copy(source: Path, destination: str):
+    """Atomically places 'source' at 'destination' (hardlink, or a copy across filesystems)."""
+    temp = f"{destination}.{uuid.uuid4().hex[:8]}.tmp"
+    try:
+        try:
+            os.link(source, temp)
+        except OSError:
+            shutil.copyfile(source, temp)
+        os.replace(temp, destination)
+    finally:
+        if os.path.exists(temp):
+            os.remove(temp)
+
+
+def _touch(entry: Path):
+    """Marks an entry as just used (atime only, mtime stays exactly as it was)."""
+    stat = entry.stat()
+    os.utime(entry, ns=(time.time_ns(), stat.st_mtime_ns))
+
+
+def fetch(key: str, output_path: str) -> bool:
+    """Puts the cached render for 'key' at output_path. False on a miss."""
+    entry = _entry_path(key, os.path.splitext(output_path)[1].lower())
+    if not entry.exists():
+        counters["misses"] += 1
+        metrics.CACHE_EVENTS.labels("render", "miss").inc()
+        return False
+
+    _touch(entry)
+    _link_or_copy(entry, output_path)
+    counters["hits"] += 1
+    metrics.CACHE_EVENTS.labels("render", "hit").inc()
+    return True
+
+
+def store(key: str, output_path: str):
+    """Adds a finished render to the cache (as a hardlink), then enforces the quota."""
+    entry = _entry_path(key, os.path.splitext(output_path)[1].lower())
+    if entry.exists():
+        return
+    if os.path.getsize(output_path) > settings.RENDER_CACHE_MAX_BYTES:
+        return  # Would evict everything else and still not fit
+    entry.parent.mkdir(parents=True, exist_ok=True)
+    _link_or_copy(Path(output_path), str(entry))
+    _touch(entry)
+    counters["stores"] += 1
+    metrics.CACHE_EVENTS.labels("render", "store").inc()
+    evict()
+
+
+def _entries():
+    root = cache_dir()
+    if not root.exists():
+        return []
+    found = []
+    for shard in os.scandir(root):
+        if not shard.is_dir():
+            continue
+        for item in os.scandir(shard.path):
+            if item.is_file() and not item.name.endswith(".tmp"):
+                stat = item.stat()
+                found.append((stat.st_atime, stat.st_size, item.path))
+    return found
+
+
+def evict(max_bytes: int = None) -> int:
+    """Deletes least recently used entries until the cache fits in max_bytes. Returns bytes freed."""
+    max_bytes = settings.RENDER_CACHE_MAX_BYTES if max_bytes is None else max_bytes
+    entries = sorted(_entries())
+    total = sum(size for _, size, _ in entries)
+    freed = 0
+    for _, size, path in entries:
+        if total - freed <= max_bytes:
+            break
+        try:
+            # Jobs still holding a hardlink keep their copy; only the cache's name goes away
+            os.remove(path)
+        except FileNotFoundError:
+            continue
+        freed += size
+        counters["evictions"] += 1
+        metrics.CACHE_EVENTS.labels("render", "evict").inc()
+    return freed
+
+
+def stats() -> dict:
+    entries = _entries()
+    return {
+        **counters,
+        "entries": len(entries),
+        "bytes": sum(size for _, size, _ in entries),
+        "max_bytes": settings.RENDER_CACHE_MAX_BYTES,
+    }
@@ -0,0 +1,207 @@
+# backend/app/services/ruleparser.py
+import re
+from backend.app.core.schemas import EditInstructions
+from backend.app.services.promptcache import normalize_prompt
+
+# Local, deterministic fast path for parse_prompt.
+# The keyword rules below are the same ones spelled out in the LLM's
+# SYSTEM_INSTRUCTIONS, compiled into regexes. Prompts made only of known
+# keywords ("make it romantic", "vintage reel with captions") are answered
+# locally in microseconds; anything with free-form parameters (times, text,
+# numbers, negations) goes to the LLM.
+
+# --- 1. Keyword rules (phrase list -> actions) ---
+# Order matters: the first rule that adds a given action type wins.
+MOOD_RULES = [
+    {
+        "name": "horror",
+        "phrases": ["horror", "scary", "spooky", "thriller"],
+        "actions": [{"type": "filter", "name": "grayscale"}, {"type": "add_music", "track": "horror_1.mp3", "volume": 0.3}],
+        "reply": "Spooky choice! Adding some darkness and tension... 👻",
+    },
+    {
+        "name": "romantic",
+        "phrases": ["romantic", "romance", "love"],
+        "actions": [{"type": "filter", "name": "warm_tone"}, {"type": "add_music", "track": "romantic_1.mp3", "volume": 0.3}],
+        "reply": "Love is in the air! Warming things up... 💕",
+    },
+    {
+        "name": "sad",
+        "phrases": ["sad", "cold", "lonely", "winter"],
+        "actions": [{"type": "filter", "name": "cool_tone"}, {"type": "add_music", "track": "scoring_1.mp3", "volume": 0.3}],
+        "reply": "Cooling the tones for that melancholy mood... 🌧️",
+    },
+    {
+        "name": "cinematic",
+        "phrases": ["cinematic"],
+        "actions": [{"type": "speed", "value": 0.8}, {"type": "filter", "name": "grayscale"}],
+        "reply": "Going full cinema mode! 🎞️",
+    },
+    {
+        "name": "action",
+        "phrases": ["action", "fast"],
+        "actions": [{"type": "speed", "value": 1.5}, {"type": "add_music", "track": "actiondrama_1.mp3", "volume": 0.3}],
+        "reply": "Buckle up! Cranking up the action... 💥",
+    },
+    {
+        "name": "funny",
+        "phrases": ["funny", "viral"],
+        "actions": [{"type": "speed", "value": 1.5}],
+        "reply": "Speeding things up for maximum giggles! 😂",
+    },
+    {
+        "name": "retro",
+        "phrases": ["vintage", "90s", "old school", "vhs", "memory", "memories", "throwback", "retro"],
+        "actions": [{"type": "filter", "name": "retro"}],
+        "reply": "Rewinding time... 📼",
+    },
+    {
+        "name": "drama",
+        # The graph builder has no zoom action: "zoom in"/"focus" prompts go to the LLM
+        "phrases": ["drama", "dramatic", "intense", "cinematic moment"],
+        "actions": [{"type": "filter", "name": "contrast"}],
+        "reply": "Turning up the drama! 🎭",
+    },
+]
+
+STRUCTURE_RULES = [
+    {"phrases": ["grayscale", "greyscale", "black and white", "b w"], "actions": [{"type": "filter", "name": "grayscale"}]},
+    {"phrases": ["warm", "warmer", "warm tone"], "actions": [{"type": "filter", "name": "warm_tone"}]},
+    {"phrases": ["cooler", "cool tone", "cold tone"], "actions": [{"type": "filter", "name": "cool_tone"}]},
+    {"phrases": ["contrast", "more contrast"], "actions": [{"type": "filter", "name": "contrast"}]},
+    {"phrases": ["shorts", "reel", "reels", "instagram reel", "tiktok", "vertical"], "actions": [{"type": "aspect_ratio", "ratio": "9:16"}]},
+    {"phrases": ["square", "instagram"], "actions": [{"type": "aspect_ratio", "ratio": "1:1"}]},
+    {"phrases": ["captions", "caption", "subtitles", "subtitle", "words on screen", "text on screen"], "actions": [{"type": "auto_subtitles"}]},
+    {"phrases": ["remove silence", "remove silences", "cut silence", "cut gaps", "jump cuts", "jump cut"], "actions": [{"type": "remove_silence", "threshold": -30, "min_duration": 0.5}]},
+    {"phrases": ["fade in", "intro"], "actions": [{"type": "fade", "kind": "in", "duration": 1.0}]},
+    {"phrases": ["fade out", "outro"], "actions": [{"type": "fade", "kind": "out", "duration": 1.0}]},
+]
+
+# AUTO-EMOTION -> TRACK MAPPING, used for "add music" with no mood rule above
+EMOTION_TRACKS = [
+    (["happy", "vlog", "fun", "upbeat", "viral"], "positive_1.mp3"),
+    (["sad", "emotional", "cinematic", "slow"], "scoring_1.mp3"),
+    (["action", "intense", "fast", "hype", "gym"], "actiondrama_1.mp3"),
+    (["horror", "scary", "dark", "thriller"], "horror_1.mp3"),
+    (["romantic", "love", "soft"], "romantic_1.mp3"),
+    (["funny", "joking", "meme"], "comedy_1.mp3"),
+    (["electric", "techno", "energetic"], "electric_1.mp3"),
+    (["world", "travel", "nature"], "world_1.mp3"),
+]
+DEFAULT_TRACK = "miscellaneous_1.mp3"
+MUSIC_PHRASES = ["add music", "music", "background music", "song", "soundtrack", "bgm"]
+LOUD_PHRASES = ["loud", "louder"]
+
+GREETING_PHRASES = ["hi", "hello", "hey", "thanks", "thank you", "who are you", "good morning", "good evening"]
+GREETING_REPLY = "Greetings, Creator! Ready to make some movie magic? 🎬"
+THANKS_REPLY = "Anytime! Drop another idea whenever you're ready. 🎨"
+DEFAULT_REPLY = "On it! Working some editing magic... 🎬"
+
+# Words that carry no editing meaning on their own. They don't lower confidence.
+FILLER_WORDS = {
+    "a", "an", "the", "it", "its", "this", "that", "my", "me", "i", "to", "for", "of", "in", "on",
+    "and", "with", "some", "more", "very", "really", "bit", "little", "please", "pls", "can", "you",
+    "could", "would", "make", "add", "give", "apply", "put", "turn", "into", "like", "look", "looks",
+    "feel", "vibe", "vibes", "style", "mood", "effect", "filter", "video", "clip", "movie", "film",
+    "edit", "just", "also", "want", "let", "s", "lets", "do", "be", "is", "so", "now",
+    "kinda", "sort", "type", "theme", "tone", "version", "something", "all",
+}
+
+# Any of these means the user wants something the keyword table can't express.
+NEGATION_WORDS = {"not", "no", "don", "dont", "without", "remove", "undo", "less", "instead", "except", "but"}
+
+
+def _compile(phrases):
+    pattern = "|".join(re.escape(p) for p in sorted(phrases, key=len, reverse=True))
+    return re.compile(rf"\b(?:{pattern})\b")
+
+
+for _rule in MOOD_RULES + STRUCTURE_RULES:
+    _rule["regex"] = _compile(_rule["phrases"])
+_EMOTION_REGEXES = [(_compile(words), track) for words, track in EMOTION_TRACKS]
+_MUSIC_REGEX = _compile(MUSIC_PHRASES)
+_LOUD_REGEX = _compile(LOUD_PHRASES)
+_GREETING_REGEX = _compile(GREETING_PHRASES)
+_SILENCE_COMMAND_REGEX = _compile(["remove silence", "remove silences"])
+
+
+def _allowed_negation(text: str) -> bool:
+    """'remove silence' is a command, not a negation."""
+    stripped = _SILENCE_COMMAND_REGEX.sub(" ", text)
+    return not (set(stripped.split()) & NEGATION_WORDS)
+
+
+def match_prompt(prompt_text: str):
+    """
+    Tries to answer the prompt with the local keyword rules.
+    Returns {"actions": [...], "reply": str, "confidence": float}, or None when
+    the prompt has free-form parts (numbers, quotes, negations) or nothing matched.
+    """
+    if re.search(r'["“”]', prompt_text):
+        return None  # Quoted text -> add_text with custom content
+
+    text = normalize_prompt(prompt_text)
+    if not text or re.search(r"\d", text.replace("90s", "")):
+        return None  # Times, speeds, volumes... let the LLM read them
+    if not _allowed_negation(text):
+        return None
+
+    tokens = text.split()
+    covered = set()
+
+    def cover(regex):
+        hit = False
+        for m in regex.finditer(text):
+            covered.update(range(len(text[:m.start()].split()), len(text[:m.end()].split())))
+            hit = True
+        return hit
+
+    # 1. Pure chit-chat
+    if cover(_GREETING_REGEX) and all(i in covered or tokens[i] in FILLER_WORDS for i in range(len(tokens))):
+        reply = THANKS_REPLY if "thank" in text else GREETING_REPLY
+        return {"actions": [], "reply": reply, "confidence": 1.0}
+    covered.clear()
+
+    actions = []
+    seen_types = set()
+    reply = None
+
+    def add(new_actions):
+        for action in new_actions:
+            # Only one of each (speed, music, ...) except filters, which stack
+            key = (action["type"], action.get("name")) if action["type"] == "filter" else action["type"]
+            if key not in seen_types:
+                seen_types.add(key)
+                actions.append(dict(action))
+
+    # 2. Mood rules (filters + music)
+    for rule in MOOD_RULES:
+        if cover(rule["regex"]):
+            add(rule["actions"])
+            reply = reply or rule["reply"]
+
+    # 3. Structural rules (aspect ratio, subtitles, fades, ...)
+    for rule in STRUCTURE_RULES:
+        if cover(rule["regex"]):
+            add(rule["actions"])
+
+    # 4. Music with no mood rule -> emotion table
+    if cover(_MUSIC_REGEX) and "add_music" not in seen_types:
+        track = next((t for regex, t in _EMOTION_REGEXES if cover(regex)), DEFAULT_TRACK)
+        add([{"type": "add_music", "track": track, "volume": 0.3}])
+    if cover(_LOUD_REGEX):
+        for action in actions:
+            if action["type"] == "add_music":
+                action["volume"] = 0.8
+
+    if not actions:
+        return None
+
+    # 5. Confidence = share of meaningful words explained by a rule
+    content = [i for i, token in enumerate(tokens) if token not in FILLER_WORDS]
+    confidence = 1.0 if not content else sum(1 for i in content if i in covered) / len(content)
+
+    # Must still be valid against the same schema the LLM output is checked with
+    EditInstructions(actions=actions)
+
+    return {"actions": actions, "reply": reply or DEFAULT_REPLY, "confidence": round(confidence, 3)}
@@ -0,0 +1,138 @@
+# backend/app/services/silenceengine.py
+import os
+import subprocess
+import threading
+from collections import OrderedDict
+import numpy as np
+
+# NumPy silence engine.
+# The audio is decoded ONCE to mono 8 kHz PCM through a pipe and reduced to a
+# loudness envelope: one dB value per 10 ms (~1.4 MB per hour of audio).
+# The envelope is cached next to the upload, so changing threshold/min_duration
+# ("remove silence" -> "be more aggressive") is a few vectorised NumPy ops
+# instead of another full decode.
+
+# Bump when the envelope or find_silences() changes which silences are found
+ENGINE_VERSION = 1
+SAMPLE_RATE = 8000
+HOP_SECONDS = 0.01
+HOP_SAMPLES = int(SAMPLE_RATE * HOP_SECONDS)  # 80 samples per envelope value
+READ_HOPS = 6000                              # Hops per pipe read (60 s of audio)
+SILENT_DB = -100.0                            # Floor for digital silence
+
+_memory = OrderedDict()  # (path, mtime_ns) -> envelope
+_memory_lock = threading.Lock()
+MEMORY_ENTRIES = 16
+
+
+def envelope_path(input_path: str) -> str:
+    """Where the cached envelope for an upload lives."""
+    return f"{input_path}.envelope.npy"
+
+
+def compute_envelope(input_path: str) -> np.ndarray:
+    """
+    Decodes mono PCM through a pipe and returns the RMS level in dBFS per 10 ms
+    as float32. Reads in blocks, so memory stays flat for long files.
+    """
+    command = [
+        "ffmpeg", "-hide_banner", "-loglevel", "error",
+        "-i", input_path,
+        "-vn", "-ac", "1", "-ar", str(SAMPLE_RATE),
+        "-f", "s16le", "-",
+    ]
+    process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+
+    block_bytes = HOP_SAMPLES * READ_HOPS * 2
+    levels = []
+    leftover = b""
+    try:
+        while True:
+            data = process.stdout.read(block_bytes)
+            if not data:
+                break
+            data = leftover + data
+            usable = len(data) - (len(data) % (HOP_SAMPLES * 2))
+            leftover = data[usable:]
+            if usable:
+                samples = np.frombuffer(data[:usable], dtype=np.int16).astype(np.float32) / 32768.0
+                levels.append(_rms_db(samples.reshape(-1, HOP_SAMPLES)))
+
+        if leftover:
+            # Last partial hop, padded with silence
+            samples = np.frombuffer(leftover[: len(leftover) - len(leftover) % 2], dtype=np.int16).astype(np.float32) / 32768.0
+            padded = np.zeros(HOP_SAMPLES, dtype=np.float32)
+            padded[: len(samples)] = samples
+            levels.append(_rms_db(padded.reshape(1, -1)))
+    finally:
+        process.stdout.close()
+        stderr = process.stderr.read().decode("utf8", errors="replace")
+        process.stderr.close()
+        process.wait()
+
+    if process.returncode != 0:
+        raise RuntimeError(f"PCM decode failed: {stderr[-500:]}")
+
+    return np.concatenate(levels) if levels else np.zeros(0, dtype=np.float32)
+
+
+def _rms_db(frames: np.ndarray) -> np.ndarray:
+    rms = np.sqrt(np.mean(frames * frames, axis=1))
+    with np.errstate(divide="ignore"):
+        db = 20.0 * np.log10(rms)
+    return np.maximum(db, SILENT_DB).astype(np.float32)
+
+
+def load_envelope(input_path: str) -> np.ndarray:
+    """Memory -> .npy next to the upload -> decode (and save)."""
+    mtime_ns = os.stat(input_path).st_mtime_ns
+    key = (os.path.abspath(input_path), mtime_ns)
+
+    with _memory_lock:
+        if key in _memory:
+            _memory.move_to_end(key)
+            return _memory[key]
+
+    cache_file = envelope_path(input_path)
+    envelope = None
+    if os.path.exists(cache_file) and os.stat(cache_file).st_mtime_ns >= mtime_ns:
+        try:
+            envelope = np.load(cache_file)
+        except Exception as e:
+            print(f"⚠️ [SILENCE] Unreadable envelope cache, rebuilding: {e}")
+
+    if envelope is None:
+        print(f"🔇 [SILENCE] Building audio envelope for {os.path.basename(input_path)}...")
+        envelope = compute_envelope(input_path)
+        try:
+            np.save(cache_file, envelope)
+        except OSError as e:
+            print(f"⚠️ [SILENCE] Could not save envelope: {e}")
+
+    with _memory_lock:
+        _memory[key] = envelope
+        _memory.move_to_end(key)
+        while len(_memory) > MEMORY_ENTRIES:
+            _memory.popitem(last=False)
+    return envelope
+
+
+def find_silences(envelope: np.ndarray, db_threshold: float, min_duration: float) -> list:
+    """
+    Vectorised run detection: [[start, end], ...] of every stretch below
+    db_threshold that lasts at least min_duration seconds.
+    """
+    if envelope.size == 0:
+        return []
+
+    quiet = np.concatenate(([False], envelope < float(db_threshold), [False]))
+    edges = np.flatnonzero(np.diff(quiet.astype(np.int8)))
+    starts, ends = edges[0::2], edges[1::2]
+
+    long_enough = (ends - starts) * HOP_SECONDS >= float(min_duration)
+    return [[float(s) * HOP_SECONDS, float(e) * HOP_SECONDS] for s, e in zip(starts[long_enough], ends[long_enough])]
+
+
+def detect_silences(input_path: str, db_threshold: float, min_duration: float) -> list:
+    """Silence intervals for any threshold; only the first call per file decodes."""
+    return find_silences(load_envelope(input_path), db_threshold, min_duration)
@@ -0,0 +1,295 @@
+# backend/app/services/smarttrim.py
+import ffmpeg
+import os
+import shutil
+import subprocess
+import tempfile
+from backend.app.services import probecache
+from backend.app.services.encoding import FASTSTART_CONTAINERS
+from backend.app.services.progress import CombinedProgress
+
+# "Smart render" for trims:
+# Only the partial GOPs at each cut are re-encoded. Every whole GOP in between
+# is stream-copied, so cutting a few seconds out of a long upload costs about
+# the same as copying the file.
+# The re-encoded GOPs can't share the source's SPS/PPS, and an MP4 keeps only
+# one set per track (the first segment's). So:
+#   - boundary GOPs are encoded with the source's profile, level, pixel format
+#     and colour tags, and every segment is written as MPEG-TS (Annex B) with
+#     its SPS/PPS in-band in front of each keyframe, which the decoder picks up
+#     at the splice;
+#   - the joined file is decoded around every splice point, and any error
+#     throws the smart trim away (full render instead).
+# A source whose parameters we can't reproduce falls back straight away.
+# Progress is reported across the segment runs, by the output seconds each makes.
+
+# Encoders we can use to re-encode boundary GOPs, with the source profiles
+# (ffprobe names) each can produce. Anything else falls back to a full render.
+BOUNDARY_ENCODERS = {
+    "h264": "libx264",
+    "hevc": "libx265",
+}
+BOUNDARY_PROFILES = {
+    "h264": {
+        "Constrained Baseline": "baseline",
+        "Baseline": "baseline",
+        "Main": "main",
+        "High": "high",
+        "High 10": "high10",
+        "High 4:2:2": "high422",
+        "High 4:4:4 Predictive": "high444",
+    },
+    "hevc": {
+        "Main": "main",
+        "Main 10": "main10",
+    },
+}
+COLOR_TAGS = {  # ffprobe field -> ffmpeg output option
+    "color_range": "color_range",
+    "color_primaries": "color_primaries",
+    "color_transfer": "color_trc",
+    "color_space": "colorspace",
+}
+SPLICE_CHECK_SECONDS = 0.5  # Decoded on each side of a splice to verify the join
+
+KEYFRAME_EPSILON = 0.001  # Seconds. Treat cuts this close to a keyframe as "on" it.
+
+
+def build_keyframe_index(file_path: str) -> list:
+    """
+    Uses ffprobe packet data to list the timestamps (seconds) of every video keyframe.
+    Only packet headers are read, nothing is decoded.
+    """
+    command = [
+        "ffprobe", "-v", "error",
+        "-select_streams", "v:0",
+        "-show_entries", "packet=pts_time,flags",
+        "-of", "csv=print_section=0",
+        file_path,
+    ]
+    result = subprocess.run(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True, check=True)
+
+    keyframes = []
+    for line in result.stdout.splitlines():
+        parts = line.strip().split(",")
+        if len(parts) < 2 or "K" not in parts[1]:
+            continue
+        try:
+            keyframes.append(float(parts[0]))
+        except ValueError:
+            continue  # pts_time can be "N/A"
+
+    keyframes.sort()
+    print(f"🔑 Indexed {len(keyframes)} keyframes for {os.path.basename(file_path)}")
+    return keyframes
+
+
+def collapse_trims(actions: list):
+    """
+    If 'actions' contains ONLY trims, folds them into a single (start, end) window
+    on the original timeline. 'end' is None when the window runs to the end of file.
+    Returns None if any other action type is present.
+    """
+    if not actions or any(a.get('type') != 'trim' for a in actions):
+        return None
+
+    start, end = 0.0, None
+    for action in actions:
+        # Each trim is relative to the output of the previous one
+        new_start = start + float(action['start'])
+        new_end = start + float(action['end'])
+        if end is not None:
+            new_end = min(new_end, end)
+        start, end = new_start, new_end
+
+    if end is not None and end <= start:
+        return None
+    return start, end
+
+
+def _first_keyframe_at_or_after(keyframes: list, t: float):
+    return next((k for k in keyframes if k >= t - KEYFRAME_EPSILON), None)
+
+
+def _last_keyframe_at_or_before(keyframes: list, t: float):
+    return next((k for k in reversed(keyframes) if k <= t + KEYFRAME_EPSILON), None)
+
+
+def _boundary_params(video_stream: dict):
+    """
+    ffmpeg output options that make a re-encoded GOP match the source stream's
+    parameter sets, or None if we can't reproduce them.
+    """
+    codec = video_stream.get('codec_name')
+    profile = BOUNDARY_PROFILES.get(codec, {}).get(video_stream.get('profile'))
+    level = video_stream.get('level')
+    if profile is None or not level or level < 10:  # h264 '1b' (9) has no ffmpeg level name
+        return None
+
+    params = {
+        'vcodec': BOUNDARY_ENCODERS[codec],
+        'profile:v': profile,
+        'pix_fmt': video_stream.get('pix_fmt', 'yuv420p'),
+        'crf': 18,
+        'preset': 'fast',
+        # Parameter sets go in extradata, and dump_extra copies them in front of
+        # every keyframe: each segment carries its own SPS/PPS in-band
+        'flags:v': '+global_header',
+        'bsf:v': 'dump_extra',
+    }
+    if codec == 'h264':
+        params['level'] = f"{level // 10}.{level % 10}"  # ffprobe: 40 -> 4.0
+    else:
+        params['x265-params'] = f"level-idc={level / 30:g}"  # ffprobe: general_level_idc = 30 x level
+    for field, option in COLOR_TAGS.items():
+        value = video_stream.get(field)
+        if value and value != 'unknown':
+            params[option] = value
+    return params
+
+
+def _run(stream, duration: float, on_progress=None):
+    # Imported here: vidpro imports this module for its trim fast path.
+    from backend.app.services.vidpro import run_ffmpeg
+    run_ffmpeg(stream, on_progress=on_progress, expected_duration=duration)
+
+
+def _encode_boundary(input_path: str, start: float, duration: float, output_path: str, params: dict,
+                     on_progress=None):
+    """Re-encodes one partial GOP with parameters that match the source stream (MPEG-TS)."""
+    stream = (
+        ffmpeg
+        .input(input_path, ss=start, t=duration)
+        .output(output_path, an=None, f='mpegts', **params)
+    )
+    _run(stream, duration, on_progress)
+
+
+def _copy_gops(input_path: str, start: float, duration: float, output_path: str, on_progress=None):
+    """Stream-copies whole GOPs to MPEG-TS (Annex B, SPS/PPS in-band). 'start' must be a keyframe timestamp."""
+    stream = (
+        ffmpeg
+        .input(input_path, ss=start, t=duration)
+        .output(output_path, an=None, c='copy', f='mpegts', avoid_negative_ts='make_zero')
+    )
+    _run(stream, duration, on_progress)
+
+
+def _splices_decode(path: str, splices: list) -> bool:
+    """Decodes the video around each splice point. False if the decoder reports any error."""
+    for splice in splices:
+        command = [
+            "ffmpeg", "-hide_banner", "-v", "error", "-xerror",
+            "-ss", f"{max(0.0, splice - SPLICE_CHECK_SECONDS):.3f}", "-i", path,
+            "-t", f"{2 * SPLICE_CHECK_SECONDS:.3f}", "-map", "0:v:0", "-f", "null", "-",
+        ]
+        result = subprocess.run(command, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True)
+        if result.returncode != 0 or result.stderr.strip():
+            print(f"⚠️ Smart trim: splice at {splice:.2f}s doesn't decode cleanly: {result.stderr.strip()[:200]}")
+            return False
+    return True
+
+
+def concat_segments(segment_paths: list, output_path: str, audio_source=None, audio_codec: str = 'aac'):
+    """
+    Joins segments with the concat demuxer (no re-encode of the video).
+    'audio_source' is an optional (path, start, duration) tuple whose audio is
+    laid over the joined video ('audio_codec="copy"' if it's already encoded).
+    """
+    list_path = output_path + ".concat.txt"
+    with open(list_path, "w", encoding="utf-8") as f:
+        for path in segment_paths:
+            safe_path = os.path.abspath(path).replace("\\", "/").replace("'", "'\\''")
+            f.write(f"file '{safe_path}'\n")
+
+    # Stitched renders and smart trims also start playing before they're fully downloaded
+    mux_kwargs = {'movflags': '+faststart'} if os.path.splitext(output_path)[1].lower() in FASTSTART_CONTAINERS else {}
+    try:
+        video = ffmpeg.input(list_path, f='concat', safe=0)
+        if audio_source:
+            path, start, duration = audio_source
+            kwargs = {'ss': start}
+            if duration is not None:
+                kwargs['t'] = duration
+            audio = ffmpeg.input(path, **kwargs).audio
+            out = ffmpeg.output(video.video, audio, output_path, vcodec='copy', acodec=audio_codec, shortest=None, **mux_kwargs)
+        else:
+            out = ffmpeg.output(video, output_path, c='copy', **mux_kwargs)
+        out.run(overwrite_output=True, quiet=True)
+    finally:
+        if os.path.exists(list_path):
+            os.remove(list_path)
+
+    return output_path
+
+
+def smart_trim(input_path: str, start: float, end, keyframes: list, output_path: str, on_progress=None):
+    """
+    Cuts [start, end) out of input_path. Whole GOPs are copied with -c copy and
+    only the partial GOPs at each cut are re-encoded. on_progress gets render
+    snapshots (progress.ProgressParser format) for the whole trim.
+    Returns output_path, or None if smart rendering is not possible for this file
+    (the caller should then do a normal render).
+    """
+    probe = probecache.probe(input_path)
+    video_stream = next((s for s in probe['streams'] if s['codec_type'] == 'video'), None)
+    has_audio = any(s['codec_type'] == 'audio' for s in probe['streams'])
+    total_duration = float(probe['format']['duration'])
+
+    if not video_stream or video_stream.get('codec_name') not in BOUNDARY_ENCODERS:
+        print("⚠️ Smart trim: unsupported codec, falling back to full render")
+        return None
+    params = _boundary_params(video_stream)
+    if params is None:
+        print(f"⚠️ Smart trim: can't match {video_stream.get('codec_name')} profile "
+              f"{video_stream.get('profile')!r}, falling back to full render")
+        return None
+
+    end = total_duration if end is None else min(end, total_duration)
+    head_kf = _first_keyframe_at_or_after(keyframes, start)
+    tail_kf = _last_keyframe_at_or_before(keyframes, end)
+    if head_kf is None or tail_kf is None or tail_kf <= head_kf:
+        # The cut lives inside a single GOP, nothing to copy.
+        return None
+
+    has_head = head_kf - start > KEYFRAME_EPSILON
+    has_tail = end - tail_kf > KEYFRAME_EPSILON
+    durations = ([head_kf - start] if has_head else []) + [tail_kf - head_kf] + ([end - tail_kf] if has_tail else [])
+    progress = CombinedProgress(on_progress, durations)
+
+    work_dir = tempfile.mkdtemp(prefix="smarttrim_", dir=os.path.dirname(output_path) or None)
+    try:
+        segments = []
+        splices = []  # Output timestamps where a re-encoded GOP meets a copied one
+
+        # 1. Head: from the cut up to the first keyframe (re-encoded)
+        if has_head:
+            head_path = os.path.join(work_dir, "head.ts")
+            _encode_boundary(input_path, start, head_kf - start, head_path, params, progress.part(0))
+            segments.append(head_path)
+            splices.append(head_kf - start)
+
+        # 2. Middle: whole GOPs (stream copy)
+        middle_path = os.path.join(work_dir, "middle.ts")
+        _copy_gops(input_path, head_kf, tail_kf - head_kf, middle_path, progress.part(len(segments)))
+        segments.append(middle_path)
+
+        # 3. Tail: from the last keyframe up to the cut (re-encoded)
+        if has_tail:
+            tail_path = os.path.join(work_dir, "tail.ts")
+            _encode_boundary(input_path, tail_kf, end - tail_kf, tail_path, params, progress.part(len(segments)))
+            segments.append(tail_path)
+            splices.append(tail_kf - start)
+
+        # 4. Join. Audio is cut once from the source so it stays in sync across joins.
+        audio_source = (input_path, start, end - start) if has_audio else None
+        concat_segments(segments, output_path, audio_source=audio_source)
+        if not _splices_decode(output_path, splices):
+            os.remove(output_path)
+            return None
+
+        progress.finish()
+        print(f"⚡ Smart trim: copied {tail_kf - head_kf:.2f}s, re-encoded {(head_kf - start) + (end - tail_kf):.2f}s")
+        return output_path
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
@@ -0,0 +1,477 @@
+# backend/app/services/storage.py
+import os
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from backend.app.core.config import settings
+from backend.app.db.database import SessionLocal
+from backend.app.db.models import ACTIVE_JOB_STATUSES, MediaBlob, UploadSession, VideoJob
+from backend.app.services import blobstore, metrics, rendercache, uploads
+
+try:
+    import fcntl
+except ImportError:  # Windows: run a single sweeping process per storage volume
+    fcntl = None
+
+# Storage lifecycle for temp_storage (uploads, blobs, renders, previews, render cache).
+# A sweeper thread (API and workers, one active per host via a lock file) runs
+# every STORAGE_SWEEP_INTERVAL_SECONDS:
+#   1. Garbage, always: abandoned temp files (.part, .rendering, chunk work dirs),
+#      expired upload sessions, files no job points at (superseded renders)
+#   2. Above STORAGE_HIGH_WATERMARK_BYTES, evict down to STORAGE_LOW_WATERMARK_BYTES:
+#        render cache entries only the cache still holds  (LRU by atime)
+#        previews, then full renders of idle jobs          (re-rendered on download)
+#        originals of jobs idle for STORAGE_ORIGINAL_IDLE_SECONDS (job -> EXPIRED)
+#      Jobs that are queued or rendering are never touched.
+#   3. VideoJob.storage_bytes is refreshed (per-user totals come from it) and the
+#      editverse_storage_* metrics are updated.
+# Hardlinked files (render cache hits) are counted once, and only count as
+# freed when their last name is gone. Sidecar caches written next to an upload
+# (silence envelopes) belong to that original and go with it.
+# The plan comes from one snapshot of the jobs table; every eviction re-reads
+# its job row under a lock and skips the job if it changed since.
+
+KINDS = ("original", "render", "preview", "cache", "temp", "orphan")
+WORK_DIR_PREFIXES = ("parallel_", "smarttrim_")
+TOUCH_INTERVAL_SECONDS = 60.0  # last_accessed_at is written at most this often per job
+LOCK_NAME = ".storage-sweep.lock"
+SIDECAR_SUFFIXES = (".envelope.npy",)  # silenceengine.envelope_path()
+
+# Only what the sweep reads: no analysis/keyframes JSON per job
+SWEEP_COLUMNS = (
+    VideoJob.id, VideoJob.status, VideoJob.original_file_path, VideoJob.edited_file_path,
+    VideoJob.preview_file_path, VideoJob.replay_base_path, VideoJob.content_hash, VideoJob.edit_version, VideoJob.render_version,
+    VideoJob.preview_version, VideoJob.storage_bytes, VideoJob.last_accessed_at, VideoJob.created_at,
+)
+# Fields that must still match the snapshot when an eviction runs
+UNCHANGED_FIELDS = ("status", "original_file_path", "edit_version", "last_accessed_at")
+
+last_sweep = {}
+_sweeper_started = False
+
+
+def touch(db, job):
+    """Marks the job as used now (storage LRU). Cheap to call on every request."""
+    now = time.time()
+    if job.last_accessed_at and now - job.last_accessed_at < TOUCH_INTERVAL_SECONDS:
+        return
+    job.last_accessed_at = now
+    db.commit()
+
+
+def _last_used(job) -> float:
+    if job.last_accessed_at:
+        return job.last_accessed_at
+    return job.created_at.timestamp() if job.created_at else 0.0
+
+
+def _is_idle(job, now: float, seconds: float) -> bool:
+    return job.status not in ACTIVE_JOB_STATUSES and now - _last_used(job) > seconds
+
+
+class _Inventory:
+    """Every file under the storage roots, with hardlinks counted once."""
+
+    def __init__(self, roots):
+        self.files = {}                  # path -> os.stat_result
+        self.names = defaultdict(list)   # (dev, inode) -> paths
+        for root in roots:
+            for directory, _, filenames in os.walk(root):
+                for name in filenames:
+                    path = os.path.abspath(os.path.join(directory, name))
+                    try:
+                        st = os.stat(path)
+                    except FileNotFoundError:
+                        continue
+                    self.files[path] = st
+                    self.names[(st.st_dev, st.st_ino)].append(path)
+        self.scanned_links = {inode: len(paths) for inode, paths in self.names.items()}
+
+    def total(self, paths=None) -> int:
+        seen, total = set(), 0
+        for path in self.files if paths is None else paths:
+            st = self.files.get(path)
+            if st is None or (st.st_dev, st.st_ino) in seen:
+                continue
+            seen.add((st.st_dev, st.st_ino))
+            total += st.st_size
+        return total
+
+    def age(self, path: str, now: float) -> float:
+        st = self.files[path]
+        # ctime too: a fresh hardlink to an old cache entry is new, not abandoned
+        return now - max(st.st_mtime, st.st_ctime)
+
+    def remove(self, path: str, with_links: bool = False) -> int:
+        """Deletes 'path' (with_links: every name of that file). Returns bytes freed."""
+        st = self.files.get(path)
+        if st is None:
+            return 0
+        inode = (st.st_dev, st.st_ino)
+        for target in list(self.names[inode]) if with_links else [path]:
+            try:
+                os.remove(target)
+            except FileNotFoundError:
+                pass
+            self.files.pop(target, None)
+            self.names[inode].remove(target)
+        # Links outside the scanned roots keep the bytes alive
+        if not self.names[inode] and st.st_nlink <= self.scanned_links[inode]:
+            return st.st_size
+        return 0
+
+
+def _roots():
+    roots = []
+    for path in sorted({os.path.abspath(p) for p in
+                        (blobstore.storage_dir(), blobstore.blob_dir(), rendercache.cache_dir())}):
+        if os.path.isdir(path) and not any(path.startswith(root + os.sep) for root in roots):
+            roots.append(path)
+    return roots
+
+
+def _is_temp(path: str) -> bool:
+    name = os.path.basename(path)
+    if name.endswith((".part", ".tmp")) or ".rendering" in name:
+        return True
+    return os.path.basename(os.path.dirname(path)).startswith(WORK_DIR_PREFIXES)
+
+
+def _sidecars(inventory: _Inventory, path: str) -> list:
+    return [path + suffix for suffix in SIDECAR_SUFFIXES if path + suffix in inventory.files]
+
+
+def _classify(inventory: _Inventory, jobs) -> dict:
+    """path -> one of KINDS"""
+    referenced = {}
+    for job in jobs:
+        for kind, path in (("preview", job.preview_file_path), ("render", job.edited_file_path)):
+            if path:
+                referenced[os.path.abspath(path)] = kind
+    for job in jobs:
+        # Last, so an original doubling as the "edit" (no actions) stays an original
+        original = os.path.abspath(job.original_file_path)
+        referenced[original] = "original"
+        for sidecar in _sidecars(inventory, original):
+            referenced[sidecar] = "original"
+        if job.replay_base_path:
+            # A legacy job's log replays on it: lives and goes with the original
+            referenced[os.path.abspath(job.replay_base_path)] = "original"
+
+    cache_root = os.path.abspath(rendercache.cache_dir()) + os.sep
+    kinds = {}
+    for path in inventory.files:
+        if path in referenced:
+            kinds[path] = referenced[path]
+        elif path.startswith(cache_root) and not path.endswith(".tmp"):
+            kinds[path] = "cache"
+        elif _is_temp(path):
+            kinds[path] = "temp"
+        elif os.path.basename(path) != LOCK_NAME:
+            kinds[path] = "orphan"
+    return kinds
+
+
+def _expire_uploads(db, now: float):
+    """Resumable uploads nobody has written to in STORAGE_TEMP_MAX_AGE_SECONDS."""
+    cutoff = now - settings.STORAGE_TEMP_MAX_AGE_SECONDS
+    stale = db.query(UploadSession).filter(UploadSession.status == "OPEN", UploadSession.updated_at < cutoff).all()
+    for upload in stale:
+        upload.status = "REJECTED"
+        upload.error = "Upload expired"
+        upload.updated_at = now
+        try:
+            os.remove(uploads.part_path(blobstore.storage_dir(), upload.id))
+        except FileNotFoundError:
+            pass
+    if stale:
+        db.commit()
+
+
+def _remove_empty_work_dirs(root: str):
+    for entry in os.scandir(root):
+        if entry.is_dir() and entry.name.startswith(WORK_DIR_PREFIXES):
+            try:
+                os.rmdir(entry.path)  # Only succeeds once it's empty
+            except OSError:
+                pass
+
+
+# --- Eviction, cheapest to lose first ---
+def _evict_file(inventory, path):
+    return lambda db: inventory.remove(path)
+
+
+def _lock_unchanged(db, snapshot, fields, idle_seconds: float):
+    """
+    Re-reads the job row FOR UPDATE. Returns it if it is still idle and 'fields'
+    still match the sweep's snapshot, else releases the lock and returns None.
+    """
+    job = db.query(VideoJob).filter(VideoJob.id == snapshot.id).with_for_update().first()
+    if (job is None or not _is_idle(job, time.time(), idle_seconds)
+            or any(getattr(job, field) != getattr(snapshot, field) for field in UNCHANGED_FIELDS + fields)):
+        db.rollback()
+        return None
+    return job
+
+
+def _evict_preview(inventory, snapshot, path):
+    def evict(db):
+        job = _lock_unchanged(db, snapshot, ("preview_file_path", "preview_version"),
+                              settings.STORAGE_RENDER_IDLE_SECONDS)
+        if job is None:
+            return 0
+        job.preview_file_path = None
+        job.preview_version = None
+        db.commit()  # Before the delete: nobody gets handed a path that's about to vanish
+        return inventory.remove(path, with_links=True)
+    return evict
+
+
+def _evict_render(inventory, snapshot, path):
+    def evict(db):
+        job = _lock_unchanged(db, snapshot, ("edited_file_path", "render_version"),
+                              settings.STORAGE_RENDER_IDLE_SECONDS)
+        if job is None:
+            return 0
+        job.edited_file_path = None
+        job.render_version = 0  # Stale -> the next download re-renders it
+        db.commit()
+        return inventory.remove(path, with_links=True)
+    return evict
+
+
+def _evict_original(inventory, snapshots, path):
+    def evict(db):
+        jobs = []
+        for snapshot in sorted(snapshots, key=lambda job: str(job.id)):  # Fixed lock order
+            job = _lock_unchanged(db, snapshot, ("edited_file_path", "preview_file_path", "content_hash"),
+                                  settings.STORAGE_ORIGINAL_IDLE_SECONDS)
+            if job is None:
+                return 0  # One owner is back in use: the shared original stays
+            jobs.append(job)
+
+        # Blob-store originals (UPLOAD_DEDUP) are deleted together with their
+        # media_blobs row, under its lock, and only if these jobs are its only
+        # users; anything else (UPLOAD_DEDUP off, files outside BLOB_STORE_DIR)
+        # is a plain per-job file
+        blob = _locked_blob(db, jobs, path)
+        if blob is False:
+            db.rollback()
+            return 0
+
+        freed = 0
+        for target in [path] + _sidecars(inventory, path):
+            freed += inventory.remove(target)  # Raises (-> rollback, jobs untouched) if it can't
+        if blob is not None:
+            db.delete(blob)
+
+        # The bytes are gone: only now do the jobs expire
+        outputs = set()
+        for job in jobs:
+            outputs.update(p for p in (job.preview_file_path, job.edited_file_path, job.replay_base_path)
+                           if p and p != job.original_file_path)
+            job.status = "EXPIRED"
+            job.error_message = "The original video was removed after a long time without use. Upload it again."
+            job.preview_file_path = None
+            job.edited_file_path = None
+            job.replay_base_path = None
+            job.render_version = 0
+            job.storage_bytes = 0
+        db.commit()
+
+        for output in outputs:
+            freed += inventory.remove(os.path.abspath(output), with_links=True)
+        return freed
+    return evict
+
+
+def _locked_blob(db, jobs, path: str):
+    """
+    The media_blobs row behind a shared original, locked; None if the file isn't
+    a stored blob; False if it is but other jobs still reference it.
+    """
+    hashes = {job.content_hash for job in jobs}
+    blob_root = os.path.abspath(blobstore.blob_dir()) + os.sep
+    if len(hashes) != 1 or None in hashes or not path.startswith(blob_root):
+        return None
+    blob = db.query(MediaBlob).filter(MediaBlob.content_hash == hashes.pop()).with_for_update().first()
+    if blob is None or os.path.abspath(blob.file_path) != path:
+        return None
+    if (blob.ref_count or 0) > len(jobs):
+        return False
+    return blob
+
+
+def _eviction_plan(inventory: _Inventory, kinds: dict, jobs, now: float) -> list:
+    """[(kind, evict(db) -> bytes freed)] in the order they should go."""
+    cache = sorted(
+        (inventory.files[path].st_atime, path) for path, kind in kinds.items()
+        if kind == "cache" and inventory.files[path].st_nlink == 1
+    )
+    plan = [("cache", _evict_file(inventory, path)) for _, path in cache]
+
+    idle_jobs = sorted((job for job in jobs if _is_idle(job, now, settings.STORAGE_RENDER_IDLE_SECONDS)),
+                       key=_last_used)
+    for kind, attribute, make in (("preview", "preview_file_path", _evict_preview),
+                                  ("render", "edited_file_path", _evict_render)):
+        for job in idle_jobs:
+            path = getattr(job, attribute)
+            if path and kinds.get(os.path.abspath(path)) == kind:
+                plan.append((kind, make(inventory, job, os.path.abspath(path))))
+
+    # Originals may be shared (deduplicated uploads): all of their jobs must be stale
+    by_original = defaultdict(list)
+    for job in jobs:
+        by_original[os.path.abspath(job.original_file_path)].append(job)
+    stale = [
+        (max(_last_used(job) for job in owners), path, owners)
+        for path, owners in by_original.items()
+        if path in inventory.files
+        and all(_is_idle(job, now, settings.STORAGE_ORIGINAL_IDLE_SECONDS) for job in owners)
+    ]
+    for _, path, owners in sorted(stale, key=lambda item: item[0]):
+        plan.append(("original", _evict_original(inventory, owners, path)))
+    return plan
+
+
+def _record_job_bytes(db, inventory: _Inventory, jobs):
+    changed = False
+    for job in jobs:
+        paths = [os.path.abspath(p) for p in (job.original_file_path, job.edited_file_path, job.preview_file_path,
+                                              job.replay_base_path) if p]
+        size = inventory.total(paths + _sidecars(inventory, os.path.abspath(job.original_file_path)))
+        if job.storage_bytes != size:
+            db.query(VideoJob).filter(VideoJob.id == job.id).update({VideoJob.storage_bytes: size},
+                                                                    synchronize_session=False)
+            changed = True
+    if changed:
+        db.commit()
+
+
+@contextmanager
+def _sweep_lock(root):
+    """One sweeper at a time per storage volume (other processes skip their turn)."""
+    if fcntl is None:
+        yield True
+        return
+    with open(os.path.join(root, LOCK_NAME), "a") as f:
+        try:
+            fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            yield False
+            return
+        try:
+            yield True
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def sweep() -> dict:
+    """One pass: garbage first, then evict down to the low watermark if above the high one."""
+    root = blobstore.storage_dir()
+    root.mkdir(parents=True, exist_ok=True)
+    with _sweep_lock(root) as acquired:
+        if not acquired:
+            return {"skipped": True}
+        db = SessionLocal()
+        try:
+            with metrics.stage("storage_sweep"):
+                summary = _sweep(db, str(root))
+        finally:
+            db.close()
+    last_sweep.clear()
+    last_sweep.update(summary)
+    return summary
+
+
+def _sweep(db, root: str) -> dict:
+    now = time.time()
+    _expire_uploads(db, now)
+    jobs = db.query(*SWEEP_COLUMNS).all()
+    db.commit()  # Don't hold the snapshot's transaction open while walking the disk
+    inventory = _Inventory(_roots())
+    kinds = _classify(inventory, jobs)
+    before = inventory.total()
+    freed = defaultdict(int)
+    removed = defaultdict(int)
+
+    # 1. Garbage
+    for path, kind in kinds.items():
+        if kind in ("temp", "orphan") and inventory.age(path, now) > settings.STORAGE_TEMP_MAX_AGE_SECONDS:
+            freed[kind] += inventory.remove(path)
+            removed[kind] += 1
+    _remove_empty_work_dirs(root)
+
+    # 2. Quota
+    usage = inventory.total()
+    if usage > settings.STORAGE_HIGH_WATERMARK_BYTES:
+        for kind, evict in _eviction_plan(inventory, kinds, jobs, now):
+            if usage <= settings.STORAGE_LOW_WATERMARK_BYTES:
+                break
+            try:
+                bytes_freed = evict(db)
+            except Exception as e:
+                print(f"⚠️ [STORAGE] Could not evict a {kind}: {e}")
+                db.rollback()
+                continue
+            usage -= bytes_freed
+            freed[kind] += bytes_freed
+            removed[kind] += 1
+        if usage > settings.STORAGE_LOW_WATERMARK_BYTES:
+            print(f"⚠️ [STORAGE] Still {usage} bytes after eviction: everything left is in use or recent")
+
+    # 3. Accounting
+    _record_job_bytes(db, inventory, jobs)
+    by_kind = {kind: inventory.total([p for p, k in kinds.items() if k == kind and p in inventory.files])
+               for kind in KINDS}
+    total = inventory.total()
+    for kind, size in by_kind.items():
+        metrics.STORAGE_BYTES.labels(kind).set(size)
+    metrics.STORAGE_BYTES.labels("total").set(total)
+    for kind, size in freed.items():
+        metrics.STORAGE_EVICTED_BYTES.labels(kind).inc(size)
+
+    if removed:
+        print(f"🧹 [STORAGE] Freed {before - total} bytes ({dict(removed)}), {total} bytes in use")
+    return {
+        "finished_at": now,
+        "bytes_before": before,
+        "bytes": total,
+        "bytes_by_kind": by_kind,
+        "freed_by_kind": dict(freed),
+        "removed_by_kind": dict(removed),
+        "high_watermark": settings.STORAGE_HIGH_WATERMARK_BYTES,
+        "low_watermark": settings.STORAGE_LOW_WATERMARK_BYTES,
+    }
+
+
+def user_usage(db, user_id: int) -> dict:
+    """Bytes per job for one user, as of the last sweep."""
+    jobs = db.query(VideoJob).filter(VideoJob.user_id == user_id).all()
+    per_job = [{"job_id": str(job.id), "status": job.status, "bytes": job.storage_bytes or 0,
+                "last_accessed_at": _last_used(job)} for job in jobs]
+    return {"bytes": sum(item["bytes"] for item in per_job), "jobs": per_job}
+
+
+def stats() -> dict:
+    return dict(last_sweep)
+
+
+def _sweep_forever():
+    while True:
+        try:
+            sweep()
+        except Exception as e:
+            print(f"⚠️ [STORAGE] Sweep failed: {e}")
+        time.sleep(settings.STORAGE_SWEEP_INTERVAL_SECONDS)
+
+
+def start_sweeper():
+    """Starts the periodic sweeper thread once per process (no-op if STORAGE_SWEEPER is off)."""
+    global _sweeper_started
+    if _sweeper_started or not settings.STORAGE_SWEEPER:
+        return
+    _sweeper_started = True
+    threading.Thread(target=_sweep_forever, name="storage-sweeper", daemon=True).start()
@@ -0,0 +1,348 @@
+# backend/app/services/uploads.py
+import hashlib
+import os
+import time
+import uuid
+from pathlib import Path
+import ffmpeg
+from sqlalchemy import or_
+from starlette.concurrency import run_in_threadpool
+from backend.app.core.config import settings
+from backend.app.db.models import UploadSession
+from backend.app.services import blobstore
+
+# Chunked, resumable uploads.
+#   POST /jobs/uploads                      -> upload_id
+#   PUT  /jobs/uploads/{id}?offset=N        -> raw bytes, appended at N
+#   GET  /jobs/uploads/{id}                 -> how much arrived (resume from there)
+#   POST /jobs/uploads/{id}/complete        -> VideoJob + ingest
+# Disk writes run in the threadpool, so a slow multi-GB upload never blocks the
+# event loop. The sha256 is updated as bytes are written; after a restart it is
+# rebuilt once from the .part file. As soon as the first UPLOAD_SNIFF_BYTES are
+# in, the head is probed and non-video files are rejected early.
+# Finished files go through store(): identical content is kept once (blobstore).
+
+HASH_READ_BYTES = 4 * 1024 * 1024
+
+_hashers = {}  # upload_id -> (offset, sha256 object)
+
+
+class UploadError(Exception):
+    def __init__(self, status_code: int, detail: str):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+
+
+def part_path(upload_dir: Path, upload_id: str) -> Path:
+    return Path(upload_dir) / f"{upload_id}.part"
+
+
+def session_info(upload: UploadSession) -> dict:
+    return {
+        "upload_id": upload.id,
+        "status": upload.status,
+        "size": upload.total_size,
+        "received": upload.received or 0,
+        "chunk_size": settings.UPLOAD_CHUNK_SIZE,
+        "job_id": upload.job_id,
+        "error": upload.error,
+    }
+
+
+def create_session(db, user_id: int, filename: str, size: int) -> UploadSession:
+    if size <= 0:
+        raise UploadError(400, "Upload size must be positive")
+    if size > settings.UPLOAD_MAX_BYTES:
+        raise UploadError(413, f"File is larger than {settings.UPLOAD_MAX_BYTES} bytes")
+
+    now = time.time()
+    upload = UploadSession(
+        id=uuid.uuid4().hex,
+        user_id=user_id,
+        filename=filename,
+        total_size=size,
+        received=0,
+        status="OPEN",
+        sniffed=False,
+        created_at=now,
+        updated_at=now,
+    )
+    db.add(upload)
+    db.commit()
+    return upload
+
+
+# --- Hashing ---
+def _hasher_at(path: Path, upload_id: str, offset: int):
+    """sha256 state covering the first 'offset' bytes (rebuilt from disk if we lost it)."""
+    cached = _hashers.get(upload_id)
+    if cached and cached[0] == offset:
+        return cached[1]
+
+    hasher = hashlib.sha256()
+    if offset:
+        with open(path, "rb") as f:
+            remaining = offset
+            while remaining:
+                data = f.read(min(HASH_READ_BYTES, remaining))
+                if not data:
+                    raise UploadError(409, "Partial upload is shorter than recorded, restart it")
+                hasher.update(data)
+                remaining -= len(data)
+    return hasher
+
+
+async def save_upload_file(upload_file, destination: Path) -> str:
+    """Async copy of a multipart UploadFile to disk. Returns its sha256."""
+    hasher = hashlib.sha256()
+    out = await run_in_threadpool(open, destination, "wb")
+    try:
+        while True:
+            data = await upload_file.read(settings.UPLOAD_WRITE_BUFFER)
+            if not data:
+                break
+            await run_in_threadpool(out.write, data)
+            hasher.update(data)
+    finally:
+        await run_in_threadpool(out.close)
+    return hasher.hexdigest()
+
+
+def store(db, temp_path: Path, content_hash: str, extension: str, upload_dir: Path) -> Path:
+    """Moves a complete upload to its final place and returns that path (blocking: DB + file ops)."""
+    if settings.UPLOAD_DEDUP:
+        return blobstore.adopt(db, temp_path, content_hash, extension)
+    final_path = Path(upload_dir) / f"{uuid.uuid4()}{extension.lower()}"
+    os.replace(temp_path, final_path)
+    return final_path
+
+
+# --- Early sanity check ---
+# Containers whose stream info may only be readable once the tail arrives
+# (e.g. phone MP4s write the moov atom last), so a failed head probe is not fatal.
+def _known_container(head: bytes) -> bool:
+    return (
+        head[4:8] == b"ftyp"                          # MP4 / MOV / 3GP
+        or head[:4] == b"\x1a\x45\xdf\xa3"            # Matroska / WebM
+        or (head[:4] == b"RIFF" and head[8:12] == b"AVI ")
+        or head[:3] == b"FLV"
+        or head[:4] == b"\x00\x00\x01\xba"            # MPEG program stream
+        or (len(head) > 188 and head[0] == 0x47 and head[188] == 0x47)  # MPEG-TS
+    )
+
+
+def sniff(path: Path, complete: bool = False) -> bool:
+    """
+    Raises UploadError(415) if the bytes so far are clearly not a video.
+    Returns True if ffprobe found a video stream, False if only the container
+    signature passed (the complete file still has to be probed).
+    With 'complete' the file is all there, so only a video stream will do.
+    """
+    with open(path, "rb") as f:
+        head = f.read(256)
+
+    try:
+        info = ffmpeg.probe(str(path))
+        if any(stream.get("codec_type") == "video" for stream in info.get("streams", [])):
+            return True
+    except ffmpeg.Error:
+        pass
+
+    if complete or not _known_container(head):
+        raise UploadError(415, "This doesn't look like a video file")
+    return False
+
+
+def _reject(db, upload: UploadSession, path: Path, reason: str):
+    upload.status = "REJECTED"
+    upload.error = reason
+    upload.writer = None
+    upload.updated_at = time.time()
+    db.commit()
+    _hashers.pop(upload.id, None)
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+# --- One writer per session ---
+# A conditional UPDATE hands the session to one request at a time, in any
+# process: a PUT only at the recorded offset, /complete only once it's all in.
+# The holder bumps updated_at while it works; a hold that went silent for
+# UPLOAD_WRITER_STALE_SECONDS (crashed worker) can be taken over.
+def _claim(db, upload: UploadSession, offset: int = None) -> str:
+    """Returns a writer token, or raises UploadError(409) saying why not."""
+    token = uuid.uuid4().hex
+    now = time.time()
+    query = db.query(UploadSession).filter(
+        UploadSession.id == upload.id,
+        UploadSession.status == "OPEN",
+        or_(UploadSession.writer.is_(None),
+            UploadSession.updated_at < now - settings.UPLOAD_WRITER_STALE_SECONDS),
+    )
+    if offset is not None:
+        query = query.filter(UploadSession.received == offset)
+    claimed = query.update({"writer": token, "updated_at": now}, synchronize_session=False)
+    db.commit()
+    db.refresh(upload)
+    if claimed:
+        return token
+
+    if upload.status != "OPEN":
+        raise UploadError(409, f"Upload is {upload.status}")
+    if offset is not None and offset != (upload.received or 0):
+        raise UploadError(409, f"Expected offset {upload.received or 0}")
+    raise UploadError(409, "Another request is writing this upload, retry shortly")
+
+
+def _held(db, upload_id: str, token: str, **values) -> bool:
+    """Updates the session only while we still hold it. False if it was taken over."""
+    values["updated_at"] = time.time()
+    updated = (
+        db.query(UploadSession)
+        .filter(UploadSession.id == upload_id, UploadSession.writer == token)
+        .update(values, synchronize_session=False)
+    )
+    db.commit()
+    return updated == 1
+
+
+# --- Chunks ---
+async def write_chunk(db, upload: UploadSession, upload_dir: Path, offset: int, chunks) -> UploadSession:
+    """
+    Appends an async iterator of bytes at 'offset'. Whatever reached the disk is
+    recorded even if the client drops mid-chunk, so the next PUT resumes there.
+    """
+    token = await run_in_threadpool(_claim, db, upload, offset)
+    path = part_path(upload_dir, upload.id)
+    written = 0
+    held = True
+    try:
+        hasher = await run_in_threadpool(_hasher_at, path, upload.id, offset)
+        out = await run_in_threadpool(open, path, "r+b" if path.exists() else "wb")
+        buffer = bytearray()
+        try:
+            await run_in_threadpool(out.seek, offset)
+            await run_in_threadpool(out.truncate)  # Drop bytes of an interrupted PUT we never recorded
+            touched = time.monotonic()
+            async for data in chunks:
+                if offset + written + len(buffer) + len(data) > upload.total_size:
+                    raise UploadError(413, "More bytes than the declared size")
+                buffer += data
+                if len(buffer) >= settings.UPLOAD_WRITE_BUFFER:
+                    if time.monotonic() - touched > settings.UPLOAD_WRITER_STALE_SECONDS / 4:
+                        held = await run_in_threadpool(_held, db, upload.id, token)
+                        if not held:
+                            raise UploadError(409, "Upload was taken over by another request")
+                        touched = time.monotonic()
+                    await run_in_threadpool(out.write, bytes(buffer))
+                    hasher.update(buffer)
+                    written += len(buffer)
+                    buffer.clear()
+        finally:
+            # Keep the tail of what the client managed to send, even on disconnect
+            # (the client may have stalled a long time: only if it's still ours)
+            if held and buffer:
+                held = await run_in_threadpool(_held, db, upload.id, token)
+                if held:
+                    await run_in_threadpool(out.write, bytes(buffer))
+                    hasher.update(buffer)
+                    written += len(buffer)
+            await run_in_threadpool(out.close)
+            if held:
+                _hashers[upload.id] = (offset + written, hasher)
+    finally:
+        if held:
+            await run_in_threadpool(_held, db, upload.id, token, received=offset + written, writer=None)
+        await run_in_threadpool(db.refresh, upload)
+
+    # Once, on the chunk that crosses the threshold
+    threshold = min(settings.UPLOAD_SNIFF_BYTES, upload.total_size)
+    if not upload.sniffed and offset < threshold <= upload.received:
+        try:
+            confirmed = await run_in_threadpool(sniff, path)
+        except UploadError as e:
+            await run_in_threadpool(_reject, db, upload, path, e.detail)
+            raise
+        if confirmed:
+            upload.sniffed = True
+            await run_in_threadpool(db.commit)
+
+    return upload
+
+
+def _unstore(db, final_path: Path, content_hash: str):
+    """Undoes store() for an upload that never got its job."""
+    if settings.UPLOAD_DEDUP:
+        blobstore.release(db, content_hash)
+        return
+    try:
+        os.remove(final_path)
+    except FileNotFoundError:
+        pass
+
+
+def _complete(db, upload: UploadSession, token: str, path: Path, content_hash: str, upload_dir: Path, add_job):
+    """Stores the file, then adds the job and closes the session in one commit."""
+    extension = Path(upload.filename).suffix.lower()
+    final_path = store(db, path, content_hash, extension, upload_dir)
+    try:
+        job = add_job(final_path, content_hash)
+        completed = (
+            db.query(UploadSession)
+            .filter(UploadSession.id == upload.id, UploadSession.writer == token)
+            .update({"status": "COMPLETE", "content_hash": content_hash, "job_id": str(job.id),
+                     "writer": None, "updated_at": time.time()}, synchronize_session=False)
+        )
+        if not completed:
+            raise UploadError(409, "Upload was taken over by another request")
+        db.commit()
+    except Exception:
+        # The .part file is gone (stored), so the session can't reopen: give
+        # back what store() took and fail the session instead of leaving it
+        # COMPLETE without a job
+        db.rollback()
+        _unstore(db, final_path, content_hash)
+        db.refresh(upload)
+        if upload.writer == token:
+            _reject(db, upload, path, "Could not create the job, upload the file again")
+        raise
+    _hashers.pop(upload.id, None)
+    db.refresh(upload)
+    return final_path, job
+
+
+async def finish(db, upload: UploadSession, upload_dir: Path, expected_sha256: str = None, add_job=None):
+    """
+    Verifies size/hash, moves the .part file into place and creates the job via
+    add_job(final_path, content_hash) (adds it, doesn't commit). The job and the
+    COMPLETE session are committed together. Returns (final_path, job).
+    """
+    token = await run_in_threadpool(_claim, db, upload)
+    try:
+        if (upload.received or 0) != upload.total_size:
+            raise UploadError(409, f"Only {upload.received or 0} of {upload.total_size} bytes received")
+
+        path = part_path(upload_dir, upload.id)
+        hasher = await run_in_threadpool(_hasher_at, path, upload.id, upload.total_size)
+        content_hash = hasher.hexdigest()
+        if expected_sha256 and expected_sha256.lower() != content_hash:
+            await run_in_threadpool(_reject, db, upload, path, "Checksum mismatch")
+            raise UploadError(422, "Checksum mismatch, upload the file again")
+
+        if not upload.sniffed:
+            try:
+                await run_in_threadpool(sniff, path, True)
+            except UploadError as e:
+                await run_in_threadpool(_reject, db, upload, path, e.detail)
+                raise
+
+        # Re-hashing a large file after a restart takes a while: make sure it's still ours
+        if not await run_in_threadpool(_held, db, upload.id, token):
+            raise UploadError(409, "Upload was taken over by another request")
+        return await run_in_threadpool(_complete, db, upload, token, path, content_hash, upload_dir, add_job)
+    finally:
+        # Give the session back if we stopped early (no-op once it's COMPLETE/REJECTED)
+        await run_in_threadpool(_held, db, upload.id, token, writer=None)
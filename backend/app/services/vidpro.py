@@ -9,6 +9,20 @@ from pathlib import Path
 import shutil
 import subprocess
 import re
+import tempfile
+import threading
+import time
+import uuid
+from backend.app.services.smarttrim import collapse_trims, smart_trim
+from backend.app.services.parallelrender import render_parallel
+from backend.app.core.config import settings
+from backend.app.services import probecache
+from backend.app.services import encoding
+from backend.app.services import metrics
+from backend.app.services import rendercache
+from backend.app.services.analysis import cached_silences
+from backend.app.services import silenceengine
+from backend.app.services.progress import ProgressParser
 
 # --- HELPER: SUBTITLE GENERATION ---
 def generate_srt(transcription: dict, srt_path: str):
@@ -35,30 +49,48 @@ def generate_srt(transcription: dict, srt_path: str):
 #     print(f"✅ [WHISPER] Saved SRT to: {srt_filename}")
 #     return srt_filename
 
-def detect_silence(input_path: str, db_threshold=-30, min_duration=0.5):
+def detect_silence(input_path: str, db_threshold=-30, min_duration=0.5, analysis: dict = None):
     """
     Runs a 2-pass analysis to find start/end times of silence.
     Returns a list of 'keep' segments (non-silent parts).
+    If the upload analysis record already has silences for these settings, no decode is needed.
+    With SILENCE_ENGINE="envelope" any other settings are answered from the cached NumPy
+    envelope (one decode per file, ever).
     """
+    started = time.perf_counter()
     try:
-        print("🔇 Detecting silence...")
-        # Run silencedetect filter and capture output (it prints to stderr)
-        command = [
-            "ffmpeg", "-i", input_path, 
-            "-af", f"silencedetect=noise={db_threshold}dB:d={min_duration}",
-            "-f", "null", "-"
-        ]
-        result = subprocess.run(command, stderr=subprocess.PIPE, text=True)
-        output = result.stderr
-
-        # Parse output for silence_start and silence_end
-        silence_starts = [float(x) for x in re.findall(r'silence_start: (\d+(?:\.\d+)?)', output)]
-        silence_ends = [float(x) for x in re.findall(r'silence_end: (\d+(?:\.\d+)?)', output)]
-
         # Calculate Total Duration to know where the video ends
-        probe = ffmpeg.probe(input_path)
+        probe = probecache.probe(input_path)
         total_duration = float(probe['format']['duration'])
 
+        intervals = cached_silences(analysis, db_threshold, min_duration)
+        source = "analysis" if intervals is not None else "silencedetect"
+        if intervals is None and settings.SILENCE_ENGINE == "envelope":
+            try:
+                intervals = silenceengine.detect_silences(input_path, db_threshold, min_duration)
+                source = "envelope"
+            except Exception as e:
+                print(f"⚠️ Envelope engine failed, using silencedetect: {e}")
+
+        if intervals is not None:
+            print("🔇 Using precomputed silences (no decode)")
+            silence_starts = [start for start, _ in intervals]
+            silence_ends = [end for _, end in intervals]
+        else:
+            print("🔇 Detecting silence...")
+            # Run silencedetect filter and capture output (it prints to stderr)
+            command = [
+                "ffmpeg", "-i", input_path, 
+                "-af", f"silencedetect=noise={db_threshold}dB:d={min_duration}",
+                "-f", "null", "-"
+            ]
+            result = subprocess.run(command, stderr=subprocess.PIPE, text=True)
+            output = result.stderr
+
+            # Parse output for silence_start and silence_end
+            silence_starts = [float(x) for x in re.findall(r'silence_start: (\d+(?:\.\d+)?)', output)]
+            silence_ends = [float(x) for x in re.findall(r'silence_end: (\d+(?:\.\d+)?)', output)]
+
         # Calculate "Keep" Segments (The parts that represent speech/sound)
         keep_segments = []
         current_time = 0.0
@@ -76,18 +108,60 @@ def detect_silence(input_path: str, db_threshold=-30, min_duration=0.5):
             keep_segments.append((current_time, total_duration))
 
         print(f"✂️ Found {len(keep_segments)} valid segments to keep.")
+        metrics.observe("silence", time.perf_counter() - started, outcome=source)
         return keep_segments
 
     except Exception as e:
         print(f"Silence Detection Failed: {e}")
+        metrics.observe("silence", time.perf_counter() - started, outcome="error")
         return []
 
+def silence_source(actions: list, analysis: dict = None):
+    """
+    What detect_silence() will answer the log's silence removal from, with the
+    version of that detector (part of the render cache key). None without one.
+    """
+    action = next((a for a in reversed(actions) if a['type'] == 'remove_silence'), None)
+    if action is None:
+        return None
+    if cached_silences(analysis, action.get('threshold', -30), action.get('min_duration', 0.5)) is not None:
+        return {"source": "analysis", "version": analysis.get("version")}
+    if settings.SILENCE_ENGINE == "envelope":
+        return {"source": "envelope", "version": silenceengine.ENGINE_VERSION}
+    return {"source": "silencedetect"}
+
+
+def remap_keep_segments(segments: list, window_start: float, window_end: float, speed: float,
+                        min_duration: float) -> list:
+    """
+    Maps keep segments found on the source (detect_silence) onto a timeline that
+    plays the source window [window_start, window_end) at 'speed'. Silences the
+    window cuts shorter than min_duration (output seconds) are kept, as a fresh
+    silencedetect on that timeline wouldn't report them either.
+    """
+    min_gap = min_duration * speed  # In source seconds
+    keep = []
+    for seg_start, seg_end in segments:
+        seg_start, seg_end = max(seg_start, window_start), min(seg_end, window_end)
+        if seg_end <= seg_start:
+            continue
+        if not keep and seg_start - window_start < min_gap:
+            keep.append((window_start, seg_end))
+        elif keep and seg_start - keep[-1][1] < min_gap:
+            keep[-1] = (keep[-1][0], seg_end)
+        else:
+            keep.append((seg_start, seg_end))
+    if keep and window_end - keep[-1][1] < min_gap:
+        keep[-1] = (keep[-1][0], window_end)
+    return [((seg_start - window_start) / speed, (seg_end - window_start) / speed) for seg_start, seg_end in keep]
+
+
 def get_video_metadata(file_path: str):
     """
     Uses FFmpeg to probe the video file and extract metadata.
     """
     try:
-        probe = ffmpeg.probe(file_path)
+        probe = probecache.probe(file_path)
         video_stream = next((stream for stream in probe['streams'] if stream['codec_type'] == 'video'), None)
         
         if not video_stream:
@@ -117,27 +191,184 @@ def get_video_metadata(file_path: str):
 
 
 
-def apply_edits(input_path: str, actions: list) -> str:
+def run_ffmpeg(stream, on_progress=None, expected_duration: float = None):
+    """
+    Like ffmpeg.run(stream, overwrite_output=True), but a large filter graph is
+    written to a -filter_complex_script file instead of the command line
+    (long silence-removal expressions would otherwise hit ARG_MAX).
+    The process is read asynchronously through "-progress pipe:1"; every
+    progress block is passed to on_progress(snapshot) as it arrives.
+    """
+    args = ffmpeg.compile(stream, overwrite_output=True)
+    args[1:1] = ['-progress', 'pipe:1', '-nostats']
+    script_path = None
+    if '-filter_complex' in args:
+        i = args.index('-filter_complex')
+        graph = args[i + 1]
+        if len(graph) > settings.FILTER_SCRIPT_THRESHOLD:
+            fd, script_path = tempfile.mkstemp(prefix="graph_", suffix=".txt")
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                f.write(graph)
+            args[i:i + 2] = ['-filter_complex_script', script_path]
+
+    try:
+        process = subprocess.Popen(args, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+
+        # Drain stderr in the background so FFmpeg never blocks on a full pipe
+        stderr_chunks = []
+        drain = threading.Thread(target=lambda: stderr_chunks.append(process.stderr.read()), daemon=True)
+        drain.start()
+
+        parser = ProgressParser(expected_duration)
+        try:
+            for raw_line in process.stdout:
+                snapshot = parser.feed(raw_line.decode('utf8', errors='replace'))
+                if snapshot and on_progress:
+                    on_progress(snapshot)
+        except BaseException:
+            process.kill()  # on_progress asked us to stop (e.g. the task's lease was lost)
+            process.wait()
+            raise
+
+        process.wait()
+        drain.join()
+        if process.returncode != 0:
+            raise ffmpeg.Error('ffmpeg', b'', b''.join(stderr_chunks))
+    finally:
+        if script_path and os.path.exists(script_path):
+            os.remove(script_path)
+
+
+def apply_edits(input_path: str, actions: list, keyframes: list = None, output_path: str = None,
+                start: float = None, end: float = None, music_offset: float = 0.0,
+                workers: int = None, analysis: dict = None, on_progress=None, preview: bool = False,
+                profile: str = None, content_hash: str = None, use_cache: bool = True,
+                streams: str = "av") -> str:
     """
     Applies AI-generated edits (Trim, Speed, Filter, Text) to the video.
+    If 'keyframes' is given and the actions are trims only, the cut is smart-rendered
+    (whole GOPs are stream-copied) instead of re-encoding the whole file.
+    With workers > 1 long clips are split at keyframes and rendered in parallel.
+    'start'/'end' restrict the render to a window of the source and 'music_offset'
+    is where background music starts (both used for parallel chunks).
+    'analysis' is the job's upload analysis record (silences are read from it).
+    'on_progress' receives render progress snapshots (see services/progress.py).
+    'preview' renders a fast low-resolution proxy (PREVIEW_HEIGHT, ultrafast, short GOP)
+    of the same actions instead of the full-quality output.
+    'profile' is the encoder profile (services/encoding.py, default ENCODE_PROFILE).
+    Identical renders are served from the render cache ('content_hash' is the
+    input's sha256 if already known; 'use_cache=False' skips the cache).
+    'streams' is "av" (default), "video" or "audio": which of the edited streams to
+    write (parallel renders encode video chunks and the audio track separately).
     """
     directory = os.path.dirname(input_path)
     filename = os.path.basename(input_path)
-    output_path = os.path.join(directory, f"edited_{filename}")
-    temp_srt_path = None
-    music_stream = None
+    if output_path is None:
+        output_path = os.path.join(directory, f"edited_{filename}")
+    if workers is None:
+        workers = settings.RENDER_WORKERS
+    profile = "preview" if preview else encoding.resolve_profile(profile)
 
     if not actions:
         return input_path
 
+    cache_key = None
+    if use_cache and streams == "av" and settings.RENDER_CACHE_ENABLED:
+        try:
+            cache_key = rendercache.render_key(input_path, actions, profile, output_path, content_hash=content_hash,
+                                               start=start, end=end, music_offset=music_offset,
+                                               silence=silence_source(actions, analysis))
+            if rendercache.fetch(cache_key, output_path):
+                print(f"♻️ Render cache hit ({cache_key[:12]})")
+                return output_path
+        except OSError as e:
+            print(f"⚠️ Render cache unavailable: {e}")
+            cache_key = None
+
+    # Render next to the target and swap it in at the end: downloads never see a
+    # half-written file, and a cached (hardlinked) earlier output is never overwritten.
+    # The temp name is unique, so two renders of one job never write the same file.
+    base, extension = os.path.splitext(output_path)
+    rendering_path = f"{base}.rendering-{uuid.uuid4().hex[:12]}{extension}"
     try:
+        _render(input_path, actions, keyframes, rendering_path, start, end, music_offset,
+                workers, analysis, on_progress, preview, profile, streams)
+        if cache_key:
+            # From our own file: output_path may already hold another render's swap
+            try:
+                rendercache.store(cache_key, rendering_path)
+            except OSError as e:
+                print(f"⚠️ Could not store render in cache: {e}")
+        os.replace(rendering_path, output_path)
+    finally:
+        if os.path.exists(rendering_path):
+            os.remove(rendering_path)
+    return output_path
+
+
+def _render(input_path: str, actions: list, keyframes: list, output_path: str, start: float, end: float,
+            music_offset: float, workers: int, analysis: dict, on_progress, preview: bool, profile: str,
+            streams: str = "av") -> str:
+    """The actual render behind apply_edits() (no cache, writes straight to output_path)."""
+    directory = os.path.dirname(input_path)
+    filename = os.path.basename(input_path)
+    temp_srt_path = None
+    music_stream = None
+
+    label = metrics.action_label(actions)
+
+    # --- FAST PATH: Trim-only edits ---
+    trim_window = collapse_trims(actions)
+    if trim_window and keyframes and not preview and streams == "av":
+        try:
+            with metrics.stage("smart_trim", label) as span:
+                trimmed = smart_trim(input_path, trim_window[0], trim_window[1], keyframes, output_path,
+                                     on_progress=on_progress)
+                span.outcome = "ok" if trimmed else "skipped"
+            if trimmed:
+                return output_path
+        except ffmpeg.Error as e:
+            print(f"⚠️ Smart trim failed, falling back to full render: {e.stderr.decode('utf8') if e.stderr else str(e)}")
+
+    # --- FAST PATH: Parallel chunks ---
+    if workers > 1 and keyframes and not preview and streams == "av":
+        try:
+            with metrics.stage("parallel_render", label) as span:
+                rendered = render_parallel(input_path, actions, keyframes, output_path, workers,
+                                           min_duration=settings.PARALLEL_RENDER_MIN_DURATION, profile=profile,
+                                           on_progress=on_progress)
+                span.outcome = "ok" if rendered else "skipped"
+            if rendered:
+                return output_path
+        except ffmpeg.Error as e:
+            print(f"⚠️ Parallel render failed, falling back to single pass: {e.stderr.decode('utf8') if e.stderr else str(e)}")
 
+    try:
+        graph_started = time.perf_counter()
         meta = get_video_metadata(input_path)
         width = meta['width']
         height = meta['height']
         # 1. Setup Input Streams
-        stream = ffmpeg.input(input_path)
+        input_kwargs = {}
+        if start is not None:
+            input_kwargs['ss'] = start
+        if end is not None:
+            input_kwargs['t'] = end - (start or 0.0)
+        stream = ffmpeg.input(input_path, **input_kwargs)
         audio = stream.audio
+
+        # Preview: downscale FIRST so every later filter works on ~1/9 of the pixels.
+        # Pixel-based parameters (zoom size, font size) follow the new size.
+        text_scale = 1.0
+        if preview and height > settings.PREVIEW_HEIGHT:
+            text_scale = settings.PREVIEW_HEIGHT / height
+            width = int(width * text_scale / 2) * 2
+            height = settings.PREVIEW_HEIGHT
+            stream = stream.filter('scale', width, height)
+
+        # Expected OUTPUT duration, updated by every timeline action (for progress %)
+        source_duration = float(probecache.probe(input_path)['format'].get('duration', 0) or 0)
+        out_duration = (end if end is not None else source_duration) - (start or 0.0)
         music_stream = None
         # 2. Define Font Path (Update this if your font name is different!)
         # We go up from services -> app -> backend -> assets
@@ -148,29 +379,26 @@ def apply_edits(input_path: str, actions: list) -> str:
         # Convert to string and fix Windows path issues for FFmpeg
         font_str = str(font_path).replace("\\", "/")
 
-        silence_action = next((a for a in actions if a['type'] == 'remove_silence'), None)
-        if silence_action:
-            segments = detect_silence(input_path, silence_action.get('threshold', -30), silence_action.get('min_duration', 0.5))
-            if segments:
-                # Create trim filters for every segment
-                video_parts = []
-                audio_parts = []
-                for start, end in segments:
-                    v_cut = stream.trim(start=start, end=end).setpts('PTS-STARTPTS')
-                    a_cut = audio.filter_('atrim', start=start, end=end).filter_('asetpts', 'PTS-STARTPTS')
-                    video_parts.append(v_cut)
-                    audio_parts.append(a_cut)
-                
-                # Concat them back together
-                stream = ffmpeg.concat(*[p for pair in zip(video_parts, audio_parts) for p in pair], v=1, a=1).node[0]
-                audio = ffmpeg.concat(*[p for pair in zip(video_parts, audio_parts) for p in pair], v=1, a=1).node[1]
-                print("✅ Applied Silence Removal (Jump Cuts)")
+        # When replaying a job's action log there can be several silence requests
+        # ("remove silence" then "be more aggressive"): the latest settings win, and
+        # the cut happens where silence removal first appears in the log, on the
+        # timeline as it stands there (so "trim 10-20s" then "remove silence" only
+        # looks for silences inside those 10 seconds, like the two edits did).
+        silence_action = next((a for a in reversed(actions) if a['type'] == 'remove_silence'), None)
+        first_silence = next((a for a in actions if a['type'] == 'remove_silence'), None)
+        # Source window behind the current timeline, tracked until the silence cut
+        window_start = start or 0.0
+        window_end = end if end is not None else source_duration
+        window_speed = 1.0
 
         # 3. Apply Actions
         for action in actions:
             
             # --- TRIM ---
             if action['type'] == 'trim':
+                out_duration = max(0.0, min(float(action['end']), out_duration) - float(action['start']))
+                window_end = min(window_end, window_start + float(action['end']) * window_speed)
+                window_start += float(action['start']) * window_speed
                 stream = stream.trim(start=action['start'], end=action['end']).setpts('PTS-STARTPTS')
                 audio = audio.filter_('atrim', start=action['start'], end=action['end']).filter_('asetpts', 'PTS-STARTPTS')
             
@@ -234,6 +462,8 @@ def apply_edits(input_path: str, actions: list) -> str:
             # --- SPEED (New!) ---
             elif action['type'] == 'speed':
                 factor = float(action['value'])
+                out_duration = out_duration / factor
+                window_speed *= factor
                 # Video Speed: setpts = 1/factor
                 stream = stream.setpts(f'{1/factor}*PTS')
                 # Audio Speed: atempo (limited to 0.5 - 2.0 range per filter)
@@ -255,7 +485,7 @@ def apply_edits(input_path: str, actions: list) -> str:
                 stream = stream.drawtext(
                     text=content,
                     fontfile=font_str,
-                    fontsize=64,
+                    fontsize=max(12, int(64 * text_scale)),
                     fontcolor='white',
                     x='(w-text_w)/2', # Always center horizontally
                     y=y_pos,          # Variable vertical position
@@ -286,9 +516,11 @@ def apply_edits(input_path: str, actions: list) -> str:
                 
                 if music_path.exists():
                     # Load music file
+                    music_kwargs = {'ss': music_offset} if music_offset else {}
                     music_input = ffmpeg.input(
                         str(music_path), 
                         format='mp3', 
+                        **music_kwargs,
                         probesize=20000000, 
                         analyzeduration=10000000
                     )
@@ -328,7 +560,28 @@ def apply_edits(input_path: str, actions: list) -> str:
             #             force_style='FontName=Arial,FontSize=24,PrimaryColour=&H00FFFFFF,OutlineColour=&H00000000,BorderStyle=3,Outline=1,Shadow=0,MarginV=20'
             #         )
             elif action['type'] == 'remove_silence':
-                continue # Already handled above
+                if action is not first_silence:
+                    continue  # Superseded: the first request is re-run with the latest settings
+                min_duration = silence_action.get('min_duration', 0.5)
+                silence_started = time.perf_counter()
+                segments = detect_silence(input_path, silence_action.get('threshold', -30), min_duration,
+                                          analysis=analysis)
+                graph_started += time.perf_counter() - silence_started  # Reported as its own stage
+                segments = remap_keep_segments(segments, window_start, window_end, window_speed, min_duration)
+                if segments:
+                    # One select/aselect over the whole interval list instead of a
+                    # trim+atrim pair per segment: the graph stays 2 nodes no matter
+                    # how many gaps a podcast has. Timestamps are regenerated afterwards.
+                    keep_expr = "+".join(f"between(t,{seg_start:.3f},{seg_end:.3f})" for seg_start, seg_end in segments)
+                    out_duration = sum(seg_end - seg_start for seg_start, seg_end in segments)
+                    stream = stream.filter('select', keep_expr).filter('setpts', 'N/FRAME_RATE/TB')
+                    audio = (
+                        audio
+                        .filter('asetnsamples', n=256, p=0)  # ~5 ms audio frames -> tighter cuts
+                        .filter('aselect', keep_expr)
+                        .filter('asetpts', 'N/SR/TB')
+                    )
+                    print("✅ Applied Silence Removal (Jump Cuts)")
 
             elif action['type'] == 'aspect_ratio':
                 ratio = action.get('ratio', '9:16')
@@ -343,18 +596,29 @@ def apply_edits(input_path: str, actions: list) -> str:
           # ------------------------
 
         # 4. Output
-        if music_stream:
+        output_kwargs = encoding.output_kwargs(profile, output_path, fps=meta['fps'])
+        if streams == "video":
+            stream = ffmpeg.output(stream, output_path, **output_kwargs)
+        elif music_stream:
             # 'duration=first' means cut the music when the video ends
             # 'dropout_transition=0' makes it seamless
             mixed_audio = ffmpeg.filter([audio, music_stream], 'amix', duration='first', dropout_transition=0)
-            stream = ffmpeg.output(stream, mixed_audio, output_path)
+            if streams == "audio":
+                stream = ffmpeg.output(mixed_audio, output_path, **output_kwargs)
+            else:
+                stream = ffmpeg.output(stream, mixed_audio, output_path, **output_kwargs)
+        elif streams == "audio":
+            stream = ffmpeg.output(audio, output_path, **output_kwargs)
         else:
             # Standard output if no music
-            stream = ffmpeg.output(stream, audio, output_path)
+            stream = ffmpeg.output(stream, audio, output_path, **output_kwargs)
             print("🎬 Running FFmpeg...")
 
 
-        ffmpeg.run(stream, overwrite_output=True)
+        metrics.observe("graph_build", time.perf_counter() - graph_started, action=label)
+
+        with metrics.stage("preview_encode" if preview else "encode", label):
+            run_ffmpeg(stream, on_progress=on_progress, expected_duration=out_duration)
         
         return output_path
 
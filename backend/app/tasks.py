@@ -1,15 +1,25 @@
 # backend/app/tasks.py
 # from backend.app.core.celeryapp import celery_app
 from backend.app.services.vidpro import get_video_metadata,apply_edits
+from backend.app.core.config import settings
 
 from backend.app.db.database import SessionLocal 
 from backend.app.db.models import VideoJob
 from backend.app.services.promptparser import parse_prompt
+from backend.app.services.smarttrim import build_keyframe_index
+from backend.app.services.analysis import analyze_media
+from backend.app.services.progress import JobProgressWriter
+from backend.app.services.jobevents import publish_job
+from backend.app.services import metrics, blobstore, leases
+from sqlalchemy import or_
 import json
 import os
 import time
 
 
+APPLIED_EDITS_KEPT = 20  # Re-leases happen within minutes; older edit_ids can't come back
+
+
 # @celery_app.task
 def dummy_video_processing(job_id: str, filename: str):
     db = SessionLocal()
@@ -27,7 +37,7 @@ def dummy_video_processing(job_id: str, filename: str):
 
         # Update status to indicate work has started
     job.status = "PROCESSING"
-    db.commit()
+    _save(db, job)
     
     # 1. Construct the full file path
     # We need to know where the file is. 
@@ -39,6 +49,13 @@ def dummy_video_processing(job_id: str, filename: str):
     print(f"🔍 [WORKER] Looking for file at: {file_path}")
 
     try:
+        # Same content ingested before (duplicate upload): copy its results
+        if blobstore.apply_ingest(job, blobstore.get(db, job.content_hash)):
+            job.status = "COMPLETED"
+            _save(db, job)
+            print(f"♻️ [WORKER] Reused ingest of {job.content_hash[:12]}")
+            return "DONE"
+
         # 2. Run FFmpeg Probe
         metadata = get_video_metadata(file_path)
 
@@ -49,9 +66,23 @@ def dummy_video_processing(job_id: str, filename: str):
         job.height = metadata.get("height")
         job.fps = metadata.get("fps")
         job.codec = metadata.get("codec")
+
+        # 3. Index keyframes once so later trims can stream-copy whole GOPs
+        try:
+            job.keyframes = build_keyframe_index(file_path)
+        except Exception as e:
+            print(f"⚠️ [WORKER] Keyframe indexing failed (smart trim disabled): {e}")
+
+        # 4. Decode once: silences, loudness, scenes, black frames
+        try:
+            job.analysis = analyze_media(file_path)
+        except Exception as e:
+            print(f"⚠️ [WORKER] Analysis failed (edits will analyse on demand): {e}")
         
         job.status = "COMPLETED" 
-        db.commit() # Final save
+        _save(db, job) # Final save
+        if job.content_hash:
+            blobstore.record_ingest(db, job.content_hash, metadata, job.keyframes, job.analysis)
         
         print(f"✅ [WORKER] SUCCESS! Metadata extracted: {metadata}")
         print(f"✅ [WORKER] SUCCESS! Metadata saved to DB.")
@@ -59,14 +90,18 @@ def dummy_video_processing(job_id: str, filename: str):
     
     except Exception as e:
         print(f"❌ [WORKER] FAILED: {str(e)}")
+        _mark_failed(db, job, e)
         return {"status": "FAILED", "error": str(e)}
     
 # @celery_app.task
-def process_video_edit(job_id: str, prompt: str):
+def process_video_edit(job_id: str, prompt: str, parsed: dict = None, edit_id: str = None):
     """
     Step 2 Task: Receives a prompt, parses it, and (eventually) runs FFmpeg.
+    'parsed' is an already parsed prompt (batch edits parse once for all their jobs).
+    'edit_id' identifies the request, so a re-run of the same task appends nothing twice.
     """
     db = SessionLocal()
+    job = None
     try:
         print(f"🤖 [WORKER] Received Prompt for Job {job_id}: '{prompt}'")
         
@@ -75,10 +110,14 @@ def process_video_edit(job_id: str, prompt: str):
             return "JOB_NOT_FOUND"
 
         job.status = "EDITING"
-        db.commit()
+        job.progress = 0.0
+        job.render_fps = None
+        job.render_speed = None
+        job.eta_seconds = None
+        _save(db, job)
 
         # 1. Parse the Prompt
-        parsed_result = parse_prompt(prompt)
+        parsed_result = parsed if parsed is not None else parse_prompt(prompt)
         actions = parsed_result["actions"]
         reply = parsed_result.get("reply", "Done!")
         print(f"📜 [WORKER] Parsed Actions: {actions}")
@@ -91,21 +130,81 @@ def process_video_edit(job_id: str, prompt: str):
             print("🛑 [WORKER] No actions detected. Treating as chat.")
             job.status = "CHAT_ONLY" # Mark done so frontend sees the reply
             # We DO NOT update job.edited_file_path, so the video stays same
-            db.commit()
+            _save(db, job)
             return {"status": "CHAT_ONLY", "reply": reply}
 
-        # 2. (Future) Execute FFmpeg based on 'actions'
-        # For now, we pretend to edit by sleeping or just passing through
-        original_path = job.original_file_path
+        # 3. Append to the action log and replay the WHOLE log from the original.
+        # Rendering from the original (instead of the last edited file) keeps the
+        # cost of a render flat and avoids re-encoding the same pixels every prompt.
+        source_path, keyframes, analysis, content_hash = _replay_source(job)
+        applied_edits = list(job.applied_edits or [])
+        if edit_id and edit_id in applied_edits:
+            # Re-leased task: its first run logged these actions, then died before
+            # the queue heard about it. Render the log as it is.
+            action_log = list(job.action_log or [])
+            edit_version = job.edit_version or 0
+        else:
+            action_log = list(job.action_log or []) + list(actions)
+            edit_version = max(job.edit_version or 0, job.render_version or 0) + 1
+            if edit_id:
+                applied_edits = (applied_edits + [edit_id])[-APPLIED_EDITS_KEPT:]
 
-        input_path = job.edited_file_path if job.edited_file_path else original_path
-        print(f"🔗 [CHAINING] Using input file: {input_path}") # Optional: Debug print
-        edited_path = apply_edits(input_path, actions)
-        
-        # 3. Update Status
+        print(f"🔗 [REPLAY] Rendering {len(action_log)} logged actions from: {source_path}")
+        if job.keyframes is None and not job.replay_base_path:
+            # Jobs uploaded before keyframe indexing existed
+            try:
+                job.keyframes = keyframes = build_keyframe_index(source_path)
+            except Exception as e:
+                print(f"⚠️ [WORKER] Keyframe indexing failed: {e}")
+        progress = JobProgressWriter(db, job)
+
+        def on_progress(snapshot):
+            leases.check()  # Stop rendering once another worker owns this task
+            progress(snapshot)
+
+        if settings.PREVIEW_RENDER:
+            # 4a. Fast low-res proxy first, so the user sees the edit in seconds
+            preview_path = apply_edits(source_path, action_log, output_path=blobstore.job_output_path(job, "preview"),
+                                       analysis=analysis, on_progress=on_progress, preview=True,
+                                       content_hash=content_hash)
+            leases.check()
+            job.action_log = action_log
+            job.applied_edits = applied_edits
+            job.edit_version = edit_version
+            job.preview_file_path = preview_path
+            job.preview_version = edit_version
+            job.progress = 100.0
+            job.eta_seconds = 0.0
+            job.status = "PREVIEW_READY"
+            _save(db, job)
+            print(f"👀 [WORKER] Preview ready: {preview_path}")
+
+            # 4b. Full quality afterwards (or only when someone downloads it)
+            if settings.FULL_RENDER_MODE == "on_download":
+                return {"status": "PREVIEW_READY", "actions_taken": actions}
+            if settings.JOB_QUEUE_BACKEND == "database":
+                from backend.app.services import jobqueue  # jobqueue imports this module
+                job.status = "RENDER_QUEUED"
+                _save(db, job)
+                jobqueue.enqueue(db, "render", job_id, priority=jobqueue.PRIORITY_LOW)
+                return {"status": "PREVIEW_READY", "actions_taken": actions}
+            result = render_full_quality(job_id)
+            return {"status": result.get("status"), "actions_taken": actions}
+
+        edited_path = apply_edits(source_path, action_log, keyframes=keyframes, analysis=analysis,
+                                  output_path=blobstore.job_output_path(job, "edited"), on_progress=on_progress, profile=job.encode_profile, content_hash=content_hash)
+
+        # 4. Update Status
+        leases.check()
+        job.action_log = action_log
+        job.applied_edits = applied_edits
+        job.edit_version = edit_version
         job.edited_file_path = edited_path
+        job.render_version = edit_version
+        job.progress = 100.0
+        job.eta_seconds = 0.0
         job.status = "COMPLETED"
-        db.commit()
+        _save(db, job)
         print(f"✅ [WORKER] Edit Complete! Saved to: {edited_path}")
         
         return {"status": "DONE", "actions_taken": actions}
@@ -113,6 +212,159 @@ def process_video_edit(job_id: str, prompt: str):
         # (Optional) You could update the DB here with the duration, but printing is fine for now.
         # return metadata
 
+    except leases.LeaseLost:
+        print(f"🛑 [WORKER] Edit of job {job_id} stopped: another worker took over the task")
+        db.rollback()
+        raise
     except Exception as e:
         print(f"❌ [WORKER] FAILED: {str(e)}")
-        return {"status": "FAILED", "error": str(e)}
\ No newline at end of file
+        _mark_failed(db, job, e)
+        return {"status": "FAILED", "error": str(e)}
+
+
+def _replay_source(job):
+    """
+    (input, keyframes, analysis, content_hash) the action log is replayed on.
+    A legacy job replays on its pre-log render, which was never indexed or analysed.
+    """
+    if job.replay_base_path:
+        return job.replay_base_path, None, None, None
+    return job.original_file_path, job.keyframes, job.analysis, job.content_hash
+
+
+def _save(db, job):
+    """Commits the job and pushes its new state to status subscribers."""
+    with metrics.stage("db_commit"):
+        db.commit()
+    publish_job(job)
+
+
+def _claim_render(db, job_id: str, version: int, held: int = None) -> bool:
+    """
+    Takes the job's full-render claim for edit 'version' (conditional UPDATE, so
+    of two render tasks exactly one wins). 'held' is a claim this render already
+    owns. Fails if the job has moved past 'version' or another render is alive.
+    """
+    now = time.time()
+    claimable = [VideoJob.rendering_version.is_(None),
+                 VideoJob.render_claimed_at < now - settings.RENDER_CLAIM_STALE_SECONDS]
+    if held is not None:
+        claimable.append(VideoJob.rendering_version == held)
+    updated = (
+        db.query(VideoJob)
+        .filter(VideoJob.id == job_id, VideoJob.edit_version == version, or_(*claimable))
+        .update({VideoJob.rendering_version: version, VideoJob.render_claimed_at: now},
+                synchronize_session=False)
+    )
+    db.commit()
+    return updated == 1
+
+
+def _release_render(db, job_id: str, version: int) -> bool:
+    """Drops our claim, unless a newer edit arrived meanwhile (False: render that one too)."""
+    updated = (
+        db.query(VideoJob)
+        .filter(VideoJob.id == job_id, VideoJob.rendering_version == version, VideoJob.edit_version == version)
+        .update({VideoJob.rendering_version: None, VideoJob.render_claimed_at: None}, synchronize_session=False)
+    )
+    db.commit()
+    return updated == 1
+
+
+def render_full_quality(job_id: str):
+    """
+    Full-resolution render of the job's current action log, after its preview.
+    Does nothing if edited_file_path is already up to date, or if another
+    render of this job is running (that one picks up newer edits when it's done).
+    """
+    db = SessionLocal()
+    job = None
+    held = None
+    try:
+        while True:
+            job = db.query(VideoJob).filter(VideoJob.id == job_id).first()
+            if not job:
+                return {"status": "FAILED", "error": "JOB_NOT_FOUND"}
+
+            version = job.edit_version or 0
+            if (job.render_version or 0) >= version and job.edited_file_path and os.path.exists(job.edited_file_path):
+                if held is not None:
+                    _release_render(db, job_id, held)
+                    held = None
+                return {"status": "DONE", "skipped": True}
+            if not _claim_render(db, job_id, version, held):
+                held = None  # Whatever we held was taken over
+                print(f"⏭️ [WORKER] Job {job_id} is already being rendered, skipping")
+                return {"status": "DONE", "skipped": True}
+            held = version
+
+            db.refresh(job)
+            print(f"🎞️ [WORKER] Full-quality render of job {job_id} (edit {version})")
+            job.status = "RENDERING"
+            job.progress = 0.0
+            job.render_fps = None
+            job.render_speed = None
+            job.eta_seconds = None
+            _save(db, job)
+
+            if job.keyframes is None and not job.replay_base_path:
+                try:
+                    job.keyframes = build_keyframe_index(job.original_file_path)
+                except Exception as e:
+                    print(f"⚠️ [WORKER] Keyframe indexing failed: {e}")
+            source, keyframes, analysis, content_hash = _replay_source(job)
+            progress = JobProgressWriter(db, job)
+
+            def on_progress(snapshot):
+                job.render_claimed_at = time.time()  # Keeps the claim alive, saved with the progress
+                progress(snapshot)
+
+            edited_path = apply_edits(source, list(job.action_log or []), keyframes=keyframes,
+                                      analysis=analysis, output_path=blobstore.job_output_path(job, "edited"),
+                                      on_progress=on_progress,
+                                      profile=job.encode_profile, content_hash=content_hash)
+
+            db.refresh(job)
+            if job.rendering_version != version:
+                # Presumed dead and taken over: the other render publishes
+                held = None
+                return {"status": "DONE", "skipped": True}
+            job.edited_file_path = edited_path
+            job.render_version = version
+            job.progress = 100.0
+            job.eta_seconds = 0.0
+            if (job.edit_version or 0) == version:
+                job.status = "COMPLETED"  # Otherwise a newer edit is already on its way
+            _save(db, job)
+            print(f"✅ [WORKER] Full render complete: {edited_path}")
+            if _release_render(db, job_id, version):
+                held = None
+                return {"status": "DONE"}
+            # A newer edit arrived while we rendered; its render task skipped us, so go again
+
+    except Exception as e:
+        print(f"❌ [WORKER] FAILED: {str(e)}")
+        _mark_failed(db, job, e)
+        return {"status": "FAILED", "error": str(e)}
+    finally:
+        if held is not None:
+            try:
+                db.rollback()
+                db.query(VideoJob).filter(VideoJob.id == job_id, VideoJob.rendering_version == held).update(
+                    {VideoJob.rendering_version: None, VideoJob.render_claimed_at: None}, synchronize_session=False)
+                db.commit()
+            except Exception as e:
+                print(f"⚠️ [WORKER] Could not release the render claim of job {job_id}: {e}")
+        db.close()
+
+def _mark_failed(db, job, error: Exception):
+    """Records the failure on the job and tells any listeners."""
+    if job is None:
+        return
+    try:
+        db.rollback()
+        job.status = "FAILED"
+        job.error_message = str(error)
+        _save(db, job)
+    except Exception as e:
+        print(f"⚠️ [WORKER] Could not save FAILED status: {e}")
@@ -0,0 +1,131 @@
+# backend/benchmarks/authbench.py
+"""
+Login benchmark: bcrypt cost per cost factor, and what a burst of logins does
+to the event loop.
+
+    python -m backend.benchmarks.authbench
+    python -m backend.benchmarks.authbench --rounds 10,11,12 --logins 64
+    AUTH_HASH_WORKERS=8 python -m backend.benchmarks.authbench --modes pool
+
+Burst modes, all verifying the same hash concurrently:
+    inline   - bcrypt on the event-loop thread
+    default  - the loop's default executor (shared, sized for general work)
+    pool     - core.security's bounded bcrypt pool (AUTH_HASH_WORKERS), as /auth/login does
+'loop_lag' is how late a 10 ms ticker on the same loop fires, i.e. what every
+other request on that worker waits while the logins run. Also times the
+verified-user cache that replaces the per-request users lookup.
+"""
+import argparse
+import asyncio
+import json
+import statistics
+import time
+from backend.app.core import security
+from backend.app.core.config import settings
+from backend.app.services import authcache
+
+PASSWORD = "correct horse battery staple"
+TICK_SECONDS = 0.01
+
+
+def _percentile(values: list, pct: float) -> float:
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct))]
+
+
+def _cost_table(rounds_list: list, samples: int) -> list:
+    rows = []
+    for rounds in rounds_list:
+        context = security.pwd_context.copy(bcrypt__default_rounds=rounds)
+        hash_times, verify_times = [], []
+        hashed = None
+        for _ in range(samples):
+            start = time.perf_counter()
+            hashed = context.hash(PASSWORD)
+            hash_times.append(time.perf_counter() - start)
+            start = time.perf_counter()
+            context.verify(PASSWORD, hashed)
+            verify_times.append(time.perf_counter() - start)
+        rows.append({
+            "rounds": rounds,
+            "hash_ms": round(statistics.mean(hash_times) * 1000, 1),
+            "verify_ms": round(statistics.mean(verify_times) * 1000, 1),
+        })
+    return rows
+
+
+async def _burst(mode: str, hashed: str, logins: int) -> dict:
+    loop = asyncio.get_running_loop()
+    lag = []
+    done = asyncio.Event()
+
+    async def ticker():
+        while not done.is_set():
+            scheduled = loop.time()
+            await asyncio.sleep(TICK_SECONDS)
+            lag.append(max(0.0, loop.time() - scheduled - TICK_SECONDS))
+
+    async def login():
+        start = time.perf_counter()
+        if mode == "inline":
+            security.verify_password(PASSWORD, hashed)
+        elif mode == "default":
+            await loop.run_in_executor(None, security.verify_password, PASSWORD, hashed)
+        else:
+            await loop.run_in_executor(security._hash_pool, security.verify_password, PASSWORD, hashed)
+        return time.perf_counter() - start
+
+    tick = asyncio.create_task(ticker())
+    await asyncio.sleep(TICK_SECONDS)
+    started = time.perf_counter()
+    latencies = await asyncio.gather(*(login() for _ in range(logins)))
+    wall = time.perf_counter() - started
+    done.set()
+    await tick
+
+    return {
+        "mode": mode,
+        "logins": logins,
+        "wall_seconds": round(wall, 3),
+        "logins_per_second": round(logins / wall, 2) if wall else 0.0,
+        "latency_p50": round(_percentile(latencies, 0.50), 3),
+        "latency_p95": round(_percentile(latencies, 0.95), 3),
+        "loop_lag_p50": round(_percentile(lag, 0.50), 4),
+        "loop_lag_max": round(max(lag), 4) if lag else 0.0,
+    }
+
+
+def _user_cache(lookups: int) -> dict:
+    authcache.remember(1)
+    start = time.perf_counter()
+    for _ in range(lookups):
+        authcache.is_verified(1)
+    elapsed = time.perf_counter() - start
+    authcache.invalidate(1)
+    return {"lookups": lookups, "ns_per_hit": round(elapsed / lookups * 1e9, 1)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Login / bcrypt benchmark")
+    parser.add_argument("--rounds", default="10,12", help="Cost factors for the cost table")
+    parser.add_argument("--samples", type=int, default=5, help="Hashes per cost factor")
+    parser.add_argument("--logins", type=int, default=32, help="Concurrent logins per burst")
+    parser.add_argument("--modes", default="inline,default,pool")
+    args = parser.parse_args()
+
+    hashed = security.get_password_hash(PASSWORD)  # At AUTH_BCRYPT_ROUNDS, like real users
+    bursts = [asyncio.run(_burst(mode, hashed, args.logins)) for mode in args.modes.split(",")]
+    report = {
+        "bcrypt_rounds": settings.AUTH_BCRYPT_ROUNDS,
+        "hash_workers": settings.AUTH_HASH_WORKERS,
+        "cost": _cost_table([int(r) for r in args.rounds.split(",")], args.samples),
+        "bursts": bursts,
+        "user_cache": _user_cache(100000),
+    }
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+# backend/benchmarks/mockllm.py
+"""
+Local stand-in for the OpenAI-compatible chat API, for offline load tests.
+
+Run it:
+    python -m backend.benchmarks.mockllm --port 9000 --latency-ms 800 --error-rate 0.05
+
+Then point the backend (or parsebench.py) at it:
+    SAMBANOVA_BASE_URL=http://127.0.0.1:9000/v1
+"""
+import argparse
+import asyncio
+import json
+import random
+import time
+import uuid
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+from backend.app.services.ruleparser import match_prompt
+
+app = FastAPI(title="EditVerse Mock LLM")
+
+# Tuned from the command line
+CONFIG = {"latency_ms": 800.0, "jitter_ms": 300.0, "error_rate": 0.0}
+STATS = {"requests": 0, "errors": 0}
+
+
+def _answer(prompt_text: str) -> str:
+    """Reuses the local keyword rules so the answers look like real parses."""
+    result = match_prompt(prompt_text)
+    if result:
+        return json.dumps({"actions": result["actions"], "reply": result["reply"]})
+    return json.dumps({"actions": [{"type": "filter", "name": "contrast"}], "reply": "On it! 🎬"})
+
+
+@app.post("/v1/chat/completions")
+async def chat_completions(request: Request):
+    STATS["requests"] += 1
+    body = await request.json()
+
+    # Simulate provider latency without blocking the loop
+    delay = max(0.0, CONFIG["latency_ms"] + random.uniform(-CONFIG["jitter_ms"], CONFIG["jitter_ms"]))
+    await asyncio.sleep(delay / 1000)
+
+    if random.random() < CONFIG["error_rate"]:
+        STATS["errors"] += 1
+        return JSONResponse(status_code=503, content={"error": {"message": "mock overload", "type": "server_error"}})
+
+    user_messages = [m["content"] for m in body.get("messages", []) if m.get("role") == "user"]
+    content = _answer(user_messages[-1] if user_messages else "")
+
+    return {
+        "id": f"chatcmpl-{uuid.uuid4().hex}",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": body.get("model", "mock"),
+        "choices": [{
+            "index": 0,
+            "message": {"role": "assistant", "content": content},
+            "finish_reason": "stop",
+        }],
+        "usage": {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0},
+    }
+
+
+@app.get("/stats")
+async def stats():
+    return STATS
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Mock OpenAI-compatible chat server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9000)
+    parser.add_argument("--latency-ms", type=float, default=800.0)
+    parser.add_argument("--jitter-ms", type=float, default=300.0)
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Share of requests answered with a 503")
+    args = parser.parse_args()
+
+    CONFIG.update(latency_ms=args.latency_ms, jitter_ms=args.jitter_ms, error_rate=args.error_rate)
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
@@ -0,0 +1,78 @@
+# backend/benchmarks/parsebench.py
+"""
+Parse throughput load test for the pooled LLM client.
+
+    python -m backend.benchmarks.mockllm --port 9000 &
+    SAMBANOVA_BASE_URL=http://127.0.0.1:9000/v1 python -m backend.benchmarks.parsebench --requests 500 --threads 64
+
+Calls the LLM client directly (no rule matcher, no cache), the same way
+BackgroundTasks threads do, and prints throughput and latency percentiles.
+"""
+import argparse
+import json
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+from backend.app.services.llmclient import llm_client
+from backend.app.services.promptparser import SYSTEM_INSTRUCTIONS
+
+PROMPTS = [
+    "make it romantic",
+    "add music",
+    "cut the first 5 seconds and make it a reel",
+    "vintage vibe with captions",
+    "speed it up 2x",
+    "remove silence",
+]
+
+
+def _one(i: int):
+    messages = [
+        {"role": "system", "content": SYSTEM_INSTRUCTIONS},
+        {"role": "user", "content": PROMPTS[i % len(PROMPTS)]},
+    ]
+    start = time.perf_counter()
+    try:
+        llm_client.chat_sync(messages)
+        ok = True
+    except Exception:
+        ok = False
+    return ok, time.perf_counter() - start
+
+
+def _percentile(values: list, pct: float) -> float:
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="LLM parse throughput benchmark")
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--threads", type=int, default=32, help="Caller threads (like BackgroundTasks)")
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.threads) as pool:
+        results = list(pool.map(_one, range(args.requests)))
+    wall = time.perf_counter() - started
+
+    latencies = [t for ok, t in results if ok]
+    failures = sum(1 for ok, _ in results if not ok)
+    report = {
+        "requests": args.requests,
+        "threads": args.threads,
+        "failures": failures,
+        "wall_seconds": round(wall, 3),
+        "throughput_rps": round(len(latencies) / wall, 2) if wall else 0.0,
+        "latency_p50": round(_percentile(latencies, 0.50), 3),
+        "latency_p95": round(_percentile(latencies, 0.95), 3),
+        "latency_p99": round(_percentile(latencies, 0.99), 3),
+        "latency_mean": round(statistics.mean(latencies), 3) if latencies else 0.0,
+    }
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,306 @@
+# backend/benchmarks/renderbench.py
+"""
+Render benchmark for apply_edits, on synthetic clips.
+
+    python -m backend.benchmarks.renderbench --output bench/main.json
+    python -m backend.benchmarks.renderbench --resolutions 720p --durations 30 --scenarios retro,silence
+    python -m backend.benchmarks.renderbench --long --compare bench/main.json --output bench/branch.json
+
+Test clips are generated with lavfi (testsrc2 video, sine tone with anullsrc
+gaps as "silences") and cached in --fixtures, so every run renders identical
+input. Each scenario runs in a fresh process: wall time, CPU time (Python +
+FFmpeg children), peak RSS, output size and realtime factor are written to JSON.
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+RESOLUTIONS = {
+    "360p": (640, 360),
+    "720p": (1280, 720),
+    "1080p": (1920, 1080),
+}
+FPS = 30
+SAMPLE_RATE = 48000
+MUSIC_TRACK = "comedy_1.mp3"  # Shipped in backend/assets/music
+
+# Every action on its own, plus the combinations users actually send
+SCENARIOS = {
+    "trim": [{"type": "trim", "start": 1.0, "end": "-1"}],
+    "speed": [{"type": "speed", "value": 1.5}],
+    "grayscale": [{"type": "filter", "name": "grayscale"}],
+    "contrast": [{"type": "filter", "name": "contrast"}],
+    "warm_tone": [{"type": "filter", "name": "warm_tone"}],
+    "cool_tone": [{"type": "filter", "name": "cool_tone"}],
+    "retro": [{"type": "filter", "name": "retro"}],
+    "text": [{"type": "add_text", "content": "Benchmark", "position": "bottom"}],
+    "fade": [{"type": "fade", "kind": "in", "duration": 1.0}],
+    "music": [{"type": "add_music", "track": MUSIC_TRACK, "volume": 0.3}],
+    "reel_9_16": [{"type": "aspect_ratio", "ratio": "9:16"}],
+    "square_1_1": [{"type": "aspect_ratio", "ratio": "1:1"}],
+    "silence": [{"type": "remove_silence", "threshold": -30, "min_duration": 0.5}],
+    "retro_music_reel": [
+        {"type": "filter", "name": "retro"},
+        {"type": "add_music", "track": MUSIC_TRACK, "volume": 0.3},
+        {"type": "aspect_ratio", "ratio": "9:16"},
+    ],
+    "trim_speed_text": [
+        {"type": "trim", "start": 1.0, "end": "-1"},
+        {"type": "speed", "value": 2.0},
+        {"type": "add_text", "content": "Fast cut", "position": "top"},
+    ],
+}
+
+# Extra case with --long: silence removal on a 1-hour podcast-like clip
+LONG_CASE = ("silence", "360p", 3600.0)
+
+
+# --- Fixtures ---
+def silence_plan(duration: float) -> list:
+    """Deterministic gaps: 1.5 s of silence every 10 s (plus a short 0.3 s one that must survive)."""
+    gaps = []
+    t = 4.0
+    while t + 1.5 < duration:
+        gaps.append((t, t + 1.5))
+        if t + 6.0 < duration:
+            gaps.append((t + 5.0, t + 5.3))
+        t += 10.0
+    return gaps
+
+
+def _audio_graph(duration: float) -> str:
+    """sine for speech, anullsrc for the gaps, concatenated into one stereo track."""
+    pieces, cursor = [], 0.0
+    for start, end in silence_plan(duration):
+        if start > cursor:
+            pieces.append(("sine", start - cursor))
+        pieces.append(("silence", end - start))
+        cursor = end
+    if cursor < duration:
+        pieces.append(("sine", duration - cursor))
+
+    chains, labels = [], []
+    for i, (kind, length) in enumerate(pieces):
+        if kind == "sine":
+            source = f"sine=frequency=440:sample_rate={SAMPLE_RATE}:duration={length:.3f},aformat=channel_layouts=stereo"
+        else:
+            source = f"anullsrc=channel_layout=stereo:sample_rate={SAMPLE_RATE},atrim=duration={length:.3f}"
+        chains.append(f"{source}[a{i}]")
+        labels.append(f"[a{i}]")
+    chains.append(f"{''.join(labels)}concat=n={len(labels)}:v=0:a=1[aout]")
+    return ";".join(chains)
+
+
+def make_clip(fixtures_dir: str, resolution: str, duration: float) -> str:
+    """Generates (once) a deterministic H.264/AAC test clip and returns its path."""
+    width, height = RESOLUTIONS[resolution]
+    path = os.path.join(fixtures_dir, f"testsrc2_{resolution}_{int(duration)}s.mp4")
+    if os.path.exists(path):
+        return path
+
+    os.makedirs(fixtures_dir, exist_ok=True)
+    script = os.path.join(fixtures_dir, f"audio_{int(duration)}s.txt")
+    with open(script, "w", encoding="utf-8") as f:
+        f.write(_audio_graph(duration))
+
+    print(f"🧪 Generating {os.path.basename(path)}...", file=sys.stderr)
+    partial = path + ".tmp.mp4"
+    subprocess.run([
+        "ffmpeg", "-hide_banner", "-loglevel", "error", "-y",
+        "-f", "lavfi", "-i", f"testsrc2=size={width}x{height}:rate={FPS}:duration={duration}",
+        "-filter_complex_script", script,
+        "-map", "0:v", "-map", "[aout]",
+        "-c:v", "libx264", "-preset", "veryfast", "-crf", "23", "-g", str(FPS * 2), "-pix_fmt", "yuv420p",
+        "-c:a", "aac", "-b:a", "128k",
+        "-fflags", "+bitexact", "-flags:v", "+bitexact", "-flags:a", "+bitexact",
+        "-t", str(duration), partial,
+    ], check=True)
+    os.replace(partial, path)
+    os.remove(script)
+    return path
+
+
+# --- One measured render (runs in a fresh process) ---
+def _resolve_actions(actions: list, duration: float) -> list:
+    """'-1' in a trim end means 'one second before the end of the clip'."""
+    resolved = []
+    for action in actions:
+        action = dict(action)
+        if action.get("end") == "-1":
+            action["end"] = duration - 1.0
+        resolved.append(action)
+    return resolved
+
+
+def _maxrss_mb(usage) -> float:
+    # Linux reports KiB, macOS bytes
+    return usage.ru_maxrss / (1024 * 1024) if sys.platform == "darwin" else usage.ru_maxrss / 1024
+
+
+def _measure(case: dict, results):
+    from backend.app.services.vidpro import apply_edits
+    from backend.app.services.silenceengine import envelope_path
+
+    if not case["warm"] and os.path.exists(envelope_path(case["input"])):
+        os.remove(envelope_path(case["input"]))
+
+    self_before = resource.getrusage(resource.RUSAGE_SELF)
+    children_before = resource.getrusage(resource.RUSAGE_CHILDREN)
+    started = time.perf_counter()
+    error = None
+    try:
+        apply_edits(case["input"], case["actions"], keyframes=case["keyframes"], output_path=case["output"],
+                    profile=case["profile"], workers=case["workers"], use_cache=False)
+    except Exception as e:
+        error = str(e)[-500:]
+    wall = time.perf_counter() - started
+    self_after = resource.getrusage(resource.RUSAGE_SELF)
+    children_after = resource.getrusage(resource.RUSAGE_CHILDREN)
+
+    user = (self_after.ru_utime - self_before.ru_utime) + (children_after.ru_utime - children_before.ru_utime)
+    system = (self_after.ru_stime - self_before.ru_stime) + (children_after.ru_stime - children_before.ru_stime)
+    results.put({
+        "wall_seconds": round(wall, 3),
+        "cpu_user_seconds": round(user, 3),
+        "cpu_system_seconds": round(system, 3),
+        "cpu_seconds": round(user + system, 3),
+        # This process is fresh, so the children's peak is this render's FFmpeg
+        "peak_rss_mb": round(max(_maxrss_mb(self_after), _maxrss_mb(children_after)), 1),
+        "error": error,
+    })
+
+
+def run_case(case: dict) -> dict:
+    context = multiprocessing.get_context("spawn")
+    results = context.Queue()
+    process = context.Process(target=_measure, args=(case, results))
+    process.start()
+    measurement = results.get()
+    process.join()
+
+    output_bytes = os.path.getsize(case["output"]) if os.path.exists(case["output"]) else 0
+    if os.path.exists(case["output"]):
+        os.remove(case["output"])
+    wall = measurement["wall_seconds"]
+    return {
+        "scenario": case["scenario"],
+        "resolution": case["resolution"],
+        "duration": case["duration"],
+        "profile": case["profile"],
+        "workers": case["workers"],
+        "actions": case["actions"],
+        **measurement,
+        "output_bytes": output_bytes,
+        # Seconds of source footage rendered per wall-clock second
+        "realtime_factor": round(case["duration"] / wall, 2) if wall else None,
+    }
+
+
+# --- Reporting ---
+def _environment() -> dict:
+    def _cmd(args):
+        try:
+            return subprocess.run(args, capture_output=True, text=True, check=True).stdout.strip()
+        except (OSError, subprocess.CalledProcessError):
+            return None
+
+    ffmpeg_version = _cmd(["ffmpeg", "-version"])
+    return {
+        "commit": _cmd(["git", "rev-parse", "--short", "HEAD"]),
+        "ffmpeg": ffmpeg_version.splitlines()[0] if ffmpeg_version else None,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+    }
+
+
+def _key(result: dict) -> tuple:
+    return result["scenario"], result["resolution"], result["duration"], result["profile"], result["workers"]
+
+
+def compare(baseline_path: str, results: list):
+    """Prints wall-time change per case against an earlier run."""
+    with open(baseline_path, encoding="utf-8") as f:
+        baseline = {_key(r): r for r in json.load(f)["results"]}
+    print(f"{'case':<44} {'before':>8} {'after':>8} {'change':>8}", file=sys.stderr)
+    for result in results:
+        old = baseline.get(_key(result))
+        if not old or not old["wall_seconds"] or result["error"]:
+            continue
+        change = (result["wall_seconds"] - old["wall_seconds"]) / old["wall_seconds"] * 100
+        name = f"{result['scenario']} {result['resolution']} {int(result['duration'])}s"
+        print(f"{name:<44} {old['wall_seconds']:>8.2f} {result['wall_seconds']:>8.2f} {change:>+7.1f}%", file=sys.stderr)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="apply_edits render benchmark")
+    parser.add_argument("--resolutions", default="360p,720p,1080p")
+    parser.add_argument("--durations", default="10,60", help="Clip lengths in seconds")
+    parser.add_argument("--scenarios", default="all", help=f"Comma list of: {', '.join(SCENARIOS)}")
+    parser.add_argument("--long", action="store_true", help="Also remove silence from a 1-hour 360p clip")
+    parser.add_argument("--profile", default="standard", help="Encoder profile (draft | standard | archive)")
+    parser.add_argument("--workers", type=int, default=1, help="RENDER_WORKERS for each render")
+    parser.add_argument("--repeat", type=int, default=1, help="Runs per case (each one is reported)")
+    parser.add_argument("--warm", action="store_true", help="Keep cached audio envelopes between runs")
+    parser.add_argument("--fixtures", default=os.path.join(tempfile.gettempdir(), "editverse-renderbench"))
+    parser.add_argument("--output", default=None, help="Write results JSON here (default: stdout)")
+    parser.add_argument("--compare", default=None, help="Earlier results JSON to diff against")
+    args = parser.parse_args()
+
+    scenarios = list(SCENARIOS) if args.scenarios == "all" else args.scenarios.split(",")
+    unknown = [s for s in scenarios if s not in SCENARIOS]
+    if unknown:
+        parser.error(f"Unknown scenarios: {', '.join(unknown)}")
+
+    matrix = [(s, r, float(d)) for r in args.resolutions.split(",") for d in args.durations.split(",") for s in scenarios]
+    if args.long:
+        matrix.append(LONG_CASE)
+
+    from backend.app.services.smarttrim import build_keyframe_index
+
+    results = []
+    keyframe_cache = {}
+    for scenario, resolution, duration in matrix:
+        clip = make_clip(args.fixtures, resolution, duration)
+        if clip not in keyframe_cache:
+            keyframe_cache[clip] = build_keyframe_index(clip)
+        case = {
+            "scenario": scenario,
+            "resolution": resolution,
+            "duration": duration,
+            "profile": args.profile,
+            "workers": args.workers,
+            "input": clip,
+            "keyframes": keyframe_cache[clip],
+            "actions": _resolve_actions(SCENARIOS[scenario], duration),
+            "output": os.path.join(args.fixtures, f"out_{scenario}_{resolution}_{int(duration)}s.mp4"),
+            "warm": args.warm,
+        }
+        for _ in range(args.repeat):
+            result = run_case(case)
+            status = f"ERROR {result['error']}" if result["error"] else f"{result['wall_seconds']:.2f}s  x{result['realtime_factor']}"
+            print(f"⏱️ {scenario:<18} {resolution:>5} {int(duration):>5}s  {status}", file=sys.stderr)
+            results.append(result)
+
+    report = {"environment": _environment(), "results": results}
+    if args.output:
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+    else:
+        print(json.dumps(report, indent=2))
+
+    if args.compare:
+        compare(args.compare, results)
+
+
+if __name__ == "__main__":
+    main()
@@ -12,9 +12,11 @@ sys.path.insert(0, str(BACKEND_DIR))
 # Imports all models and the connection engine
 from backend.app.db.database import Base, engine
 from backend.app.db.models import VideoJob 
+from backend.app.db.migrations import run_migrations
 # NOTE: Ensure VideoJob model is fully defined in app/db/models.py
 
 print("Attempting to create database tables...")
 # This command creates tables defined in Base if they don't already exist
 Base.metadata.create_all(bind=engine)
+run_migrations(engine)
 print("Database tables created successfully (if they didn't exist).")
\ No newline at end of file
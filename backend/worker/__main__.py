@@ -0,0 +1,71 @@
+# backend/worker/__main__.py
+"""
+Standalone render worker.
+
+Run from the project root (every host needs the same DATABASE_URL and shared
+access to temp_storage):
+
+    JOB_QUEUE_BACKEND=database python -m backend.worker --concurrency 4
+
+The API must also run with JOB_QUEUE_BACKEND=database so it enqueues instead
+of rendering in-process.
+"""
+import argparse
+import multiprocessing
+import os
+import signal
+from prometheus_client import start_http_server
+from backend.app.db.database import Base, engine
+from backend.app.db.migrations import run_migrations
+from backend.app.services.jobqueue import run_worker
+from backend.app.services import metrics, storage
+
+
+def _worker_process(worker_id):
+    # Each process gets its own DB connections (never share a pool across fork)
+    engine.dispose()
+    run_worker(worker_id=worker_id)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="EditVerse render worker")
+    parser.add_argument("--concurrency", type=int, default=1, help="Worker processes on this host")
+    parser.add_argument("--worker-id", default=None, help="Prefix for worker ids (default: hostname-pid)")
+    parser.add_argument("--metrics-port", type=int, default=None,
+                        help="Serve Prometheus /metrics on this port (set PROMETHEUS_MULTIPROC_DIR with --concurrency > 1)")
+    args = parser.parse_args()
+
+    if args.metrics_port:
+        start_http_server(args.metrics_port, registry=metrics.registry())
+
+    Base.metadata.create_all(bind=engine)
+    run_migrations(engine)
+
+    if args.concurrency <= 1:
+        storage.start_sweeper()
+        run_worker(worker_id=args.worker_id)
+        return
+
+    processes = []
+    for i in range(args.concurrency):
+        worker_id = f"{args.worker_id}-{i}" if args.worker_id else None
+        process = multiprocessing.Process(target=_worker_process, args=(worker_id,), name=f"render-worker-{i}")
+        process.start()
+        processes.append(process)
+    storage.start_sweeper()  # In the parent, after forking: threads don't survive fork
+
+    # Forward Ctrl+C / SIGTERM to every child; each finishes its current task and exits
+    def _forward(signum, frame):
+        for process in processes:
+            if process.is_alive():
+                os.kill(process.pid, signal.SIGTERM)
+
+    signal.signal(signal.SIGINT, _forward)
+    signal.signal(signal.SIGTERM, _forward)
+
+    for process in processes:
+        process.join()
+
+
+if __name__ == "__main__":
+    main()